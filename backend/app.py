@@ -2,138 +2,635 @@
 Point d'entrée principal de l'application Flask pour le système d'authentification faciale.
 """
 
+import io
 import os
+import json
 import uuid
+import time
+import atexit
+import threading
+from functools import wraps
 import numpy as np
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, g, make_response
 from flask_cors import CORS
 import cv2
 
 # Importer les services et utilitaires
-from services.face_detector import FaceDetector
-from services.face_recognizer import FaceRecognizer
-from services.database import Database
+from services.face_detector import create_face_detector
+from services.face_recognizer import FaceRecognizer, model_space
+from services.gallery import template_owner
+from services.database import create_database
+from services.projection import PCAProjection
+from services.shared_gallery import SharedGallery
+from services.recognition_stream import LatestFrame, RecognitionSession
+from services.face_tracker import FaceTracker
+from services.inference_executor import InferenceExecutor, MicroBatcher, StageTimings, ExecutorSaturated
+from services.bulk_enrollment import BulkEnrollment, PhotoSource, read_manifest
 from models.user import User
-from utils.security import token_required
-from utils.image_processing import base64_to_image, image_to_base64, draw_face_rectangle
+from utils.security import token_required, verify_token, get_bearer_token
+from utils.lazy import LazyService, startup_timings
+from utils.metrics import MetricsRegistry, TimedProxy, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from utils.profiler import ProfileSession, RequestProfiler
+from utils.image_processing import base64_to_image, bytes_to_image, image_to_base64, annotate_faces
+
+# Dépendance optionnelle pour la reconnaissance en continu (/api/stream)
+try:
+    from flask_sock import Sock
+except ImportError:
+    Sock = None
 
 # Initialiser l'application Flask
 app = Flask(__name__)
 CORS(app)  # Activer CORS pour permettre les requêtes cross-origin
+sock = Sock(app) if Sock else None
+
+# Nombre maximal d'images acceptées par /api/recognize/batch
+MAX_BATCH_IMAGES = int(os.getenv('MAX_BATCH_IMAGES', 32))
+
+# Exécuteur d'inférence : traitements simultanés, file d'attente (au-delà : 503) et délai maximal
+INFERENCE_WORKERS = int(os.getenv('INFERENCE_WORKERS', 0)) or os.cpu_count() or 1
+INFERENCE_QUEUE = int(os.getenv('INFERENCE_QUEUE', 2 * INFERENCE_WORKERS))
+INFERENCE_TIMEOUT = float(os.getenv('INFERENCE_TIMEOUT', 30))
+# Nombre maximal de visages de requêtes /api/recognize concurrentes reconnus en un seul lot
+RECOGNIZE_BATCH_SIZE = int(os.getenv('RECOGNIZE_BATCH_SIZE', 32))
+# Lots de reconnaissance exécutés simultanément par les threads d'inférence (les autres détectent pendant ce temps)
+RECOGNIZE_BATCH_WORKERS = int(os.getenv('RECOGNIZE_BATCH_WORKERS', 0)) or max(1, INFERENCE_WORKERS // 2)
+
+# Mode des embeddings : 'raw' (pixels, 10 000 dimensions), 'pca' (projection apprise)
+# ou 'dnn' (modèle d'embedding EMBEDDING_MODEL exécuté par cv2.dnn)
+EMBEDDING_MODE = os.getenv('EMBEDDING_MODE', 'raw').lower()
+PCA_PROJECTION_PATH = os.path.join('../database', 'pca_projection.npz')
+EMBEDDING_MODEL_PATH = os.getenv('EMBEDDING_MODEL')
+# Threads internes d'OpenCV : par défaut, les cœurs sont répartis entre les workers d'inférence
+DNN_THREADS = int(os.getenv('DNN_THREADS', 0)) or max(1, (os.cpu_count() or 1) // INFERENCE_WORKERS)
+
+def get_embedding_space():
+    """
+    Espace d'embedding de la configuration ('raw', 'pca' ou identifiant du modèle).
+    """
+    if EMBEDDING_MODE == 'dnn':
+        if not EMBEDDING_MODEL_PATH or not os.path.exists(EMBEDDING_MODEL_PATH):
+            raise RuntimeError(f"Modèle d'embedding introuvable: {EMBEDDING_MODEL_PATH} (variable EMBEDDING_MODEL)")
+        return model_space(EMBEDDING_MODEL_PATH)
+    return 'pca' if EMBEDDING_MODE == 'pca' else 'raw'
+
+# Précision des embeddings en mémoire et sur disque : float32, float16 ou int8
+EMBEDDING_PRECISION = os.getenv('EMBEDDING_PRECISION', 'float32').lower()
+
+# Modèles (templates) par utilisateur : nombre maximal (images d'enrôlement, modèles ajoutés ensuite)
+# et comparaison à un utilisateur : 'min' (modèle le plus proche) ou 'centroid' (centroïde précalculé)
+MAX_TEMPLATES = int(os.getenv('MAX_TEMPLATES', 5))
+TEMPLATE_REDUCTION = os.getenv('TEMPLATE_REDUCTION', 'min').lower()
+
+# Index approximatif optionnel (ANN_INDEX=ivf), la recherche exacte reste le défaut
+ANN_INDEX_PATH = os.path.join('../database', 'ann_index.npz')
+# Délai de sauvegarde de l'index après une modification (les modifications rapprochées sont regroupées)
+ANN_INDEX_SAVE_DELAY = float(os.getenv('ANN_INDEX_SAVE_DELAY', 10))
 
-# Initialiser les services
-face_detector = FaceDetector()
-face_recognizer = FaceRecognizer(threshold=0.6)
-database = Database(db_dir='../database')
+# Aperçu annoté renvoyé par /api/detect et /api/recognize (désactivable par requête avec annotate=false)
+ANNOTATION_JPEG_QUALITY = int(os.getenv('ANNOTATION_JPEG_QUALITY', 75))
+ANNOTATION_MAX_WIDTH = int(os.getenv('ANNOTATION_MAX_WIDTH', 0)) or None
+
+# Préréglage de détection (accurate, balanced, fast ou kiosk) et largeur d'analyse optionnelle
+DETECTION_PRESET = os.getenv('DETECTION_PRESET', 'accurate').lower()
+DETECTION_WIDTH = int(os.getenv('DETECTION_WIDTH', 0)) or None
+
+# Suivi du visage dans /api/stream (FACE_TRACKING=0 pour détecter sur chaque image entière)
+FACE_TRACKING = os.getenv('FACE_TRACKING', '1').lower() not in ('0', 'false', 'no')
+TRACKING_REDETECT_INTERVAL = int(os.getenv('TRACKING_REDETECT_INTERVAL', 10))
+
+# Profilage des requêtes d'inférence : proportion échantillonnée (0 = sur demande uniquement)
+# et nombre de profils conservés en mémoire
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+PROFILE_BUFFER_SIZE = int(os.getenv('PROFILE_BUFFER_SIZE', 20))
+
+# Galerie partagée entre workers (ex. SHARED_GALLERY=/dev/shm/facial_auth_gallery.bin)
+SHARED_GALLERY_PATH = os.getenv('SHARED_GALLERY')
+
+def create_face_recognizer(projection_path=PCA_PROJECTION_PATH, standalone=False):
+    """
+    Construit le reconnaisseur et charge la galerie depuis la base de données.
+    
+    Args:
+        projection_path (str, optional): Projection PCA utilisée en mode 'pca'.
+        standalone (bool, optional): Reconnaisseur des commandes d'administration (manage.py) :
+            galerie privée plutôt que partagée, index approximatif laissé à l'appelant.
+    """
+    projection = None
+    if EMBEDDING_MODE == 'pca':
+        if not os.path.exists(projection_path):
+            raise RuntimeError("Projection PCA introuvable, lancer 'python manage.py fit-pca'")
+        projection = PCAProjection.load(projection_path)
+    
+    model_path = None
+    if EMBEDDING_MODE == 'dnn':
+        get_embedding_space()  # Vérifie la présence du modèle
+        model_path = EMBEDDING_MODEL_PATH
+    
+    gallery = None
+    if SHARED_GALLERY_PATH and not standalone:
+        gallery = SharedGallery(SHARED_GALLERY_PATH, precision=EMBEDDING_PRECISION)
+    
+    recognizer = FaceRecognizer(
+        model_path=model_path,
+        num_threads=DNN_THREADS,
+        threshold=float(os.getenv('RECOGNITION_THRESHOLD', 0.6)),
+        projection=projection,
+        precision=EMBEDDING_PRECISION,
+        gallery=gallery,
+        max_templates=MAX_TEMPLATES,
+        template_reduction=TEMPLATE_REDUCTION
+    )
+    load_known_faces(recognizer)
+    
+    if os.getenv('ANN_INDEX', '').lower() == 'ivf' and not standalone:
+        reloaded = recognizer.enable_index(
+            n_lists=int(os.getenv('ANN_N_LISTS', 0)) or None,
+            n_probe=int(os.getenv('ANN_N_PROBE', 8)),
+            index_path=ANN_INDEX_PATH
+        )
+        if not reloaded:
+            recognizer.save_index(ANN_INDEX_PATH)
+    
+    return recognizer
+
+# Métriques exportées par /api/metrics (format Prometheus)
+metrics = MetricsRegistry()
+stage_seconds = metrics.histogram(
+    'facial_auth_stage_duration_seconds', "Durée des étapes du pipeline d'inférence", ['stage'])
+request_seconds = metrics.histogram(
+    'facial_auth_request_duration_seconds', "Durée des requêtes d'inférence", ['endpoint', 'status'])
+database_seconds = metrics.histogram(
+    'facial_auth_database_duration_seconds', "Durée des opérations de base de données", ['operation'])
+
+# Initialiser les services à leur première utilisation
+face_detector = LazyService('face_detector', lambda: create_face_detector(  # DETECTOR_BACKEND=haar|ssd|yunet
+    preset=DETECTION_PRESET,
+    **({'detection_width': DETECTION_WIDTH} if DETECTION_WIDTH else {})
+))
+face_recognizer = LazyService('face_recognizer', create_face_recognizer)
+database = LazyService('database', lambda: TimedProxy(create_database(  # DB_BACKEND=json|sqlite
+    db_dir='../database',
+    embedding_space=get_embedding_space(),
+    embedding_dtype=EMBEDDING_PRECISION
+), database_seconds))
+# Créés dans chaque worker (hors préchauffage) : des threads démarrés avant le fork n'y survivraient pas
+inference_executor = LazyService('inference_executor', lambda: InferenceExecutor(
+    workers=INFERENCE_WORKERS,
+    max_queue=INFERENCE_QUEUE,
+    cv_threads=DNN_THREADS
+))
+match_batcher = LazyService('match_batcher', lambda: MicroBatcher(
+    face_recognizer.recognize_batch,
+    max_batch=RECOGNIZE_BATCH_SIZE,
+    concurrency=RECOGNIZE_BATCH_WORKERS
+))
+
+request_profiler = RequestProfiler(capacity=PROFILE_BUFFER_SIZE, sample_rate=PROFILE_SAMPLE_RATE)
+
+# Sauvegarder à l'arrêt du processus l'index modifié depuis sa dernière sauvegarde
+atexit.register(lambda: face_recognizer.flush_index_save() if face_recognizer.is_loaded else None)
+
+# Jauges lues à l'export, sans construire les services qui ne sont pas encore utilisés
+metrics.callback('facial_auth_gallery_size', "Nombre de visages dans la galerie",
+                 lambda: len(face_recognizer.gallery) if face_recognizer.is_loaded else None)
+metrics.callback('facial_auth_inference_in_flight', "Traitements d'inférence en cours ou en attente",
+                 lambda: inference_executor.in_flight if inference_executor.is_loaded else None)
+metrics.callback('facial_auth_inference_completed_total', "Traitements d'inférence terminés",
+                 lambda: inference_executor.completed if inference_executor.is_loaded else None, 'counter')
+metrics.callback('facial_auth_inference_rejected_total', "Requêtes refusées (exécuteur saturé)",
+                 lambda: inference_executor.rejected if inference_executor.is_loaded else None, 'counter')
+metrics.callback('facial_auth_recognize_batches_total', "Lots de reconnaissance traités",
+                 lambda: match_batcher.batches if match_batcher.is_loaded else None, 'counter')
+metrics.callback('facial_auth_recognize_batched_faces_total', "Visages reconnus par lots",
+                 lambda: match_batcher.items if match_batcher.is_loaded else None, 'counter')
 
 # Créer le répertoire de la base de données s'il n'existe pas
 os.makedirs('../database', exist_ok=True)
 
 # Charger les visages connus depuis la base de données
-def load_known_faces():
+def load_known_faces(recognizer=None):
     """
     Charge les visages connus depuis la base de données.
+    
+    Args:
+        recognizer (FaceRecognizer, optional): Reconnaisseur à remplir (celui de l'application par défaut).
     """
-    users = database.get_all_users()
-    for user in users:
-        if user.face_embedding is not None:
-            face_recognizer.known_faces[user.user_id] = user.face_embedding
+    recognizer = recognizer or face_recognizer
+    space = recognizer.embedding_space
+    user_ids, embeddings = database.get_all_embeddings(space=space)
+    
+    # Ne jamais mélanger des embeddings d'extracteurs différents
+    if len(user_ids) and embeddings.shape[1] != recognizer.embedding_dim:
+        raise RuntimeError(f"Embeddings '{space}' de dimension {embeddings.shape[1]}, "
+                           f"le reconnaisseur produit {recognizer.embedding_dim} dimensions")
+    missing = database.count_users() - len({template_owner(key) for key in user_ids})
+    if missing > 0:
+        print(f"{missing} utilisateur(s) sans embedding dans l'espace '{space}' (réenrôlement nécessaire)")
+    
+    recognizer.load_embeddings(user_ids, embeddings)
+
+def warmup():
+    """
+    Initialise tous les services. À appeler avant le fork des workers (gunicorn
+    --preload) pour que la cascade et la galerie soient partagées en copie sur écriture.
+    
+    Returns:
+        dict: Durées d'initialisation par service, en millisecondes.
+    """
+    face_detector.get()
+    database.get()
+    face_recognizer.get()
+    return dict(startup_timings)
+
+def read_request_image():
+    """
+    Lit l'image (encodée) et les champs d'une requête, dans l'un des formats acceptés :
+    JSON (image base64 dans le champ 'image'), multipart/form-data (fichier 'image')
+    ou corps binaire JPEG/PNG (application/octet-stream, image/*) avec les champs en paramètres d'URL.
+    Le décodage est laissé à l'exécuteur d'inférence (voir decode_image).
+    
+    Returns:
+        tuple: (image encodée - chaîne base64 ou octets - ou None si absente, dictionnaire des autres champs).
+    """
+    if request.is_json:
+        fields = request.get_json(silent=True) or {}
+        return fields.get('image') or None, fields
+    
+    if request.mimetype == 'multipart/form-data':
+        image_file = request.files.get('image')
+        fields = request.form.to_dict()
+        return (image_file.read() if image_file else None), fields
+    
+    return request.get_data() or None, request.args.to_dict()
+
+def read_enrollment_frames(encoded, fields):
+    """
+    Images d'un enrôlement : l'image principale puis les images supplémentaires (liste base64
+    'images' en JSON, fichiers 'image' multiples en multipart), au plus MAX_TEMPLATES.
+    
+    Returns:
+        list: Images encodées (chaînes base64 ou octets).
+    """
+    frames = [encoded] if encoded is not None else []
+    if request.mimetype == 'multipart/form-data':
+        frames += [image_file.read() for image_file in request.files.getlist('image')[1:]]
+    elif isinstance(fields.get('images'), list):
+        frames += [image for image in fields['images'] if image]
+    return frames[:MAX_TEMPLATES]
+
+def wants_grayscale():
+    """
+    Indique si l'image doit être décodée directement en niveaux de gris (paramètre d'URL grayscale=1).
+    """
+    return request.args.get('grayscale', '').lower() in ('1', 'true', 'yes')
+
+def decode_image(encoded, grayscale=False):
+    """
+    Décode une image lue par read_request_image.
+    
+    Args:
+        encoded (str | bytes): Chaîne base64 ou octets JPEG/PNG.
+        grayscale (bool, optional): Décoder directement en niveaux de gris.
+        
+    Returns:
+        numpy.ndarray: Image OpenCV.
+    """
+    if isinstance(encoded, str):
+        return base64_to_image(encoded, grayscale)
+    return bytes_to_image(encoded, grayscale)
+
+def wants_annotation(fields):
+    """
+    Indique si la requête demande l'image annotée (champ ou paramètre d'URL 'annotate', vrai par défaut).
+    
+    Args:
+        fields (dict): Champs de la requête.
+        
+    Returns:
+        bool: True si l'image annotée doit être renvoyée.
+    """
+    annotate = fields.get('annotate', request.args.get('annotate', True))
+    if isinstance(annotate, str):
+        return annotate.lower() not in ('0', 'false', 'no')
+    return bool(annotate)
+
+def render_annotation(image, faces):
+    """
+    Dessine les visages sur un aperçu (réduit à ANNOTATION_MAX_WIDTH) et l'encode en base64.
+    
+    Args:
+        image (numpy.ndarray): Image source.
+        faces (list): Liste [(face_coords, label, color), ...].
+        
+    Returns:
+        str: Image annotée en base64 (JPEG de qualité ANNOTATION_JPEG_QUALITY).
+    """
+    annotated_image = annotate_faces(image, faces, max_width=ANNOTATION_MAX_WIDTH)
+    return image_to_base64(annotated_image, quality=ANNOTATION_JPEG_QUALITY)
+
+def profile_requested(headers, args):
+    """
+    Indique si la requête demande son profilage (en-tête X-Profile: 1 ou paramètre d'URL profile=1).
+    """
+    return str(headers.get('X-Profile', args.get('profile', ''))).lower() in ('1', 'true', 'yes')
+
+def inference_endpoint(view):
+    """
+    Décorateur des endpoints d'inférence : mesure les étapes de la requête (g.timings), les renvoie
+    dans l'en-tête Server-Timing et répond 503 quand l'exécuteur d'inférence est saturé.
+    La requête est profilée (g.profile) sur demande authentifiée ou par échantillonnage ;
+    l'identifiant du profil est renvoyé dans l'en-tête X-Profile-Id.
+    """
+    @wraps(view)
+    def decorated(*args, **kwargs):
+        # Le profilage à la demande est réservé aux administrateurs (token_required)
+        requested = profile_requested(request.headers, request.args)
+        if requested and not verify_token(get_bearer_token(request.headers) or ''):
+            return jsonify({'message': 'Token manquant ou invalide pour le profilage!'}), 401
+        trigger = 'request' if requested else ('sampled' if request_profiler.should_sample() else None)
+        
+        start = time.perf_counter()
+        g.timings = StageTimings()
+        g.profile = ProfileSession() if trigger else None
+        if g.profile:
+            g.profile.start()
+        try:
+            response = make_response(view(*args, **kwargs))
+        except ExecutorSaturated as e:
+            response = make_response(jsonify({'error': str(e)}), 503)
+            response.headers['Retry-After'] = '1'
+        finally:
+            if g.profile:
+                g.profile.stop()
+        duration = time.perf_counter() - start
+        
+        response.headers['Server-Timing'] = g.timings.server_timing()
+        record_request(request.url_rule.rule if request.url_rule else UNMATCHED_ENDPOINT,
+                       response.status_code, g.timings, duration)
+        if g.profile:
+            profile_id = request_profiler.store(g.profile, request.path, duration * 1000, trigger)
+            if profile_id:
+                response.headers['X-Profile-Id'] = profile_id
+        return response
+    
+    return decorated
 
-# Charger les visages au démarrage
-load_known_faces()
+# Étiquette 'endpoint' des requêtes sans route (le chemin brut rendrait le nombre de séries illimité)
+UNMATCHED_ENDPOINT = 'unmatched'
+
+def record_request(endpoint, status, timings, duration):
+    """
+    Ajoute la durée d'une requête d'inférence et de ses étapes aux métriques.
+    
+    Args:
+        endpoint (str): Modèle de la route (ex. '/api/users/<enrolled_id>/templates'), jamais le
+            chemin brut : un identifiant dans l'étiquette créerait une série par utilisateur.
+        status (int): Code de réponse HTTP.
+        timings (StageTimings): Durées des étapes, en millisecondes.
+        duration (float): Durée totale, en secondes.
+    """
+    for stage, duration_ms in timings.durations.items():
+        stage_seconds.observe(duration_ms / 1000, stage)
+    request_seconds.observe(duration, endpoint, str(status))
+
+def run_inference(fn, *args):
+    """
+    Exécute un traitement dans l'exécuteur d'inférence ; il reçoit les durées de la requête en dernier argument.
+    Si la requête est profilée, le traitement l'est aussi dans le thread de l'exécuteur.
+    
+    Raises:
+        ExecutorSaturated: File d'attente pleine ou délai dépassé.
+    """
+    if g.get('profile') is None:
+        return inference_executor.run(fn, *args, g.timings, timings=g.timings, timeout=INFERENCE_TIMEOUT)
+    
+    with g.profile.paused():
+        return inference_executor.run(g.profile.wrap(fn), *args, g.timings, timings=g.timings, timeout=INFERENCE_TIMEOUT)
+
+def health_status():
+    """
+    État de l'API (commun aux points d'entrée WSGI et ASGI).
+    
+    Returns:
+        dict: Réponse de /api/health.
+    """
+    return {
+        'status': 'ok',
+        'message': 'API opérationnelle',
+        'startup_ms': {name: round(duration, 1) for name, duration in startup_timings.items()},
+        'inference': inference_executor.stats() if inference_executor.is_loaded else None,
+        'stage_latency_ms': {
+            stage: {f"p{int(q * 100)}": round(stage_seconds.quantile(q, stage) * 1000, 2) for q in (0.5, 0.95, 0.99)}
+            for (stage,) in stage_seconds.label_values()
+        },
+        'recognize_batching': match_batcher.stats() if match_batcher.is_loaded else None
+    }
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """
     Endpoint de vérification de l'état de l'API.
     """
-    return jsonify({'status': 'ok', 'message': 'API opérationnelle'})
+    return jsonify(health_status())
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Endpoint des métriques au format texte Prometheus (durées par étape, par requête
+    et par opération de base de données, occupation de l'exécuteur, taille de la galerie).
+    """
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+def detect_image(encoded, grayscale, annotate, timings):
+    """
+    Décode une image et détecte ses visages (exécuté dans l'exécuteur d'inférence).
+    
+    Returns:
+        dict: Réponse de /api/detect.
+    """
+    with timings.stage('decode'):
+        image = decode_image(encoded, grayscale)
+    
+    # Détecter les visages
+    with timings.stage('detect'):
+        faces = face_detector.detect(image)
+    
+    # Préparer la réponse
+    result = {
+        'faces_detected': len(faces),
+        'faces': [{'x': int(x), 'y': int(y), 'width': int(w), 'height': int(h)} for (x, y, w, h) in faces]
+    }
+    
+    # Si des visages sont détectés, ajouter une image annotée (sauf annotate=false)
+    if len(faces) > 0 and annotate:
+        with timings.stage('annotate'):
+            result['annotated_image'] = render_annotation(image, [(face_coords, None, (0, 255, 0)) for face_coords in faces])
+    
+    return result
 
 @app.route('/api/detect', methods=['POST'])
+@inference_endpoint
 def detect_face():
     """
     Endpoint pour détecter les visages dans une image.
     """
-    # Vérifier si l'image est présente dans la requête
-    if 'image' not in request.json:
-        return jsonify({'error': 'Image manquante'}), 400
-    
     try:
-        # Convertir l'image base64 en image OpenCV
-        image_data = request.json['image']
-        image = base64_to_image(image_data)
+        # Lire l'image (base64 JSON, multipart ou binaire)
+        encoded, fields = read_request_image()
+        if encoded is None:
+            return jsonify({'error': 'Image manquante'}), 400
         
-        # Détecter les visages
+        return jsonify(run_inference(detect_image, encoded, wants_grayscale(), wants_annotation(fields)))
+    
+    except ExecutorSaturated:
+        raise
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def recognize_image(encoded, grayscale, annotate, timings):
+    """
+    Décode une image et reconnaît son plus grand visage (exécuté dans l'exécuteur d'inférence).
+    La reconnaissance est regroupée avec celle des requêtes concurrentes (match_batcher).
+    
+    Returns:
+        dict: Réponse de /api/recognize.
+    """
+    with timings.stage('decode'):
+        image = decode_image(encoded, grayscale)
+    
+    # Détecter les visages
+    with timings.stage('detect'):
         faces = face_detector.detect(image)
+    
+    # Si aucun visage n'est détecté
+    if len(faces) == 0:
+        return {'recognized': False, 'message': 'Aucun visage détecté'}
+    
+    # Prendre le premier visage détecté (le plus grand)
+    face_coords = max(faces, key=lambda rect: rect[2] * rect[3])
+    
+    # Extraire et prétraiter le visage
+    with timings.stage('preprocess'):
+        face_img = face_detector.extract_face(image, face_coords)
+        processed_face = face_detector.preprocess_face(face_img)
+    
+    # Reconnaître le visage
+    with timings.stage('recognize'):
+        user_id, confidence = match_batcher.submit(processed_face, timeout=INFERENCE_TIMEOUT)
+    x, y, w, h = face_coords
+    face = {'x': int(x), 'y': int(y), 'width': int(w), 'height': int(h)}
+    
+    # Préparer la réponse
+    if user_id:
+        # Récupérer les informations de l'utilisateur
+        user = database.get_user(user_id)
         
-        # Préparer la réponse
         result = {
-            'faces_detected': len(faces),
-            'faces': [{'x': int(x), 'y': int(y), 'width': int(w), 'height': int(h)} for (x, y, w, h) in faces]
+            'recognized': True,
+            'user': user.to_dict() if user else None,
+            'confidence': float(confidence),
+            'face': face
         }
         
-        # Si des visages sont détectés, ajouter une image annotée
-        if len(faces) > 0:
-            # Dessiner des rectangles autour des visages
-            for face_coords in faces:
-                image = draw_face_rectangle(image, face_coords)
-            
-            # Convertir l'image annotée en base64
-            result['annotated_image'] = image_to_base64(image)
+        # Dessiner un rectangle autour du visage avec le nom
+        if annotate:
+            label = f"{user.name}, {user.age} ans, {user.profession}" if user else "Inconnu"
+            with timings.stage('annotate'):
+                result['annotated_image'] = render_annotation(image, [(face_coords, label, (0, 255, 0))])
         
-        return jsonify(result)
+        # Ajouter une entrée de journal
+        database.add_log({
+            'timestamp': str(np.datetime64('now')),
+            'action': 'recognition',
+            'user_id': user_id,
+            'result': 'success',
+            'confidence': float(confidence)
+        })
+    else:
+        result = {
+            'recognized': False,
+            'message': 'Visage non reconnu',
+            'face': face
+        }
+        
+        # Dessiner un rectangle autour du visage avec "Inconnu"
+        if annotate:
+            with timings.stage('annotate'):
+                result['annotated_image'] = render_annotation(image, [(face_coords, "Inconnu", (0, 0, 255))])
+        
+        # Ajouter une entrée de journal
+        database.add_log({
+            'timestamp': str(np.datetime64('now')),
+            'action': 'recognition',
+            'result': 'failure',
+            'message': 'Visage non reconnu'
+        })
     
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    return result
 
 @app.route('/api/recognize', methods=['POST'])
+@inference_endpoint
 def recognize_face():
     """
     Endpoint pour reconnaître un visage.
     """
-    # Vérifier si l'image est présente dans la requête
-    if 'image' not in request.json:
-        return jsonify({'error': 'Image manquante'}), 400
-    
     try:
-        # Convertir l'image base64 en image OpenCV
-        image_data = request.json['image']
-        image = base64_to_image(image_data)
-        
-        # Détecter les visages
-        faces = face_detector.detect(image)
+        # Lire l'image (base64 JSON, multipart ou binaire)
+        encoded, fields = read_request_image()
+        if encoded is None:
+            return jsonify({'error': 'Image manquante'}), 400
         
-        # Si aucun visage n'est détecté
-        if len(faces) == 0:
-            return jsonify({'recognized': False, 'message': 'Aucun visage détecté'})
-        
-        # Prendre le premier visage détecté (le plus grand)
-        face_coords = max(faces, key=lambda rect: rect[2] * rect[3])
-        
-        # Extraire et prétraiter le visage
-        face_img = face_detector.extract_face(image, face_coords)
-        processed_face = face_detector.preprocess_face(face_img)
+        return jsonify(run_inference(recognize_image, encoded, wants_grayscale(), wants_annotation(fields)))
+    
+    except ExecutorSaturated:
+        raise
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def recognize_images(images_data, timings):
+    """
+    Reconnaît tous les visages de plusieurs images (exécuté dans l'exécuteur d'inférence).
+    
+    Returns:
+        list: Résultats par image de /api/recognize/batch.
+    """
+    # Détecter et prétraiter tous les visages de toutes les images
+    face_refs = []
+    processed_faces = []
+    results = []
+    with timings.stage('decode'):
+        images = [base64_to_image(image_data) for image_data in images_data]
+    with timings.stage('detect'):
+        detections = face_detector.detect_batch(images)
+    with timings.stage('preprocess'):
+        for image_index, (image, faces) in enumerate(zip(images, detections)):
+            results.append({'image_index': image_index, 'faces_detected': len(faces), 'faces': []})
+            
+            for face_coords in faces:
+                face_img = face_detector.extract_face(image, face_coords)
+                processed_faces.append(face_detector.preprocess_face(face_img))
+                face_refs.append((image_index, face_coords))
+    
+    # Reconnaître tous les visages en une seule opération matricielle
+    with timings.stage('recognize'):
+        matches = face_recognizer.recognize_batch(processed_faces)
+    
+    users = {}
+    for (image_index, (x, y, w, h)), (user_id, confidence) in zip(face_refs, matches):
+        if user_id and user_id not in users:
+            users[user_id] = database.get_user(user_id)
+        user = users.get(user_id)
         
-        # Reconnaître le visage
-        user_id, confidence = face_recognizer.recognize(processed_face)
+        results[image_index]['faces'].append({
+            'x': int(x), 'y': int(y), 'width': int(w), 'height': int(h),
+            'recognized': user_id is not None,
+            'user': user.to_dict() if user else None,
+            'confidence': float(confidence) if confidence is not None else None
+        })
         
-        # Préparer la réponse
+        # Ajouter une entrée de journal
         if user_id:
-            # Récupérer les informations de l'utilisateur
-            user = database.get_user(user_id)
-            
-            # Dessiner un rectangle autour du visage avec le nom
-            label = f"{user.name}, {user.age} ans, {user.profession}" if user else "Inconnu"
-            annotated_image = draw_face_rectangle(image, face_coords, label)
-            
-            result = {
-                'recognized': True,
-                'user': user.to_dict() if user else None,
-                'confidence': float(confidence),
-                'annotated_image': image_to_base64(annotated_image)
-            }
-            
-            # Ajouter une entrée de journal
             database.add_log({
                 'timestamp': str(np.datetime64('now')),
                 'action': 'recognition',
@@ -142,98 +639,446 @@ def recognize_face():
                 'confidence': float(confidence)
             })
         else:
-            # Dessiner un rectangle autour du visage avec "Inconnu"
-            annotated_image = draw_face_rectangle(image, face_coords, "Inconnu", color=(0, 0, 255))
-            
-            result = {
-                'recognized': False,
-                'message': 'Visage non reconnu',
-                'annotated_image': image_to_base64(annotated_image)
-            }
-            
-            # Ajouter une entrée de journal
             database.add_log({
                 'timestamp': str(np.datetime64('now')),
                 'action': 'recognition',
                 'result': 'failure',
                 'message': 'Visage non reconnu'
             })
-        
-        return jsonify(result)
     
+    return results
+
+@app.route('/api/recognize/batch', methods=['POST'])
+@inference_endpoint
+def recognize_faces_batch():
+    """
+    Endpoint pour reconnaître tous les visages de plusieurs images en une seule requête.
+    """
+    # Vérifier si les images sont présentes dans la requête
+    body = request.get_json(silent=True)
+    images_data = body.get('images') if isinstance(body, dict) else None
+    if not images_data or not isinstance(images_data, list):
+        return jsonify({'error': 'Images manquantes'}), 400
+    
+    if len(images_data) > MAX_BATCH_IMAGES:
+        return jsonify({'error': f'Trop d\'images (maximum {MAX_BATCH_IMAGES})'}), 400
+    
+    try:
+        return jsonify({'results': run_inference(recognize_images, images_data)})
+    
+    except ExecutorSaturated:
+        raise
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/users', methods=['POST'])
-def add_user():
+def recognition_stream(ws):
     """
-    Endpoint pour ajouter un nouvel utilisateur.
+    Endpoint WebSocket de reconnaissance en continu.
+    Le client envoie des images (binaire JPEG/PNG, ou texte base64) ; seule la plus récente est
+    traitée et un événement JSON n'est envoyé que lorsque l'identité change.
     """
-    # Vérifier si les données sont présentes dans la requête
-    required_fields = ['name', 'age', 'profession', 'image']
-    for field in required_fields:
-        if field not in request.json:
-            return jsonify({'error': f'Champ manquant: {field}'}), 400
+    tracker = FaceTracker(face_detector, redetect_interval=TRACKING_REDETECT_INTERVAL) if FACE_TRACKING else None
+    session = RecognitionSession(face_detector, face_recognizer, database, tracker=tracker)
+    frames = LatestFrame()
+    # Chaque image est traitée dans l'exécuteur d'inférence, soumise au même contrôle d'admission
+    # que les autres requêtes (image abandonnée et événement 'busy' s'il est saturé)
+    worker = threading.Thread(
+        target=session.run,
+        args=(frames, lambda event: ws.send(json.dumps(event))),
+        kwargs={'execute': lambda fn, frame: inference_executor.run(fn, frame, timeout=INFERENCE_TIMEOUT)},
+        daemon=True
+    )
+    worker.start()
     
     try:
-        # Extraire les données
-        name = request.json['name']
-        age = request.json['age']
-        profession = request.json['profession']
-        image_data = request.json['image']
-        
-        # Convertir l'image base64 en image OpenCV
-        image = base64_to_image(image_data)
+        # Réception : déposer chaque image, sans attendre la fin du traitement de la précédente
+        while True:
+            frame = ws.receive()
+            if frame is None:
+                break
+            frames.put(frame)
+    finally:
+        frames.close()
+        worker.join()
+
+if sock:
+    sock.route('/api/stream')(recognition_stream)
+else:
+    print("flask-sock non installé, reconnaissance en continu (/api/stream) désactivée")
+
+def extract_enrollment_faces(frames, grayscale, timings):
+    """
+    Décode des images d'enrôlement et calcule en un lot les embeddings du plus grand visage
+    de chacune (exécuté dans l'exécuteur d'inférence). Les images sans visage sont ignorées.
+    
+    Returns:
+        list: Tuples (visage prétraité, embedding), dans l'ordre des images.
+    """
+    processed_faces = []
+    for encoded in frames:
+        with timings.stage('decode'):
+            image = decode_image(encoded, grayscale)
         
         # Détecter les visages
-        faces = face_detector.detect(image)
+        with timings.stage('detect'):
+            faces = face_detector.detect(image)
         
         # Si aucun visage n'est détecté
         if len(faces) == 0:
-            return jsonify({'error': 'Aucun visage détecté dans l\'image'}), 400
+            continue
         
         # Prendre le premier visage détecté (le plus grand)
         face_coords = max(faces, key=lambda rect: rect[2] * rect[3])
         
         # Extraire et prétraiter le visage
-        face_img = face_detector.extract_face(image, face_coords)
-        processed_face = face_detector.preprocess_face(face_img)
+        with timings.stage('preprocess'):
+            face_img = face_detector.extract_face(image, face_coords)
+            processed_faces.append(face_detector.preprocess_face(face_img))
+    
+    if not processed_faces:
+        return []
+    
+    # Extraire les caractéristiques des visages
+    with timings.stage('embed'):
+        face_embeddings = face_recognizer.extract_features_batch(processed_faces)
+    
+    return list(zip(processed_faces, face_embeddings))
+
+def extract_enrollment_face(encoded, grayscale, timings):
+    """
+    Décode une image d'enrôlement et calcule l'embedding de son plus grand visage
+    (exécuté dans l'exécuteur d'inférence).
+    
+    Returns:
+        tuple: (visage prétraité, embedding), ou None si aucun visage n'est détecté.
+    """
+    enrollments = extract_enrollment_faces([encoded], grayscale, timings)
+    return enrollments[0] if enrollments else None
+
+def enroll_user(name, age, profession, processed_face, face_embedding, extra_templates=()):
+    """
+    Enregistre un nouvel utilisateur et ajoute son visage au reconnaisseur.
+    
+    Args:
+        name (str): Nom de l'utilisateur.
+        age (int): Âge de l'utilisateur.
+        profession (str): Profession de l'utilisateur.
+        processed_face (numpy.ndarray): Visage prétraité (voir extract_enrollment_face).
+        face_embedding (numpy.ndarray): Embedding du visage (modèle principal).
+        extra_templates (list, optional): Tuples (visage prétraité, embedding) des autres images
+            d'enrôlement, conservés comme modèles supplémentaires (jusqu'à MAX_TEMPLATES au total).
         
-        # Générer un ID utilisateur unique
-        user_id = str(uuid.uuid4())
+    Returns:
+        str: ID du nouvel utilisateur, ou None si l'ajout en base a échoué.
+    """
+    # Générer un ID utilisateur unique
+    user_id = str(uuid.uuid4())
+    
+    # Créer un nouvel utilisateur
+    user = User(
+        user_id=user_id,
+        name=name,
+        age=age,
+        profession=profession
+    )
+    user.face_embedding = face_embedding
+    
+    # Ajouter l'utilisateur à la base de données, puis ses modèles supplémentaires
+    if not database.add_user(user):
+        return None
+    templates = [(processed_face, face_embedding)] + list(extra_templates)[:face_recognizer.max_templates - 1]
+    embeddings = np.array([embedding for _, embedding in templates])
+    if len(templates) > 1:
+        database.put_templates(user_id, embeddings)
+    
+    # Conserver aussi les vecteurs bruts pour pouvoir ré-ajuster la projection
+    if face_recognizer.projection is not None:
+        database.put_templates(user_id, np.array([face_recognizer.extract_raw_features(face) for face, _ in templates]),
+                               space='raw')
+    
+    # Ajouter le visage (ses modèles) au reconnaisseur
+    face_recognizer.set_templates(user_id, embeddings)
+    face_recognizer.schedule_index_save(ANN_INDEX_PATH, ANN_INDEX_SAVE_DELAY)
+    
+    # Ajouter une entrée de journal
+    database.add_log({
+        'timestamp': str(np.datetime64('now')),
+        'action': 'user_added',
+        'user_id': user_id,
+        'name': name
+    })
+    
+    return user_id
+
+def add_user_template(user_id, processed_face, face_embedding):
+    """
+    Ajoute un modèle à un utilisateur existant (ex. image d'une reconnaissance validée, sous un
+    nouvel éclairage). Au-delà de MAX_TEMPLATES, il remplace le modèle supplémentaire qui lui est
+    le plus proche (le plus redondant) ; le modèle principal est toujours conservé.
+    
+    Args:
+        user_id (str): ID de l'utilisateur.
+        processed_face (numpy.ndarray): Visage prétraité.
+        face_embedding (numpy.ndarray): Embedding du visage.
         
-        # Créer un nouvel utilisateur
-        user = User(
-            user_id=user_id,
-            name=name,
-            age=age,
-            profession=profession
-        )
+    Returns:
+        int: Nombre de modèles de l'utilisateur, ou None si l'écriture a échoué.
+    """
+    max_templates = face_recognizer.max_templates
+    templates = database.get_templates(user_id)[:max_templates]
+    if len(templates) < max_templates:
+        slot = len(templates)
+    elif max_templates == 1:
+        slot = 0
+    else:
+        slot = 1 + int(np.argmax(templates[1:] @ np.ravel(face_embedding)))
+    
+    def replace(matrix, vector):
+        rows = list(matrix)
+        rows[slot:slot + 1] = [np.ravel(vector)]
+        return np.array(rows, dtype=np.float32)
+    
+    templates = replace(templates, face_embedding)
+    if not database.put_templates(user_id, templates):
+        return None
+    if face_recognizer.projection is not None:
+        raw_templates = database.get_templates(user_id, space='raw')[:max_templates]
+        database.put_templates(user_id, replace(raw_templates, face_recognizer.extract_raw_features(processed_face)),
+                               space='raw')
+    
+    face_recognizer.set_templates(user_id, templates)
+    face_recognizer.schedule_index_save(ANN_INDEX_PATH, ANN_INDEX_SAVE_DELAY)
+    
+    database.add_log({
+        'timestamp': str(np.datetime64('now')),
+        'action': 'template_added',
+        'user_id': user_id,
+        'templates': len(templates)
+    })
+    
+    return len(templates)
+
+def extract_import_face(image_bytes):
+    """
+    Calcule l'embedding d'une photo d'import, et son vecteur brut si une projection est utilisée
+    (exécuté dans l'exécuteur d'inférence).
+    
+    Returns:
+        tuple: (embedding, vecteur brut ou None), ou None si aucun visage n'est détecté.
+    """
+    enrollment = extract_enrollment_face(image_bytes, False, StageTimings())
+    if enrollment is None:
+        return None
+    
+    processed_face, face_embedding = enrollment
+    if face_recognizer.projection is None:
+        return face_embedding, None
+    return face_embedding, face_recognizer.extract_raw_features(processed_face)
+
+def enroll_users(entries):
+    """
+    Enregistre plusieurs utilisateurs en une seule écriture de la base de données
+    et une seule mise à jour de la galerie.
+    
+    Args:
+        entries (list): Tuples (nom, âge, profession, embedding, vecteur brut ou None).
         
-        # Extraire les caractéristiques du visage
-        face_embedding = face_recognizer.extract_features(processed_face)
+    Returns:
+        list: IDs des nouveaux utilisateurs (dans l'ordre des entrées), ou None si l'écriture a échoué.
+    """
+    users = []
+    for name, age, profession, face_embedding, _ in entries:
+        user = User(user_id=str(uuid.uuid4()), name=name, age=age, profession=profession)
         user.face_embedding = face_embedding
+        users.append(user)
+    if not users:
+        return []
+    
+    user_ids = [user.user_id for user in users]
+    if not database.add_users(users):
+        return None
+    
+    # Conserver aussi les vecteurs bruts pour pouvoir ré-ajuster la projection
+    if face_recognizer.projection is not None:
+        database.put_embeddings(user_ids, np.array([entry[4] for entry in entries]), space='raw')
+    
+    # Ajouter tous les visages au reconnaisseur en une seule opération
+    face_recognizer.add_embeddings(user_ids, np.array([user.face_embedding for user in users]))
+    face_recognizer.schedule_index_save(ANN_INDEX_PATH, ANN_INDEX_SAVE_DELAY)
+    
+    timestamp = str(np.datetime64('now'))
+    for user in users:
+        database.add_log({
+            'timestamp': timestamp,
+            'action': 'user_added',
+            'user_id': user.user_id,
+            'name': user.name
+        })
+    
+    return user_ids
+
+def import_users(manifest, photos, executor=None):
+    """
+    Importe des utilisateurs depuis un fichier CSV et leurs photos : extraction en parallèle
+    dans l'exécuteur d'inférence, puis enregistrement de toutes les lignes valides en une fois.
+    
+    Args:
+        manifest (file): Fichier CSV ouvert en mode texte (colonnes name, age, profession, image).
+        photos (str or file): Répertoire ou archive zip/tar des photos.
+        executor (object, optional): Exécuteur des extractions (exécuteur d'inférence par défaut).
         
-        # Ajouter l'utilisateur à la base de données
-        if database.add_user(user):
-            # Ajouter le visage au reconnaisseur
-            face_recognizer.add_face(user_id, processed_face)
-            
-            # Ajouter une entrée de journal
-            database.add_log({
-                'timestamp': str(np.datetime64('now')),
-                'action': 'user_added',
-                'user_id': user_id,
-                'name': name
-            })
-            
-            return jsonify({'success': True, 'user_id': user_id, 'message': 'Utilisateur ajouté avec succès'})
+    Returns:
+        dict: Utilisateurs importés ({'line', 'user_id', 'name'}) et échecs ({'line', 'image', 'error'}).
+        
+    Raises:
+        ValueError: CSV ou source des photos invalide.
+        RuntimeError: Échec de l'écriture en base de données.
+    """
+    rows = read_manifest(manifest)
+    source = PhotoSource(photos)
+    try:
+        enrollments, failures = BulkEnrollment(extract_import_face, executor or inference_executor).run(rows, source)
+    finally:
+        source.close()
+    
+    user_ids = enroll_users([(fields['name'], fields['age'], fields['profession'], *enrollment)
+                             for _, fields, enrollment in enrollments])
+    if user_ids is None:
+        raise RuntimeError("Erreur lors de l'enregistrement des utilisateurs")
+    
+    return {
+        'imported': [{'line': line, 'user_id': user_id, 'name': fields['name']}
+                     for (line, fields, _), user_id in zip(enrollments, user_ids)],
+        'failures': failures
+    }
+
+@app.route('/api/users', methods=['POST'])
+@inference_endpoint
+def add_user():
+    """
+    Endpoint pour ajouter un nouvel utilisateur.
+    """
+    try:
+        # Lire l'image (base64 JSON, multipart ou binaire) et les champs
+        encoded, fields = read_request_image()
+        
+        # Vérifier si les données sont présentes dans la requête
+        required_fields = ['name', 'age', 'profession']
+        for field in required_fields:
+            if field not in fields:
+                return jsonify({'error': f'Champ manquant: {field}'}), 400
+        frames = read_enrollment_frames(encoded, fields)
+        if not frames:
+            return jsonify({'error': 'Champ manquant: image'}), 400
+        
+        # Extraire les données
+        name = fields['name']
+        profession = fields['profession']
+        # En binaire ou multipart, l'âge arrive sous forme de chaîne (paramètre d'URL, champ de formulaire)
+        try:
+            age = int(fields['age'])
+        except (TypeError, ValueError):
+            return jsonify({'error': f"Âge invalide: {fields['age']}"}), 400
+        
+        # Détecter le visage et calculer son embedding sur chaque image
+        enrollments = run_inference(extract_enrollment_faces, frames, wants_grayscale())
+        if not enrollments:
+            return jsonify({'error': 'Aucun visage détecté dans l\'image'}), 400
+        
+        # Ajouter l'utilisateur à la base de données et au reconnaisseur
+        user_id = enroll_user(name, age, profession, *enrollments[0], extra_templates=enrollments[1:])
+        if user_id:
+            return jsonify({'success': True, 'user_id': user_id, 'templates': len(enrollments),
+                            'message': 'Utilisateur ajouté avec succès'})
         else:
             return jsonify({'error': 'Erreur lors de l\'ajout de l\'utilisateur'}), 500
     
+    except ExecutorSaturated:
+        raise
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/users/<enrolled_id>/templates', methods=['POST'])
+@token_required
+@inference_endpoint
+def add_template(enrolled_id, **kwargs):
+    """
+    Endpoint pour ajouter un modèle (une nouvelle image du visage) à un utilisateur existant.
+    """
+    try:
+        if not database.get_user(enrolled_id):
+            return jsonify({'error': 'Utilisateur non trouvé'}), 404
+        
+        encoded, _ = read_request_image()
+        if encoded is None:
+            return jsonify({'error': 'Champ manquant: image'}), 400
+        
+        enrollment = run_inference(extract_enrollment_face, encoded, wants_grayscale())
+        if enrollment is None:
+            return jsonify({'error': 'Aucun visage détecté dans l\'image'}), 400
+        
+        templates = add_user_template(enrolled_id, *enrollment)
+        if templates is None:
+            return jsonify({'error': 'Erreur lors de l\'ajout du modèle'}), 500
+        return jsonify({'success': True, 'user_id': enrolled_id, 'templates': templates})
+    
+    except ExecutorSaturated:
+        raise
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/users/import', methods=['POST'])
+@token_required
+def import_users_endpoint(**kwargs):
+    """
+    Endpoint d'enrôlement en masse : fichier CSV 'manifest' (colonnes name, age, profession, image)
+    et archive zip ou tar 'photos', en multipart/form-data.
+    """
+    manifest = request.files.get('manifest')
+    photos = request.files.get('photos')
+    if manifest is None or photos is None:
+        return jsonify({'error': 'Fichiers manquants: manifest (CSV) et photos (archive zip/tar)'}), 400
+    
+    try:
+        report = import_users(io.TextIOWrapper(manifest.stream, encoding='utf-8-sig', newline=''), photos.stream)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    return jsonify({
+        'success': True,
+        'imported_count': len(report['imported']),
+        'failed_count': len(report['failures']),
+        **report
+    })
+
+def remove_user(user_id):
+    """
+    Supprime un utilisateur de la base de données et du reconnaisseur.
+    
+    Args:
+        user_id (str): ID de l'utilisateur.
+        
+    Returns:
+        bool: True si l'utilisateur a été supprimé.
+    """
+    if not database.delete_user(user_id):
+        return False
+    
+    # Supprimer le visage du reconnaisseur
+    face_recognizer.remove_face(user_id)
+    face_recognizer.schedule_index_save(ANN_INDEX_PATH, ANN_INDEX_SAVE_DELAY)
+    
+    # Ajouter une entrée de journal
+    database.add_log({
+        'timestamp': str(np.datetime64('now')),
+        'action': 'user_deleted',
+        'user_id': user_id
+    })
+    
+    return True
+
 @app.route('/api/users/<user_id>', methods=['DELETE'])
 @token_required
 def delete_user(user_id, **kwargs):
@@ -246,19 +1091,8 @@ def delete_user(user_id, **kwargs):
         if not user:
             return jsonify({'error': 'Utilisateur non trouvé'}), 404
         
-        # Supprimer l'utilisateur de la base de données
-        if database.delete_user(user_id):
-            # Supprimer le visage du reconnaisseur
-            if user_id in face_recognizer.known_faces:
-                del face_recognizer.known_faces[user_id]
-            
-            # Ajouter une entrée de journal
-            database.add_log({
-                'timestamp': str(np.datetime64('now')),
-                'action': 'user_deleted',
-                'user_id': user_id
-            })
-            
+        # Supprimer l'utilisateur de la base de données et du reconnaisseur
+        if remove_user(user_id):
             return jsonify({'success': True, 'message': 'Utilisateur supprimé avec succès'})
         else:
             return jsonify({'error': 'Erreur lors de la suppression de l\'utilisateur'}), 500
@@ -284,6 +1118,33 @@ def get_users(**kwargs):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/profiles', methods=['GET'])
+@token_required
+def get_profiles(**kwargs):
+    """
+    Endpoint listant les profils de requêtes conservés (du plus récent au plus ancien).
+    """
+    return jsonify({'profiles': request_profiler.list(), 'sample_rate': request_profiler.sample_rate})
+
+@app.route('/api/profiles/<profile_id>', methods=['GET'])
+@token_required
+def download_profile(profile_id, **kwargs):
+    """
+    Endpoint de téléchargement d'un profil : fichier pstats (.prof, lisible par pstats ou snakeviz)
+    ou rapport texte avec format=text (tri par sort, 'cumulative' par défaut).
+    """
+    entry = request_profiler.get(profile_id)
+    if entry is None:
+        return jsonify({'error': 'Profil non trouvé'}), 404
+    
+    if request.args.get('format') == 'text':
+        report = RequestProfiler.to_text(entry, sort=request.args.get('sort', 'cumulative'))
+        return Response(report, content_type='text/plain; charset=utf-8')
+    
+    return Response(entry['data'], content_type='application/octet-stream', headers={
+        'Content-Disposition': f'attachment; filename="{profile_id}.prof"'
+    })
+
 @app.route('/api/logs', methods=['GET'])
 @token_required
 def get_logs(**kwargs):
@@ -294,8 +1155,14 @@ def get_logs(**kwargs):
         # Récupérer le nombre d'entrées à récupérer
         limit = request.args.get('limit', default=100, type=int)
         
-        # Récupérer les journaux
-        logs = database.get_logs(limit=limit)
+        # Récupérer les journaux (filtres optionnels)
+        logs = database.get_logs(
+            limit=limit,
+            action=request.args.get('action'),
+            user_id=request.args.get('user_id'),
+            since=request.args.get('since'),
+            until=request.args.get('until')
+        )
         
         return jsonify({'logs': logs})
     
@@ -303,4 +1170,5 @@ def get_logs(**kwargs):
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
+    warmup()
     app.run(host='0.0.0.0', port=5000, debug=True)
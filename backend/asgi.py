@@ -0,0 +1,416 @@
+"""
+Point d'entrée ASGI (Starlette) du système d'authentification faciale, à côté de l'application Flask.
+Les routes et les services sont ceux de app.py ; les corps de requête sont lus de manière asynchrone,
+les traitements d'image passent par l'exécuteur d'inférence et les accès à la base de données par
+un thread : une connexion lente ou inactive (borne en attente) n'occupe aucun thread.
+La reconnaissance en continu (/api/stream) reste servie par l'application Flask.
+
+Usage:
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+"""
+
+import io
+import time
+from functools import wraps
+from contextlib import asynccontextmanager
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, PlainTextResponse, Response
+from starlette.routing import Route, Match
+
+from app import (
+    database, inference_executor, warmup, health_status, metrics, record_request, request_profiler, profile_requested,
+    UNMATCHED_ENDPOINT,
+    detect_image, recognize_image, recognize_images, extract_enrollment_face, extract_enrollment_faces, enroll_user,
+    add_user_template, remove_user, import_users, MAX_BATCH_IMAGES, MAX_TEMPLATES, INFERENCE_TIMEOUT
+)
+from services.inference_executor import StageTimings, ExecutorSaturated
+from utils.security import verify_token, get_bearer_token
+from utils.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE
+from utils.profiler import ProfileSession, RequestProfiler
+
+async def read_request_image(request):
+    """
+    Lit l'image (encodée) et les champs d'une requête : JSON (image base64 dans le champ 'image'),
+    multipart/form-data (fichier 'image') ou corps binaire avec les champs en paramètres d'URL.
+
+    Args:
+        request (starlette.requests.Request): Requête.
+
+    Returns:
+        tuple: (image encodée - chaîne base64 ou octets - ou None si absente, dictionnaire des autres champs).
+    """
+    content_type = request.headers.get('content-type', '')
+
+    if content_type.startswith('application/json'):
+        try:
+            fields = await request.json()
+        except ValueError:
+            fields = {}
+        if not isinstance(fields, dict):
+            fields = {}
+        return fields.get('image') or None, fields
+
+    if content_type.startswith('multipart/form-data'):
+        form = await request.form()
+        image_file = form.get('image')
+        fields = {key: value for key, value in form.items() if isinstance(value, str)}
+        image_bytes = await image_file.read() if hasattr(image_file, 'read') else None
+        return image_bytes or None, fields
+
+    return await request.body() or None, dict(request.query_params)
+
+async def read_enrollment_frames(request, encoded, fields):
+    """
+    Images d'un enrôlement : l'image principale puis les images supplémentaires (liste base64
+    'images' en JSON, fichiers 'image' multiples en multipart), au plus MAX_TEMPLATES.
+    """
+    frames = [encoded] if encoded is not None else []
+    if request.headers.get('content-type', '').startswith('multipart/form-data'):
+        # Relire tous les fichiers dans l'ordre (form.get retourne le dernier)
+        form = await request.form()
+        frames = []
+        for image_file in form.getlist('image'):
+            if hasattr(image_file, 'read'):
+                await image_file.seek(0)
+                frames.append(await image_file.read())
+        frames = [frame for frame in frames if frame]
+    elif isinstance(fields.get('images'), list):
+        frames += [image for image in fields['images'] if image]
+    return frames[:MAX_TEMPLATES]
+
+def wants_grayscale(request):
+    """
+    Indique si l'image doit être décodée directement en niveaux de gris (paramètre d'URL grayscale=1).
+    """
+    return request.query_params.get('grayscale', '').lower() in ('1', 'true', 'yes')
+
+def wants_annotation(request, fields):
+    """
+    Indique si la requête demande l'image annotée (champ ou paramètre d'URL 'annotate', vrai par défaut).
+    """
+    annotate = fields.get('annotate', request.query_params.get('annotate', True))
+    if isinstance(annotate, str):
+        return annotate.lower() not in ('0', 'false', 'no')
+    return bool(annotate)
+
+def inference_endpoint(endpoint):
+    """
+    Décorateur des endpoints d'inférence : fournit les durées de la requête, les renvoie dans
+    l'en-tête Server-Timing et répond 503 quand l'exécuteur d'inférence est saturé.
+    Une requête profilée (request.state.profile) ne l'est que dans l'exécuteur d'inférence :
+    la boucle d'événements, partagée entre les requêtes, n'est pas profilée.
+    """
+    @wraps(endpoint)
+    async def decorated(request):
+        requested = profile_requested(request.headers, request.query_params)
+        if requested and not verify_token(get_bearer_token(request.headers) or ''):
+            return JSONResponse({'message': 'Token manquant ou invalide pour le profilage!'}, status_code=401)
+        trigger = 'request' if requested else ('sampled' if request_profiler.should_sample() else None)
+
+        start = time.perf_counter()
+        timings = StageTimings()
+        request.state.profile = ProfileSession() if trigger else None
+        try:
+            response = await endpoint(request, timings)
+        except ExecutorSaturated as e:
+            response = JSONResponse({'error': str(e)}, status_code=503, headers={'Retry-After': '1'})
+        except Exception as e:
+            response = JSONResponse({'error': str(e)}, status_code=500)
+        duration = time.perf_counter() - start
+
+        response.headers['Server-Timing'] = timings.server_timing()
+        record_request(route_template(request), response.status_code, timings, duration)
+        if trigger:
+            profile_id = request_profiler.store(request.state.profile, request.url.path, duration * 1000, trigger)
+            if profile_id:
+                response.headers['X-Profile-Id'] = profile_id
+        return response
+
+    return decorated
+
+def route_template(request):
+    """
+    Modèle de la route d'une requête (ex. '/api/users/{enrolled_id}/templates'), étiquette des métriques.
+    """
+    route = request.scope.get('route')
+    if route is None:
+        route = next((candidate for candidate in request.app.router.routes
+                      if candidate.matches(request.scope)[0] == Match.FULL), None)
+    return getattr(route, 'path', None) or UNMATCHED_ENDPOINT
+
+async def run_inference(request, timings, fn, *args):
+    """
+    Exécute un traitement dans l'exécuteur d'inférence sans bloquer la boucle d'événements ;
+    il reçoit les durées de la requête en dernier argument.
+    """
+    if request.state.profile is not None:
+        fn = request.state.profile.wrap(fn)
+    return await inference_executor.run_async(fn, *args, timings, timings=timings, timeout=INFERENCE_TIMEOUT)
+
+def token_required(endpoint):
+    """
+    Décorateur protégeant un endpoint par un token JWT (en-tête Authorization: Bearer).
+    """
+    @wraps(endpoint)
+    async def decorated(request):
+        token = get_bearer_token(request.headers)
+        if not token:
+            return JSONResponse({'message': 'Token manquant!'}, status_code=401)
+        if not verify_token(token):
+            return JSONResponse({'message': 'Token invalide ou expiré!'}, status_code=401)
+
+        return await endpoint(request)
+
+    return decorated
+
+async def health_check(request):
+    """
+    Endpoint de vérification de l'état de l'API.
+    """
+    return JSONResponse(health_status())
+
+async def get_metrics(request):
+    """
+    Endpoint des métriques au format texte Prometheus.
+    """
+    return Response(metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
+@inference_endpoint
+async def detect_face(request, timings):
+    """
+    Endpoint pour détecter les visages dans une image.
+    """
+    encoded, fields = await read_request_image(request)
+    if encoded is None:
+        return JSONResponse({'error': 'Image manquante'}, status_code=400)
+
+    result = await run_inference(request, timings, detect_image, encoded, wants_grayscale(request), wants_annotation(request, fields))
+    return JSONResponse(result)
+
+@inference_endpoint
+async def recognize_face(request, timings):
+    """
+    Endpoint pour reconnaître un visage.
+    """
+    encoded, fields = await read_request_image(request)
+    if encoded is None:
+        return JSONResponse({'error': 'Image manquante'}, status_code=400)
+
+    result = await run_inference(request, timings, recognize_image, encoded, wants_grayscale(request), wants_annotation(request, fields))
+    return JSONResponse(result)
+
+@inference_endpoint
+async def recognize_faces_batch(request, timings):
+    """
+    Endpoint pour reconnaître tous les visages de plusieurs images en une seule requête.
+    """
+    try:
+        body = await request.json()
+    except ValueError:
+        body = None
+    images_data = body.get('images') if isinstance(body, dict) else None
+    if not images_data or not isinstance(images_data, list):
+        return JSONResponse({'error': 'Images manquantes'}, status_code=400)
+
+    if len(images_data) > MAX_BATCH_IMAGES:
+        return JSONResponse({'error': f'Trop d\'images (maximum {MAX_BATCH_IMAGES})'}, status_code=400)
+
+    return JSONResponse({'results': await run_inference(request, timings, recognize_images, images_data)})
+
+@inference_endpoint
+async def add_user(request, timings):
+    """
+    Endpoint pour ajouter un nouvel utilisateur.
+    """
+    encoded, fields = await read_request_image(request)
+
+    # Vérifier si les données sont présentes dans la requête
+    for field in ['name', 'age', 'profession']:
+        if field not in fields:
+            return JSONResponse({'error': f'Champ manquant: {field}'}, status_code=400)
+    # En binaire ou multipart, l'âge arrive sous forme de chaîne (paramètre d'URL, champ de formulaire)
+    try:
+        age = int(fields['age'])
+    except (TypeError, ValueError):
+        return JSONResponse({'error': f"Âge invalide: {fields['age']}"}, status_code=400)
+    frames = await read_enrollment_frames(request, encoded, fields)
+    if not frames:
+        return JSONResponse({'error': 'Champ manquant: image'}, status_code=400)
+
+    # Détecter le visage et calculer son embedding sur chaque image
+    enrollments = await run_inference(request, timings, extract_enrollment_faces, frames, wants_grayscale(request))
+    if not enrollments:
+        return JSONResponse({'error': 'Aucun visage détecté dans l\'image'}, status_code=400)
+
+    # Ajouter l'utilisateur à la base de données et au reconnaisseur
+    user_id = await run_in_threadpool(enroll_user, fields['name'], age, fields['profession'],
+                                      *enrollments[0], extra_templates=enrollments[1:])
+    if not user_id:
+        return JSONResponse({'error': 'Erreur lors de l\'ajout de l\'utilisateur'}, status_code=500)
+
+    return JSONResponse({'success': True, 'user_id': user_id, 'templates': len(enrollments),
+                         'message': 'Utilisateur ajouté avec succès'})
+
+@token_required
+@inference_endpoint
+async def add_template(request, timings):
+    """
+    Endpoint pour ajouter un modèle (une nouvelle image du visage) à un utilisateur existant.
+    """
+    user_id = request.path_params['enrolled_id']
+    if not await run_in_threadpool(database.get_user, user_id):
+        return JSONResponse({'error': 'Utilisateur non trouvé'}, status_code=404)
+
+    encoded, _ = await read_request_image(request)
+    if encoded is None:
+        return JSONResponse({'error': 'Champ manquant: image'}, status_code=400)
+
+    enrollment = await run_inference(request, timings, extract_enrollment_face, encoded, wants_grayscale(request))
+    if enrollment is None:
+        return JSONResponse({'error': 'Aucun visage détecté dans l\'image'}, status_code=400)
+
+    templates = await run_in_threadpool(add_user_template, user_id, *enrollment)
+    if templates is None:
+        return JSONResponse({'error': 'Erreur lors de l\'ajout du modèle'}, status_code=500)
+    return JSONResponse({'success': True, 'user_id': user_id, 'templates': templates})
+
+@token_required
+async def import_users_endpoint(request):
+    """
+    Endpoint d'enrôlement en masse (mêmes fichiers que l'application Flask) ; l'import
+    s'exécute dans un thread, les extractions dans l'exécuteur d'inférence.
+    """
+    form = await request.form()
+    manifest, photos = form.get('manifest'), form.get('photos')
+    if not hasattr(manifest, 'file') or not hasattr(photos, 'file'):
+        return JSONResponse({'error': 'Fichiers manquants: manifest (CSV) et photos (archive zip/tar)'}, status_code=400)
+
+    try:
+        report = await run_in_threadpool(
+            import_users, io.TextIOWrapper(manifest.file, encoding='utf-8-sig', newline=''), photos.file
+        )
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+    except Exception as e:
+        return JSONResponse({'error': str(e)}, status_code=500)
+
+    return JSONResponse({
+        'success': True,
+        'imported_count': len(report['imported']),
+        'failed_count': len(report['failures']),
+        **report
+    })
+
+@token_required
+async def delete_user(request):
+    """
+    Endpoint pour supprimer un utilisateur.
+    """
+    user_id = request.path_params['user_id']
+    try:
+        # Vérifier si l'utilisateur existe
+        user = await run_in_threadpool(database.get_user, user_id)
+        if not user:
+            return JSONResponse({'error': 'Utilisateur non trouvé'}, status_code=404)
+
+        if await run_in_threadpool(remove_user, user_id):
+            return JSONResponse({'success': True, 'message': 'Utilisateur supprimé avec succès'})
+        return JSONResponse({'error': 'Erreur lors de la suppression de l\'utilisateur'}, status_code=500)
+
+    except Exception as e:
+        return JSONResponse({'error': str(e)}, status_code=500)
+
+@token_required
+async def get_users(request):
+    """
+    Endpoint pour récupérer tous les utilisateurs.
+    """
+    try:
+        users = await run_in_threadpool(database.get_all_users)
+        return JSONResponse({'users': [user.to_dict() for user in users]})
+
+    except Exception as e:
+        return JSONResponse({'error': str(e)}, status_code=500)
+
+@token_required
+async def get_logs(request):
+    """
+    Endpoint pour récupérer les journaux (mêmes filtres que l'application Flask).
+    """
+    params = request.query_params
+    try:
+        limit = int(params.get('limit', 100))
+    except ValueError:
+        limit = 100
+
+    try:
+        logs = await run_in_threadpool(
+            database.get_logs,
+            limit=limit,
+            action=params.get('action'),
+            user_id=params.get('user_id'),
+            since=params.get('since'),
+            until=params.get('until')
+        )
+        return JSONResponse({'logs': logs})
+
+    except Exception as e:
+        return JSONResponse({'error': str(e)}, status_code=500)
+
+@token_required
+async def get_profiles(request):
+    """
+    Endpoint listant les profils de requêtes conservés (du plus récent au plus ancien).
+    """
+    return JSONResponse({'profiles': request_profiler.list(), 'sample_rate': request_profiler.sample_rate})
+
+@token_required
+async def download_profile(request):
+    """
+    Endpoint de téléchargement d'un profil (fichier pstats, ou rapport texte avec format=text).
+    """
+    profile_id = request.path_params['profile_id']
+    entry = request_profiler.get(profile_id)
+    if entry is None:
+        return JSONResponse({'error': 'Profil non trouvé'}, status_code=404)
+
+    if request.query_params.get('format') == 'text':
+        return PlainTextResponse(RequestProfiler.to_text(entry, sort=request.query_params.get('sort', 'cumulative')))
+
+    return Response(entry['data'], media_type='application/octet-stream', headers={
+        'Content-Disposition': f'attachment; filename="{profile_id}.prof"'
+    })
+
+@asynccontextmanager
+async def lifespan(app):
+    # Initialiser les services avant d'accepter les requêtes, sans bloquer la boucle d'événements
+    await run_in_threadpool(warmup)
+    yield
+
+app = Starlette(
+    routes=[
+        Route('/api/health', health_check, methods=['GET']),
+        Route('/api/metrics', get_metrics, methods=['GET']),
+        Route('/api/detect', detect_face, methods=['POST']),
+        Route('/api/recognize', recognize_face, methods=['POST']),
+        Route('/api/recognize/batch', recognize_faces_batch, methods=['POST']),
+        Route('/api/users', add_user, methods=['POST']),
+        Route('/api/users', get_users, methods=['GET']),
+        Route('/api/users/import', import_users_endpoint, methods=['POST']),
+        Route('/api/users/{user_id}', delete_user, methods=['DELETE']),
+        Route('/api/users/{enrolled_id}/templates', add_template, methods=['POST']),
+        Route('/api/logs', get_logs, methods=['GET']),
+        Route('/api/profiles', get_profiles, methods=['GET']),
+        Route('/api/profiles/{profile_id}', download_profile, methods=['GET']),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    lifespan=lifespan
+)
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(app, host='0.0.0.0', port=5000)
@@ -0,0 +1,4 @@
+"""
+Bancs d'essai de performance du système d'authentification faciale.
+Chaque module s'exécute depuis le répertoire backend : python -m benchmarks.<module> --help
+"""
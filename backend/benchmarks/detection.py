@@ -0,0 +1,132 @@
+"""
+Banc d'essai des préréglages de détection (latence et taux de détection).
+
+Usage:
+    python -m benchmarks.detection --images chemin/vers/images [--width 1280] [--repeat 3] [--json resultats.json]
+    python -m benchmarks.detection --images chemin/vers/images --backend yunet --model face_detection_yunet.onnx
+
+Le taux de détection d'un préréglage est la proportion d'images où son plus grand visage
+recouvre (IoU >= 0.5) celui du préréglage de référence ('accurate', pleine résolution).
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.face_detector import FaceDetector, DETECTION_PRESETS, create_face_detector
+from services.face_tracker import FaceTracker
+
+IMAGE_EXTENSIONS = ('*.jpg', '*.jpeg', '*.png')
+
+def load_images(directory, width=None):
+    """
+    Charge les images d'un répertoire, éventuellement redimensionnées à une largeur donnée.
+
+    Args:
+        directory (str): Répertoire des images.
+        width (int, optional): Largeur des images (résolution de la caméra simulée).
+
+    Returns:
+        list: Images BGR.
+    """
+    paths = sorted(path for pattern in IMAGE_EXTENSIONS for path in glob.glob(os.path.join(directory, pattern)))
+    images = []
+    for path in paths:
+        image = cv2.imread(path)
+        if image is None:
+            print(f"Image illisible ignorée: {path}")
+            continue
+        if width and image.shape[1] != width:
+            image = cv2.resize(image, (width, int(image.shape[0] * width / image.shape[1])))
+        images.append(image)
+    return images
+
+def largest_face(faces):
+    if len(faces) == 0:
+        return None
+    return tuple(int(v) for v in max(faces, key=lambda rect: rect[2] * rect[3]))
+
+def benchmark_preset(detector, images, reference, repeat=3):
+    """
+    Mesure la latence et le taux de détection d'un détecteur.
+
+    Args:
+        detector (FaceDetector): Détecteur configuré.
+        images (list): Images BGR.
+        reference (list): Plus grand visage de référence par image (ou None).
+        repeat (int, optional): Nombre de passages sur les images.
+
+    Returns:
+        dict: {latency_ms (médiane), p95_ms, hit_rate, detected_rate}.
+    """
+    latencies = []
+    hits = detected = 0
+    for _ in range(repeat):
+        for image, expected in zip(images, reference):
+            start = time.perf_counter()
+            face = largest_face(detector.detect(image))
+            latencies.append((time.perf_counter() - start) * 1000)
+            if face is not None:
+                detected += 1
+                if expected is not None and FaceTracker.iou(face, expected) >= 0.5:
+                    hits += 1
+
+    with_face = sum(expected is not None for expected in reference) * repeat
+    return {
+        'latency_ms': float(np.median(latencies)),
+        'p95_ms': float(np.percentile(latencies, 95)),
+        'hit_rate': hits / with_face if with_face else None,
+        'detected_rate': detected / (len(images) * repeat)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Banc d'essai des préréglages de détection")
+    parser.add_argument('--images', required=True, help="Répertoire d'images (jpg/png)")
+    parser.add_argument('--width', type=int, help="Redimensionner les images à cette largeur")
+    parser.add_argument('--repeat', type=int, default=3, help="Nombre de passages sur les images")
+    parser.add_argument('--presets', nargs='+', default=list(DETECTION_PRESETS), help="Préréglages à mesurer")
+    parser.add_argument('--backend', choices=['ssd', 'yunet'], help="Mesurer aussi un détecteur DNN")
+    parser.add_argument('--model', help="Modèle du détecteur DNN (DETECTOR_MODEL)")
+    parser.add_argument('--config', help="Description du réseau SSD (DETECTOR_CONFIG)")
+    parser.add_argument('--json', help="Fichier où écrire les résultats")
+    args = parser.parse_args()
+
+    images = load_images(args.images, args.width)
+    if not images:
+        parser.error(f"Aucune image trouvée dans {args.images}")
+
+    # Référence : pleine résolution
+    reference_detector = FaceDetector('accurate')
+    reference = [largest_face(reference_detector.detect(image)) for image in images]
+
+    detectors = [(preset, FaceDetector(preset), DETECTION_PRESETS[preset]) for preset in args.presets]
+    if args.backend:
+        os.environ['DETECTOR_MODEL'] = args.model or os.getenv('DETECTOR_MODEL', '')
+        if args.config:
+            os.environ['DETECTOR_CONFIG'] = args.config
+        detectors.append((args.backend, create_face_detector(args.backend), {'model': os.environ['DETECTOR_MODEL']}))
+
+    results = {}
+    print(f"{len(images)} images {images[0].shape[1]}x{images[0].shape[0]}, "
+          f"{sum(r is not None for r in reference)} visages de référence")
+    print(f"{'préréglage':<10} {'médiane (ms)':>12} {'p95 (ms)':>9} {'taux':>7} {'détectés':>9}")
+    for preset, detector, settings in detectors:
+        detector.detect(images[0])  # Préchauffage
+        row = benchmark_preset(detector, images, reference, repeat=args.repeat)
+        results[preset] = dict(row, **settings)
+        hit_rate = f"{row['hit_rate']:.1%}" if row['hit_rate'] is not None else '-'
+        print(f"{preset:<10} {row['latency_ms']:>12.2f} {row['p95_ms']:>9.2f} {hit_rate:>7} {row['detected_rate']:>9.1%}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'images': len(images), 'width': int(images[0].shape[1]), 'presets': results}, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,372 @@
+"""
+Banc d'essai de bout en bout du pipeline de reconnaissance, hors ligne et reproductible.
+
+Usage:
+    python -m benchmarks.pipeline [--sizes 100 1000 10000] [--probes 20] [--repeat 3] [--json resultats.json]
+    python -m benchmarks.pipeline --sizes 100000 --precision int8 --index ivf --db sqlite
+    python -m benchmarks.pipeline --json nouveau.json --compare ancien.json [--tolerance 0.2]
+
+Des visages synthétiques (détectables par la cascade de Haar) sont générés à partir d'une graine :
+chaque identité sondée est enrôlée depuis une image puis recherchée depuis une autre image.
+La galerie est complétée par des embeddings leurres jusqu'à la taille demandée, dans une base
+temporaire. Chaque étape de /api/recognize est chronométrée séparément, puis la requête HTTP complète
+avec le client de test Flask. Les résultats JSON de deux commits se comparent avec --compare.
+Avec EMBEDDING_MODE=raw (10 000 dimensions), 100 000 utilisateurs occupent ~4 Go en float32.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.face_detector import FaceDetector
+from services.face_recognizer import FaceRecognizer
+from services.database import create_database
+from models.user import User
+from utils.image_processing import base64_to_image, image_to_base64, annotate_faces
+
+# Étapes chronométrées, dans l'ordre de /api/recognize
+STAGES = ['base64_to_image', 'detect', 'preprocess_face', 'extract_features', 'match', 'recognize',
+          'get_user', 'add_log', 'image_to_base64', 'http_recognize']
+
+def identity_params(rng):
+    """
+    Tire les traits d'une identité synthétique.
+
+    Args:
+        rng (numpy.random.Generator): Générateur aléatoire.
+
+    Returns:
+        dict: Paramètres du visage (teinte, position et taille des yeux, de la bouche...).
+    """
+    return {
+        'skin': int(rng.integers(150, 210)),
+        'face_width': rng.uniform(0.29, 0.34),
+        'eye_dx': rng.uniform(0.11, 0.16),
+        'eye_y': rng.uniform(-0.11, -0.05),
+        'eye_width': rng.uniform(0.05, 0.08),
+        'brow_tilt': rng.uniform(-0.03, 0.03),
+        'mouth_width': rng.uniform(0.07, 0.13),
+        'mouth_y': rng.uniform(0.17, 0.23)
+    }
+
+def draw_face(params, size, background):
+    """
+    Dessine un visage de face en niveaux de gris.
+
+    Returns:
+        numpy.ndarray: Image carrée (size x size) du visage.
+    """
+    face = np.full((size, size), background, np.uint8)
+    c = size // 2
+    skin = params['skin']
+    cv2.ellipse(face, (c, c), (int(size * params['face_width']), int(size * 0.42)), 0, 0, 360, skin, -1)
+
+    eye_y = int(c + size * params['eye_y'])
+    eye_dx = int(size * params['eye_dx'])
+    for side in (-1, 1):
+        x = c + side * eye_dx
+        cv2.ellipse(face, (x, eye_y), (int(size * params['eye_width']), int(size * 0.035)), 0, 0, 360, 40, -1)
+        tilt = int(side * size * params['brow_tilt'])
+        cv2.line(face, (x - size // 11, eye_y - size // 10 + tilt), (x + size // 11, eye_y - size // 9 - tilt),
+                 60, max(2, size // 40))
+
+    cv2.line(face, (c, eye_y + size // 20), (c - size // 40, int(c + size * 0.1)), skin - 50, max(2, size // 50))
+    cv2.ellipse(face, (c, int(c + size * params['mouth_y'])),
+                (int(size * params['mouth_width']), int(size * 0.03)), 0, 0, 360, 70, -1)
+    return cv2.GaussianBlur(face, (7, 7), 0)
+
+def render_frame(params, rng, width=640):
+    """
+    Place un visage dans une image de caméra simulée (fond, position, taille, éclairage et bruit aléatoires).
+
+    Returns:
+        numpy.ndarray: Image BGR (largeur width, format 4:3).
+    """
+    height = width * 3 // 4
+    background = int(rng.integers(40, 90))
+    gradient = np.linspace(-15, 15, width, dtype=np.float32)
+    frame = np.clip(background + gradient[np.newaxis, :] + np.zeros((height, 1), np.float32), 0, 255)
+
+    size = int(height * rng.uniform(0.35, 0.55))
+    x = int(rng.integers(0, width - size))
+    y = int(rng.integers(0, height - size))
+    frame[y:y + size, x:x + size] = draw_face(params, size, background)
+
+    frame = frame * rng.uniform(0.85, 1.15) + rng.normal(0, 3, frame.shape)
+    return cv2.cvtColor(np.clip(frame, 0, 255).astype(np.uint8), cv2.COLOR_GRAY2BGR)
+
+def encode_frame(frame):
+    """
+    Encode une image comme l'envoie le frontend (JPEG en base64).
+    """
+    return image_to_base64(frame, quality=90)
+
+def face_embedding(detector, recognizer, frame):
+    """
+    Calcule l'embedding du plus grand visage d'une image (None si aucun visage n'est détecté).
+    """
+    faces = detector.detect(frame)
+    if len(faces) == 0:
+        return None
+    face_coords = max(faces, key=lambda rect: rect[2] * rect[3])
+    return recognizer.extract_features(detector.preprocess_face(detector.extract_face(frame, face_coords)))
+
+def build_gallery(detector, recognizer, size, probes, seed, width):
+    """
+    Construit les identités sondées et les embeddings leurres de la galerie.
+
+    Returns:
+        tuple: (user_ids, matrice (size, dim) des embeddings, [(user_id, image de requête), ...]).
+    """
+    rng = np.random.default_rng(seed)
+    user_ids, embeddings, queries = [], [], []
+
+    # Identités sondées : enrôlement et requête sur deux images différentes
+    attempts = 0
+    while len(queries) < min(probes, size) and attempts < 10 * probes:
+        attempts += 1
+        params = identity_params(rng)
+        embedding = face_embedding(detector, recognizer, render_frame(params, rng, width))
+        query = render_frame(params, rng, width)
+        if embedding is None or len(detector.detect(query)) == 0:
+            continue
+        user_id = f"probe-{len(queries):06d}"
+        user_ids.append(user_id)
+        embeddings.append(embedding)
+        queries.append((user_id, query))
+
+    # Leurres : variations bruitées d'un petit ensemble d'autres visages synthétiques
+    pool = []
+    while len(pool) < 32:
+        embedding = face_embedding(detector, recognizer, render_frame(identity_params(rng), rng, width))
+        if embedding is not None:
+            pool.append(embedding)
+    pool = np.asarray(pool, dtype=np.float32)
+
+    count = size - len(user_ids)
+    matrix = np.empty((size, recognizer.embedding_dim), dtype=np.float32)
+    matrix[:len(embeddings)] = embeddings
+    for start in range(0, count, 4096):
+        rows = min(4096, count - start)
+        block = pool[rng.integers(0, len(pool), rows)] + rng.normal(0, 0.02, (rows, pool.shape[1])).astype(np.float32)
+        block /= np.linalg.norm(block, axis=1, keepdims=True)
+        matrix[len(embeddings) + start:len(embeddings) + start + rows] = block
+    user_ids += [f"user-{i:06d}" for i in range(count)]
+    return user_ids, matrix, queries
+
+def seed_database(database, user_ids, matrix):
+    """
+    Enregistre les profils et embeddings de la galerie en une seule écriture.
+    """
+    users = [User(user_id=user_id, name=f"Synthetic {i}", age=30, profession='benchmark', face_embedding=embedding)
+             for i, (user_id, embedding) in enumerate(zip(user_ids, matrix))]
+    return database.add_users(users)
+
+def summarize(samples):
+    """
+    Returns:
+        dict: {median_ms, p95_ms, mean_ms, n} d'une liste de durées en millisecondes.
+    """
+    return {
+        'median_ms': round(float(np.median(samples)), 3),
+        'p95_ms': round(float(np.percentile(samples, 95)), 3),
+        'mean_ms': round(float(np.mean(samples)), 3),
+        'n': len(samples)
+    }
+
+def timed(samples, stage, fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    samples.setdefault(stage, []).append((time.perf_counter() - start) * 1000)
+    return result
+
+def benchmark_size(size, args, detector):
+    """
+    Mesure toutes les étapes pour une taille de galerie.
+
+    Returns:
+        dict: {gallery_size, probes, top1_accuracy, build_s, stages: {étape: statistiques}}.
+    """
+    import app as api
+
+    db_dir = tempfile.mkdtemp(prefix='facial_auth_bench_')
+    try:
+        start = time.perf_counter()
+        recognizer = FaceRecognizer(threshold=args.threshold, precision=args.precision)
+        user_ids, matrix, queries = build_gallery(detector, recognizer, size, args.probes, args.seed, args.width)
+
+        database = create_database(backend=args.db, db_dir=db_dir, embedding_dtype=args.precision)
+        if not seed_database(database, user_ids, matrix):
+            raise RuntimeError("Échec de l'écriture de la galerie synthétique")
+        recognizer.load_embeddings(user_ids, matrix)
+        del matrix
+        if args.index == 'ivf':
+            recognizer.enable_index(n_probe=args.n_probe)
+        build_s = time.perf_counter() - start
+
+        # Le client HTTP utilise les mêmes services que les étapes isolées
+        api.face_detector.set(detector)
+        api.face_recognizer.set(recognizer)
+        api.database.set(database)
+        api.match_batcher.set(None)
+        client = api.app.test_client()
+
+        encoded = [(user_id, encode_frame(frame)) for user_id, frame in queries]
+        samples = {}
+        correct = 0
+        for iteration in range(args.repeat + 1):
+            # Premier passage : préchauffage, non mesuré
+            warmup = iteration == 0
+            stage_samples = {} if warmup else samples
+            for expected_id, image_data in encoded:
+                image = timed(stage_samples, 'base64_to_image', base64_to_image, image_data)
+                faces = timed(stage_samples, 'detect', detector.detect, image)
+                if len(faces) == 0:
+                    continue
+                face_coords = max(faces, key=lambda rect: rect[2] * rect[3])
+                face = timed(stage_samples, 'preprocess_face', detector.preprocess_face,
+                             detector.extract_face(image, face_coords))
+                embedding = timed(stage_samples, 'extract_features', recognizer.extract_features, face)
+                timed(stage_samples, 'match', recognizer.match, embedding)
+                user_id, _ = timed(stage_samples, 'recognize', recognizer.recognize, face)
+                timed(stage_samples, 'get_user', database.get_user, user_id or expected_id)
+                timed(stage_samples, 'add_log', database.add_log, {
+                    'timestamp': str(np.datetime64('now')),
+                    'action': 'recognition',
+                    'user_id': user_id,
+                    'result': 'success' if user_id else 'failure'
+                })
+                annotated = annotate_faces(image, [(face_coords, user_id or 'Inconnu', (0, 255, 0))])
+                timed(stage_samples, 'image_to_base64', image_to_base64, annotated)
+
+                response = timed(stage_samples, 'http_recognize', client.post, '/api/recognize',
+                                 json={'image': image_data})
+                if response.status_code != 200:
+                    raise RuntimeError(f"/api/recognize a répondu {response.status_code}: {response.get_json()}")
+                if not warmup:
+                    correct += user_id == expected_id
+
+        database.close()
+        return {
+            'gallery_size': size,
+            'probes': len(queries),
+            'top1_accuracy': round(correct / (len(queries) * args.repeat), 4) if queries else None,
+            'build_s': round(build_s, 2),
+            'stages': {stage: summarize(samples[stage]) for stage in STAGES if stage in samples}
+        }
+    finally:
+        api.face_detector.set(None)
+        api.face_recognizer.set(None)
+        api.database.set(None)
+        api.match_batcher.set(None)
+        shutil.rmtree(db_dir, ignore_errors=True)
+
+def environment():
+    """
+    Returns:
+        dict: Versions et matériel, pour ne comparer que des résultats comparables.
+    """
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                         cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count()
+    }
+
+def compare(results, baseline, tolerance, min_delta_ms=0.5):
+    """
+    Compare les médianes à celles d'un fichier de référence. Une étape régresse si sa médiane
+    augmente de plus de tolerance (relatif) et de plus de min_delta_ms (absolu, contre le bruit
+    des étapes de quelques microsecondes).
+
+    Returns:
+        list: Régressions [(taille, étape, médiane de référence, médiane actuelle), ...].
+    """
+    previous = {str(row['gallery_size']): row for row in baseline['results']}
+    regressions = []
+    print(f"\n{'taille':>8} {'étape':<17} {'réf. (ms)':>10} {'actuel (ms)':>12} {'ratio':>7}")
+    for row in results:
+        reference = previous.get(str(row['gallery_size']))
+        if reference is None:
+            continue
+        for stage, stats in row['stages'].items():
+            if stage not in reference['stages']:
+                continue
+            before = reference['stages'][stage]['median_ms']
+            after = stats['median_ms']
+            ratio = after / before if before else float('inf')
+            flag = ''
+            if ratio > 1 + tolerance and after - before > min_delta_ms:
+                regressions.append((row['gallery_size'], stage, before, after))
+                flag = '  RÉGRESSION'
+            print(f"{row['gallery_size']:>8} {stage:<17} {before:>10.3f} {after:>12.3f} {ratio:>7.2f}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Banc d'essai de bout en bout du pipeline de reconnaissance")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000], help="Tailles de galerie")
+    parser.add_argument('--probes', type=int, default=20, help="Identités sondées par taille")
+    parser.add_argument('--repeat', type=int, default=3, help="Passages sur les requêtes (après un préchauffage)")
+    parser.add_argument('--width', type=int, default=640, help="Largeur des images de caméra simulées")
+    parser.add_argument('--seed', type=int, default=0, help="Graine des visages et de la galerie")
+    parser.add_argument('--db', choices=['json', 'sqlite'], default='json', help="Moteur de base de données")
+    parser.add_argument('--precision', choices=['float32', 'float16', 'int8'], default='float32',
+                        help="Précision de la galerie")
+    parser.add_argument('--index', choices=['exact', 'ivf'], default='exact', help="Recherche exacte ou index IVF")
+    parser.add_argument('--n-probe', type=int, default=8, help="Listes IVF parcourues par requête")
+    parser.add_argument('--threshold', type=float, default=0.6, help="Seuil de reconnaissance")
+    parser.add_argument('--preset', default='accurate', help="Préréglage de détection")
+    parser.add_argument('--json', help="Fichier où écrire les résultats")
+    parser.add_argument('--compare', help="Résultats de référence (JSON) à comparer")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="Hausse relative de la médiane signalée comme régression")
+    parser.add_argument('--min-delta-ms', type=float, default=0.5,
+                        help="Hausse absolue minimale de la médiane signalée comme régression")
+    args = parser.parse_args()
+
+    detector = FaceDetector(args.preset)
+    results = []
+    print(f"{'taille':>8} {'précision':>9} {'détection':>10} {'reconnaissance':>15} {'HTTP (ms)':>10} {'top-1':>7}")
+    for size in args.sizes:
+        row = benchmark_size(size, args, detector)
+        results.append(row)
+        stages = row['stages']
+        accuracy = f"{row['top1_accuracy']:.0%}" if row['top1_accuracy'] is not None else '-'
+        print(f"{size:>8} {args.precision:>9} {stages['detect']['median_ms']:>10.2f} "
+              f"{stages['recognize']['median_ms']:>15.2f} {stages['http_recognize']['median_ms']:>10.2f} {accuracy:>7}")
+
+    report = {
+        'environment': environment(),
+        'config': {key: value for key, value in vars(args).items() if key not in ('json', 'compare', 'tolerance', 'min_delta_ms')},
+        'results': results
+    }
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.min_delta_ms)
+        if regressions:
+            print(f"\n{len(regressions)} régression(s) au-delà de {args.tolerance:.0%}")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
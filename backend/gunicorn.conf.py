@@ -0,0 +1,25 @@
+"""
+Configuration gunicorn pour le système d'authentification faciale.
+
+Usage:
+    gunicorn -c gunicorn.conf.py app:app
+"""
+
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('GUNICORN_WORKERS', 2))
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+
+# Charger l'application dans le processus maître avant le fork des workers
+preload_app = True
+
+def when_ready(server):
+    """
+    Préchauffe les services dans le maître : les workers héritent de la cascade
+    et de la galerie déjà chargées (pages partagées en copie sur écriture).
+    """
+    from app import warmup
+
+    timings = warmup()
+    server.log.info("Services préchauffés : %s", {name: f"{ms:.1f} ms" for name, ms in timings.items()})
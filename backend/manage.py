@@ -0,0 +1,334 @@
+"""
+Commandes d'administration du système d'authentification faciale.
+
+Usage:
+    python manage.py migrate-sqlite [--db-dir ../database]
+    python manage.py rebuild-index [--n-lists N] [--n-probe P]
+    python manage.py index-report [--probes M] [--k K]
+    python manage.py fit-pca [--components 128]
+    python manage.py compare-projection [--probes M]
+    python manage.py check-precision [--probes M]
+    python manage.py convert-precision --precision int8
+    python manage.py import-users --csv users.csv --photos photos/|photos.zip [--workers W] [--report report.json]
+"""
+
+import os
+import json
+import argparse
+import numpy as np
+
+# Copie float32 des embeddings conservée par convert-precision (référence de check-precision)
+FLOAT32_BACKUP_DIR = 'float32_embeddings'
+
+def _open_database(args, **kwargs):
+    """
+    Ouvre la base de données avec la précision de l'application (EMBEDDING_PRECISION) :
+    un stockage dans une autre précision est refusé plutôt que converti.
+    """
+    import app as api
+    from services.database import create_database
+
+    return create_database(db_dir=args.db_dir, embedding_dtype=api.EMBEDDING_PRECISION, **kwargs)
+
+def migrate_sqlite(args):
+    """
+    Importe la base JSON existante dans une base SQLite.
+    """
+    import app as api
+    from services.sqlite_database import migrate_json_to_sqlite
+
+    users_count, logs_count = migrate_json_to_sqlite(db_dir=args.db_dir, db_file=args.db_file,
+                                                     embedding_dtype=api.EMBEDDING_PRECISION)
+    print(f"{users_count} utilisateurs et {logs_count} entrées de journal importés dans {args.db_file}")
+
+def _load_recognizer(args):
+    """
+    Construit un reconnaisseur contenant la galerie de la base de données, avec la configuration
+    de l'application (espace d'embedding, précision, projection, modèles par utilisateur) :
+    l'index construit ici est celui que l'application rechargera.
+    """
+    import app as api
+
+    api.database.set(_open_database(args, embedding_space=api.get_embedding_space()))
+    face_recognizer = api.create_face_recognizer(
+        projection_path=os.path.join(args.db_dir, 'pca_projection.npz'),
+        standalone=True
+    )
+    api.database.close()
+    return face_recognizer
+
+def rebuild_index(args):
+    """
+    Ré-entraîne l'index approximatif sur toute la galerie et le sauvegarde.
+    """
+    face_recognizer = _load_recognizer(args)
+    if len(face_recognizer.gallery) == 0:
+        print("Galerie vide, aucun index construit")
+        return
+
+    face_recognizer.enable_index(n_lists=args.n_lists, n_probe=args.n_probe)
+    index_path = os.path.join(args.db_dir, 'ann_index.npz')
+    face_recognizer.save_index(index_path)
+    print(f"Index IVF ({face_recognizer.index.n_lists} listes, {len(face_recognizer.index)} vecteurs) sauvegardé dans {index_path}")
+
+def index_report(args):
+    """
+    Affiche le rappel et la latence de l'index approximatif par rapport à la recherche exacte.
+    """
+    from services.ann_index import evaluate_index
+
+    face_recognizer = _load_recognizer(args)
+    if len(face_recognizer.gallery) == 0:
+        print("Galerie vide")
+        return
+
+    index_path = os.path.join(args.db_dir, 'ann_index.npz')
+    face_recognizer.enable_index(n_lists=args.n_lists, index_path=index_path)
+
+    # Sondes : embeddings de la galerie légèrement bruités
+    rng = np.random.default_rng(0)
+    matrix = face_recognizer.gallery.matrix
+    rows = rng.choice(len(matrix), min(args.probes, len(matrix)), replace=False)
+    probes = matrix[rows] + args.noise * rng.standard_normal((len(rows), matrix.shape[1])) / np.sqrt(matrix.shape[1])
+
+    print(f"{'n_probe':>8} {'rappel':>8} {'latence (ms)':>14}")
+    for row in evaluate_index(face_recognizer.index, face_recognizer.gallery, probes, k=args.k):
+        print(f"{row['n_probe']:>8} {row['recall']:>8.3f} {row['latency_ms']:>14.3f}")
+
+def fit_pca(args):
+    """
+    Ajuste la projection PCA sur les embeddings bruts et re-projette toute la galerie.
+    """
+    from services.face_recognizer import FaceRecognizer
+    from services.projection import PCAProjection
+
+    database = _open_database(args)
+    user_ids, raw_embeddings = database.get_all_embeddings(space='raw')
+    if len(user_ids) < 2:
+        print("Au moins deux embeddings bruts sont nécessaires")
+        database.close()
+        return
+
+    projection = PCAProjection().fit(raw_embeddings, n_components=args.components)
+    projection.save(os.path.join(args.db_dir, 'pca_projection.npz'))
+
+    # Re-projeter les embeddings existants dans l'espace 'pca'
+    face_recognizer = FaceRecognizer(projection=projection)
+    database.put_embeddings(user_ids, face_recognizer.project(raw_embeddings), space='pca')
+    database.close()
+    print(f"Projection PCA {projection.input_dim} -> {projection.dim} ajustée sur {len(user_ids)} embeddings")
+
+    # L'index approximatif a été construit dans l'ancien espace projeté
+    index_path = os.path.join(args.db_dir, 'ann_index.npz')
+    if os.path.exists(index_path):
+        os.remove(index_path)
+        print(f"Index {index_path} supprimé (lancer rebuild-index pour le reconstruire)")
+
+def compare_projection(args):
+    """
+    Compare précision et latence de la reconnaissance en mode brut et en mode PCA.
+    """
+    import time
+    import app as api
+    from services.face_recognizer import FaceRecognizer
+    from services.gallery import template_owner
+    from services.projection import PCAProjection
+
+    database = _open_database(args)
+    user_ids, raw_embeddings = database.get_all_embeddings(space='raw')
+    database.close()
+    projection_path = os.path.join(args.db_dir, 'pca_projection.npz')
+    if len(user_ids) == 0 or not os.path.exists(projection_path):
+        print("Galerie vide ou projection absente (lancer fit-pca)")
+        return
+
+    # Sondes : embeddings bruts bruités, dont l'identité attendue est connue
+    rng = np.random.default_rng(0)
+    rows = rng.choice(len(user_ids), min(args.probes, len(user_ids)), replace=False)
+    probes = raw_embeddings[rows] + args.noise * rng.standard_normal((len(rows), raw_embeddings.shape[1])) \
+        / np.sqrt(raw_embeddings.shape[1])
+    expected = [template_owner(user_ids[row]) for row in rows]
+
+    print(f"{'mode':>6} {'dim':>6} {'top-1':>8} {'latence (ms)':>14} {'octets/utilisateur':>20}")
+    for mode, projection in (('raw', None), ('pca', PCAProjection.load(projection_path))):
+        face_recognizer = FaceRecognizer(projection=projection, max_templates=api.MAX_TEMPLATES)
+        face_recognizer.load_embeddings(user_ids, face_recognizer.project(raw_embeddings))
+        mode_probes = face_recognizer.project(probes)
+
+        start = time.perf_counter()
+        matches = [face_recognizer.match(probe)[0][0] for probe in mode_probes]
+        latency = (time.perf_counter() - start) * 1000 / len(rows)
+
+        accuracy = np.mean([match == user_id for match, user_id in zip(matches, expected)])
+        dim = face_recognizer.gallery.dim
+        print(f"{mode:>6} {dim:>6} {accuracy:>8.3f} {latency:>14.3f} {dim * 4:>20}")
+
+def _float32_reference(args, space):
+    """
+    Embeddings non quantifiés de référence : --reference, le stockage de la base s'il est en
+    float32, sinon la copie float32 conservée par convert-precision.
+
+    Returns:
+        tuple: (user_ids, matrice float32), ou None si aucun stockage float32 n'est disponible.
+    """
+    from services.database import store_name
+    from services.embedding_store import EmbeddingStore
+
+    directories = [args.reference] if args.reference else [args.db_dir, os.path.join(args.db_dir, FLOAT32_BACKUP_DIR)]
+    for directory in directories:
+        if os.path.exists(os.path.join(directory, store_name(space) + '.json')):
+            store = EmbeddingStore(directory, name=store_name(space), dtype=None)
+            if store.dtype == np.float32:
+                return store.all()
+    return None
+
+def check_precision(args):
+    """
+    Mesure la dérive de précision (float32/float16/int8) par rapport à un calcul en float64 sur
+    les embeddings non quantifiés (float32).
+    """
+    import time
+    import app as api
+    from services.gallery import Gallery
+
+    reference = _float32_reference(args, api.get_embedding_space())
+    if reference is None:
+        print("Aucun stockage float32 de référence (embeddings déjà quantifiés) : indiquer une copie "
+              "float32 de la base avec --reference")
+        return
+    user_ids, embeddings = reference
+    if len(user_ids) == 0:
+        print("Galerie vide")
+        return
+
+    # Sondes bruitées et référence exacte en float64
+    rng = np.random.default_rng(0)
+    reference = embeddings.astype(np.float64)
+    reference /= np.linalg.norm(reference, axis=1, keepdims=True)
+    rows = rng.choice(len(user_ids), min(args.probes, len(user_ids)), replace=False)
+    probes = reference[rows] + args.noise * rng.standard_normal((len(rows), reference.shape[1])) \
+        / np.sqrt(reference.shape[1])
+    probes /= np.linalg.norm(probes, axis=1, keepdims=True)
+    reference_distances = np.sqrt(np.maximum(0.0, 2.0 - 2.0 * (probes @ reference.T)))
+    expected = [user_ids[i] for i in np.argmin(reference_distances, axis=1)]
+    expected_distances = reference_distances.min(axis=1)
+
+    print(f"{'précision':>10} {'top-1 = f64':>12} {'dérive max':>12} {'latence (ms)':>14} {'octets/utilisateur':>20}")
+    for precision in ('float32', 'float16', 'int8'):
+        gallery = Gallery(precision=precision)
+        gallery.load(user_ids, embeddings)
+
+        start = time.perf_counter()
+        matches = gallery.search_batch(probes, k=1)
+        latency = (time.perf_counter() - start) * 1000 / len(rows)
+
+        agreement = np.mean([match[0][0] == user_id for match, user_id in zip(matches, expected)])
+        drift = np.max(np.abs([match[0][1] for match in matches] - expected_distances))
+        marker = ' (EMBEDDING_PRECISION)' if precision == api.EMBEDDING_PRECISION else ''
+        print(f"{precision:>10} {agreement:>12.3f} {drift:>12.2e} {latency:>14.3f} "
+              f"{gallery.nbytes / len(gallery):>20.0f}{marker}")
+
+def convert_precision(args):
+    """
+    Convertit les embeddings stockés dans une autre précision (serveur arrêté), puis
+    EMBEDDING_PRECISION doit être mise à jour en conséquence.
+    """
+    from services.database import convert_embedding_precision
+
+    if os.getenv('DB_BACKEND', 'json').lower() == 'sqlite':
+        # Chaque BLOB porte sa précision : les anciens restent lisibles, les nouveaux suivent la configuration
+        print("SQLite : aucune conversion nécessaire, la précision est enregistrée avec chaque embedding")
+        return
+
+    backup_dir = os.path.join(args.db_dir, FLOAT32_BACKUP_DIR)
+    for name, previous, count in convert_embedding_precision(args.db_dir, args.precision, backup_dir=backup_dir):
+        if previous != args.precision:
+            print(f"{name}: {previous} -> {args.precision} ({count} embeddings)")
+        else:
+            print(f"{name}: déjà en {previous}")
+    if os.path.isdir(backup_dir):
+        print(f"Copie float32 conservée dans {backup_dir} (référence de check-precision)")
+    print(f"Lancer le serveur avec EMBEDDING_PRECISION={args.precision}")
+
+def import_users(args):
+    """
+    Enrôle en masse les utilisateurs d'un fichier CSV (name, age, profession, image) à partir
+    d'un répertoire ou d'une archive de photos, avec la configuration de l'application
+    (détecteur, mode d'embedding, précision, galerie partagée, index).
+    """
+    import time
+    import app as api
+    from services.inference_executor import InferenceExecutor
+
+    api.database.set(_open_database(args, embedding_space=api.get_embedding_space()))
+    if args.workers:
+        api.inference_executor.set(InferenceExecutor(workers=args.workers, max_queue=args.workers,
+                                                     cv_threads=max(1, (os.cpu_count() or 1) // args.workers)))
+
+    start = time.perf_counter()
+    with open(args.csv, newline='', encoding='utf-8-sig') as manifest:
+        report = api.import_users(manifest, args.photos)
+    api.database.close()
+    elapsed = time.perf_counter() - start
+
+    for failure in report['failures']:
+        print(f"Ligne {failure['line']} ({failure['image']}): {failure['error']}")
+    print(f"{len(report['imported'])} utilisateurs importés, {len(report['failures'])} échecs en {elapsed:.1f} s")
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+def main():
+    parser = argparse.ArgumentParser(description="Administration du système d'authentification faciale")
+    parser.add_argument('--db-dir', default='../database', help='Répertoire de la base de données')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    parser_migrate = subparsers.add_parser('migrate-sqlite', help='Importer users.json/logs.json dans SQLite')
+    parser_migrate.add_argument('--db-file', default='facial_auth.db', help='Nom du fichier SQLite')
+    parser_migrate.set_defaults(func=migrate_sqlite)
+
+    parser_rebuild = subparsers.add_parser('rebuild-index', help="Ré-entraîner l'index approximatif (IVF)")
+    parser_rebuild.add_argument('--n-lists', type=int, default=None, help='Nombre de listes (√N par défaut)')
+    parser_rebuild.add_argument('--n-probe', type=int, default=8, help='Listes explorées par recherche')
+    parser_rebuild.set_defaults(func=rebuild_index)
+
+    parser_report = subparsers.add_parser('index-report', help='Comparer rappel et latence avec la recherche exacte')
+    parser_report.add_argument('--n-lists', type=int, default=None, help='Nombre de listes (√N par défaut)')
+    parser_report.add_argument('--probes', type=int, default=200, help='Nombre de sondes')
+    parser_report.add_argument('--k', type=int, default=1, help='Nombre de voisins comparés')
+    parser_report.add_argument('--noise', type=float, default=0.3, help='Bruit ajouté aux sondes')
+    parser_report.set_defaults(func=index_report)
+
+    parser_pca = subparsers.add_parser('fit-pca', help='Ajuster la projection PCA et re-projeter la galerie')
+    parser_pca.add_argument('--components', type=int, default=128, help='Nombre de composantes')
+    parser_pca.set_defaults(func=fit_pca)
+
+    parser_compare = subparsers.add_parser('compare-projection', help='Comparer les modes brut et PCA')
+    parser_compare.add_argument('--probes', type=int, default=200, help='Nombre de sondes')
+    parser_compare.add_argument('--noise', type=float, default=0.3, help='Bruit ajouté aux sondes')
+    parser_compare.set_defaults(func=compare_projection)
+
+    parser_precision = subparsers.add_parser('check-precision', help='Mesurer la dérive float16/int8 par rapport à float64')
+    parser_precision.add_argument('--probes', type=int, default=200, help='Nombre de sondes')
+    parser_precision.add_argument('--noise', type=float, default=0.3, help='Bruit ajouté aux sondes')
+    parser_precision.add_argument('--reference', default=None,
+                                  help='Répertoire des embeddings float32 de référence (copie de convert-precision par défaut)')
+    parser_precision.set_defaults(func=check_precision)
+
+    parser_convert = subparsers.add_parser('convert-precision', help='Convertir les embeddings stockés (serveur arrêté)')
+    parser_convert.add_argument('--precision', required=True, choices=('float32', 'float16', 'int8'),
+                                help='Nouvelle précision')
+    parser_convert.set_defaults(func=convert_precision)
+
+    parser_import = subparsers.add_parser('import-users', help='Enrôler en masse depuis un CSV et des photos')
+    parser_import.add_argument('--csv', required=True, help='Fichier CSV (colonnes name, age, profession, image)')
+    parser_import.add_argument('--photos', required=True, help='Répertoire ou archive zip/tar des photos')
+    parser_import.add_argument('--workers', type=int, default=None, help="Photos traitées en parallèle (INFERENCE_WORKERS par défaut)")
+    parser_import.add_argument('--report', default=None, help='Fichier JSON recevant les utilisateurs importés et les échecs')
+    parser_import.set_defaults(func=import_users)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == '__main__':
+    main()
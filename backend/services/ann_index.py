@@ -0,0 +1,327 @@
+"""
+Index approximatif des plus proches voisins (IVF) pour le système d'authentification faciale.
+Implémentation en NumPy pur : un quantificateur grossier (k-means sphérique) répartit
+les embeddings en listes inversées, et seules les `n_probe` listes les plus proches
+de la sonde sont comparées. L'index ne conserve que les identifiants de chaque liste :
+les vecteurs candidats sont lus dans la galerie, dans sa précision (float16/int8) et, avec
+une galerie partagée, dans la mémoire commune aux workers, sans copie par processus.
+"""
+
+import os
+import time
+import tempfile
+import threading
+import numpy as np
+
+class IVFIndex:
+    """
+    Classe représentant un index IVF (inverted file) sur des embeddings normalisés.
+    Mémoire propre : les centroïdes et les identifiants des listes (pas de copie des vecteurs).
+    """
+
+    def __init__(self, n_lists=None, n_probe=8, max_train_samples=20000, iterations=10, seed=0):
+        """
+        Initialise un index vide (non entraîné).
+
+        Args:
+            n_lists (int, optional): Nombre de listes (√N par défaut lors de l'entraînement).
+            n_probe (int, optional): Nombre de listes explorées par recherche.
+            max_train_samples (int, optional): Nombre maximal de vecteurs utilisés pour le k-means.
+            iterations (int, optional): Nombre d'itérations du k-means.
+            seed (int, optional): Graine du générateur aléatoire.
+        """
+        self.requested_lists = n_lists
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.max_train_samples = max_train_samples
+        self.iterations = iterations
+        self.seed = seed
+        self.space = None        # Espace d'embedding de la galerie indexée (vérifié au rechargement)
+        self.fingerprint = None  # Empreinte de la projection et de la galerie indexées (idem)
+
+        self.centroids = None
+        self._list_ids = []      # Identifiants des vecteurs de chaque liste
+        self._list_sizes = []    # Nombre d'identifiants utilisés dans chaque liste
+        self._positions = {}     # Dictionnaire {user_id: (liste, position)}
+        self._lock = threading.RLock()
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    @property
+    def dim(self):
+        return None if self.centroids is None else int(self.centroids.shape[1])
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __contains__(self, user_id):
+        return user_id in self._positions
+
+    def keys(self):
+        """
+        Returns:
+            list: Identifiants indexés.
+        """
+        with self._lock:
+            return list(self._positions)
+
+    @staticmethod
+    def _normalize(vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def train(self, user_ids, embeddings):
+        """
+        Entraîne le quantificateur grossier puis indexe tous les embeddings.
+
+        Args:
+            user_ids (list): Identifiants des utilisateurs.
+            embeddings (numpy.ndarray): Matrice (N, dim) des embeddings.
+        """
+        user_ids = list(user_ids)
+        matrix = self._normalize(np.asarray(embeddings).reshape(len(user_ids), -1))
+        if len(user_ids) == 0:
+            raise ValueError("Impossible d'entraîner l'index sur une galerie vide")
+
+        rng = np.random.default_rng(self.seed)
+        n_lists = self.requested_lists or max(1, int(np.sqrt(len(user_ids))))
+        n_lists = min(n_lists, len(user_ids))
+
+        # Échantillon d'entraînement
+        if len(user_ids) > self.max_train_samples:
+            sample = matrix[rng.choice(len(user_ids), self.max_train_samples, replace=False)]
+        else:
+            sample = matrix
+
+        # k-means sphérique (similarité cosinus)
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+        for _ in range(self.iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            order = np.argsort(assignment, kind='stable')
+            labels, starts = np.unique(assignment[order], return_index=True)
+            sums = np.add.reduceat(sample[order], starts, axis=0)
+
+            new_centroids = sample[rng.choice(len(sample), n_lists)].copy()  # Listes vides : réinitialisées
+            new_centroids[labels] = sums
+            centroids = self._normalize(new_centroids)
+
+        with self._lock:
+            self.centroids = centroids
+            self.n_lists = n_lists
+            self._list_ids = [[] for _ in range(n_lists)]
+            self._list_sizes = [0] * n_lists
+            self._positions = {}
+
+            self.add_many(user_ids, matrix)
+
+    def _append(self, list_idx, user_id):
+        """
+        Ajoute un identifiant à la fin d'une liste.
+        """
+        size = self._list_sizes[list_idx]
+        ids = self._list_ids[list_idx]
+        if size == len(ids):
+            ids.append(user_id)
+        else:
+            ids[size] = user_id
+
+        self._list_sizes[list_idx] = size + 1
+        self._positions[user_id] = (list_idx, size)
+
+    def add(self, user_id, embedding):
+        """
+        Insère (ou remplace) un embedding dans la liste du centroïde le plus proche.
+
+        Args:
+            user_id (str): Identifiant de l'utilisateur.
+            embedding (numpy.ndarray): Vecteur d'embedding facial.
+        """
+        self.add_many([user_id], np.ravel(embedding)[np.newaxis, :])
+
+    def add_many(self, user_ids, embeddings):
+        """
+        Insère plusieurs embeddings (l'index doit être entraîné).
+
+        Args:
+            user_ids (list): Identifiants des utilisateurs.
+            embeddings (numpy.ndarray): Matrice (N, dim) des embeddings.
+        """
+        if not self.is_trained:
+            raise RuntimeError("L'index doit être entraîné avant l'insertion")
+
+        matrix = self._normalize(np.atleast_2d(embeddings))
+        with self._lock:
+            assignment = np.argmax(matrix @ self.centroids.T, axis=1)
+            for user_id, list_idx in zip(user_ids, assignment):
+                self.remove(user_id)
+                self._append(int(list_idx), user_id)
+
+    def remove(self, user_id):
+        """
+        Supprime un embedding de l'index (le dernier de la liste prend sa place).
+
+        Args:
+            user_id (str): Identifiant de l'utilisateur.
+
+        Returns:
+            bool: True si l'utilisateur était indexé, False sinon.
+        """
+        with self._lock:
+            position = self._positions.pop(user_id, None)
+            if position is None:
+                return False
+
+            list_idx, pos = position
+            last = self._list_sizes[list_idx] - 1
+            if pos != last:
+                moved_id = self._list_ids[list_idx][last]
+                self._list_ids[list_idx][pos] = moved_id
+                self._positions[moved_id] = (list_idx, pos)
+            self._list_ids[list_idx][last] = None
+            self._list_sizes[list_idx] = last
+            return True
+
+    def search(self, embedding, gallery, k=1, n_probe=None):
+        """
+        Recherche approximative des k plus proches voisins d'une sonde.
+
+        Args:
+            embedding (numpy.ndarray): Vecteur d'embedding de la sonde.
+            gallery (Gallery): Galerie indexée, qui fournit les vecteurs candidats.
+            k (int, optional): Nombre de voisins à retourner.
+            n_probe (int, optional): Nombre de listes explorées (self.n_probe par défaut).
+
+        Returns:
+            list: Liste [(user_id, distance), ...] triée par distance croissante.
+        """
+        return self.search_batch(np.ravel(embedding)[np.newaxis, :], gallery, k=k, n_probe=n_probe)[0]
+
+    def search_batch(self, embeddings, gallery, k=1, n_probe=None):
+        """
+        Recherche approximative pour plusieurs sondes : les candidats des listes explorées
+        sont comparés à leurs lignes de la galerie.
+
+        Args:
+            embeddings (numpy.ndarray): Matrice (M, dim) des sondes.
+            gallery (Gallery): Galerie indexée, qui fournit les vecteurs candidats.
+            k (int, optional): Nombre de voisins par sonde.
+            n_probe (int, optional): Nombre de listes explorées.
+
+        Returns:
+            list: Pour chaque sonde, une liste [(user_id, distance), ...].
+        """
+        probes = self._normalize(np.atleast_2d(embeddings))
+        with self._lock:
+            if not self.is_trained or len(self) == 0:
+                return [[] for _ in range(probes.shape[0])]
+
+            n_probe = min(n_probe or self.n_probe, self.n_lists)
+            coarse = probes @ self.centroids.T
+            nearest_lists = np.argpartition(-coarse, n_probe - 1, axis=1)[:, :n_probe]
+            candidates = [
+                [uid for l in lists if l < self.n_lists for uid in self._list_ids[l][:self._list_sizes[l]]]
+                for lists in nearest_lists
+            ]
+
+        results = []
+        for candidate_ids, similarities in gallery.score(candidates, probes):
+            if not candidate_ids:
+                results.append([])
+                continue
+            top_k = min(k, len(candidate_ids))
+            top = np.argpartition(-similarities, top_k - 1)[:top_k]
+            top = top[np.argsort(-similarities[top])]
+            distances = np.sqrt(np.maximum(0.0, 2.0 - 2.0 * similarities[top]))
+            results.append([(candidate_ids[i], float(d)) for i, d in zip(top, distances)])
+
+        return results
+
+    def save(self, path):
+        """
+        Sauvegarde l'index dans un fichier .npz. Le fichier est écrit à côté puis substitué
+        atomiquement : un autre processus lit toujours un fichier complet, et deux processus
+        qui sauvegardent en même temps ne mélangent pas leurs écritures.
+
+        Args:
+            path (str): Chemin du fichier.
+        """
+        if not self.is_trained:
+            raise RuntimeError("Impossible de sauvegarder un index non entraîné")
+
+        with self._lock:
+            user_ids = list(self._positions.keys())
+            lists = np.array([l for l, _ in self._positions.values()], dtype=np.int32)
+            centroids = self.centroids
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, centroids=centroids, lists=lists,
+                         user_ids=np.array(user_ids, dtype=str), n_probe=self.n_probe,
+                         space=np.array(self.space or ''), fingerprint=np.array(self.fingerprint or ''))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        """
+        Charge un index sauvegardé par `save`.
+
+        Args:
+            path (str): Chemin du fichier.
+
+        Returns:
+            IVFIndex: Index entraîné.
+        """
+        with np.load(path) as data:
+            index = cls(n_lists=data['centroids'].shape[0], n_probe=int(data['n_probe']))
+            index.centroids = data['centroids']
+            # Index sauvegardés avant l'ajout de l'espace : espace inconnu (reconstruit)
+            index.space = (str(data['space']) or None) if 'space' in data.files else None
+            index.fingerprint = (str(data['fingerprint']) or None) if 'fingerprint' in data.files else None
+            index._list_ids = [[] for _ in range(index.n_lists)]
+            index._list_sizes = [0] * index.n_lists
+            for user_id, list_idx in zip(data['user_ids'], data['lists']):
+                index._append(int(list_idx), str(user_id))
+        return index
+
+
+def evaluate_index(index, gallery, probes, k=1, n_probes=(1, 2, 4, 8, 16, 32)):
+    """
+    Compare la recherche approximative à la recherche exacte (rappel et latence).
+
+    Args:
+        index (IVFIndex): Index entraîné.
+        gallery (Gallery): Galerie utilisée pour la recherche exacte.
+        probes (numpy.ndarray): Matrice (M, dim) des sondes.
+        k (int, optional): Nombre de voisins comparés.
+        n_probes (tuple, optional): Valeurs de n_probe à évaluer.
+
+    Returns:
+        list: Rapport [{'n_probe', 'recall', 'latency_ms'}, ...], la première ligne étant la recherche exacte.
+    """
+    probes = np.atleast_2d(probes)
+
+    start = time.perf_counter()
+    exact = [{user_id for user_id, _ in result} for result in gallery.search_batch(probes, k=k)]
+    exact_latency = (time.perf_counter() - start) * 1000 / len(probes)
+
+    report = [{'n_probe': 'exact', 'recall': 1.0, 'latency_ms': exact_latency}]
+    for n_probe in n_probes:
+        if n_probe > index.n_lists:
+            break
+        start = time.perf_counter()
+        approx = [index.search(probe, gallery, k=k, n_probe=n_probe) for probe in probes]
+        latency = (time.perf_counter() - start) * 1000 / len(probes)
+
+        hits = sum(len(truth & {user_id for user_id, _ in result}) for truth, result in zip(exact, approx))
+        total = sum(len(truth) for truth in exact) or 1
+        report.append({'n_probe': n_probe, 'recall': hits / total, 'latency_ms': latency})
+
+    return report
@@ -0,0 +1,236 @@
+"""
+Enrôlement en masse pour le système d'authentification faciale : un fichier CSV (colonnes
+name, age, profession, image) et un répertoire ou une archive (zip, tar) de photos.
+Les lignes sont lues au fil de l'eau et les photos traitées en parallèle par l'exécuteur
+d'inférence ; les échecs sont signalés ligne par ligne sans interrompre l'import.
+"""
+
+import os
+import csv
+import time
+import tarfile
+import zipfile
+from collections import deque
+from concurrent.futures import wait, FIRST_COMPLETED
+from services.inference_executor import ExecutorSaturated
+
+REQUIRED_COLUMNS = ('name', 'age', 'profession', 'image')
+MAX_SUBMIT_DELAY = 0.2  # Attente maximale entre deux soumissions refusées, en secondes
+
+def read_manifest(lines):
+    """
+    Lit le fichier CSV d'import ligne par ligne.
+
+    Args:
+        lines (iterable): Lignes du fichier CSV (fichier texte ouvert).
+
+    Yields:
+        tuple: (numéro de ligne, dictionnaire {colonne: valeur}).
+
+    Raises:
+        ValueError: Colonnes obligatoires absentes de l'en-tête.
+    """
+    reader = csv.DictReader(lines)
+    columns = [(column or '').strip().lower() for column in reader.fieldnames or []]
+    missing = [column for column in REQUIRED_COLUMNS if column not in columns]
+    if missing:
+        raise ValueError(f"Colonnes manquantes dans le CSV: {', '.join(missing)}")
+    reader.fieldnames = columns
+
+    for row in reader:
+        yield reader.line_num, {key: (value or '').strip() for key, value in row.items() if key}
+
+class PhotoSource:
+    """
+    Classe donnant accès aux photos d'un import : répertoire, archive zip ou archive tar
+    (éventuellement compressée), par leur chemin relatif ou, dans une archive, par leur
+    chemin sans le dossier racine commun ou leur seul nom de fichier s'il est unique.
+    """
+
+    def __init__(self, source):
+        """
+        Ouvre la source des photos.
+
+        Args:
+            source (str or file): Chemin d'un répertoire ou d'une archive, ou archive ouverte (téléversement).
+
+        Raises:
+            ValueError: Format de source non reconnu.
+        """
+        self.root = None
+        self._zip = None
+        self._tar = None
+        self._names = {}
+        self._basenames = {}
+
+        if isinstance(source, str) and os.path.isdir(source):
+            self.root = os.path.realpath(source)
+            return
+
+        if zipfile.is_zipfile(source):
+            if hasattr(source, 'seek'):
+                source.seek(0)
+            self._zip = zipfile.ZipFile(source)
+            members = [info.filename for info in self._zip.infolist() if not info.is_dir()]
+        else:
+            if hasattr(source, 'seek'):
+                source.seek(0)
+            try:
+                if isinstance(source, str):
+                    self._tar = tarfile.open(source, 'r:*')
+                else:
+                    self._tar = tarfile.open(fileobj=source, mode='r:*')
+            except (tarfile.TarError, OSError):
+                raise ValueError("Photos attendues dans un répertoire ou une archive zip/tar")
+            members = [member for member in self._tar.getmembers() if member.isfile()]
+
+        names = [(self._normalize(member if isinstance(member, str) else member.name), member) for member in members]
+        # Archive d'un dossier (ex. photos/...) : chemins aussi accessibles sans ce dossier
+        prefixes = {name.split('/', 1)[0] for name, _ in names}
+        strip_prefix = len(prefixes) == 1 and all('/' in name for name, _ in names)
+
+        basenames = {}
+        for name, member in names:
+            self._names[name] = member
+            if strip_prefix:
+                self._names.setdefault(name.split('/', 1)[1], member)
+            basenames.setdefault(os.path.basename(name), []).append(member)
+        self._basenames = {basename: found[0] for basename, found in basenames.items() if len(found) == 1}
+
+    @staticmethod
+    def _normalize(name):
+        return os.path.normpath(name.replace('\\', '/')).lstrip('/')
+
+    def read(self, name):
+        """
+        Lit le contenu d'une photo.
+
+        Args:
+            name (str): Chemin relatif de la photo (colonne 'image' du CSV).
+
+        Returns:
+            bytes: Contenu du fichier.
+
+        Raises:
+            ValueError: Photo introuvable.
+        """
+        if self.root is not None:
+            path = os.path.realpath(os.path.join(self.root, name))
+            # Refuser les chemins sortant du répertoire des photos
+            if os.path.commonpath([self.root, path]) != self.root or not os.path.isfile(path):
+                raise ValueError(f"Photo introuvable: {name}")
+            with open(path, 'rb') as f:
+                return f.read()
+
+        key = self._normalize(name)
+        member = self._names.get(key)
+        if member is None and '/' not in key:
+            member = self._basenames.get(key)
+        if member is None:
+            raise ValueError(f"Photo introuvable: {name}")
+        if self._zip is not None:
+            return self._zip.read(member)
+        return self._tar.extractfile(member).read()
+
+    def close(self):
+        for archive in (self._zip, self._tar):
+            if archive is not None:
+                archive.close()
+
+class BulkEnrollment:
+    """
+    Classe traitant les lignes d'un import : validation des champs, lecture de la photo et
+    extraction de l'embedding dans l'exécuteur, au plus `window` photos à la fois (la mémoire
+    reste bornée quel que soit le nombre de lignes). Les résultats sont rendus dans l'ordre du CSV.
+    """
+
+    def __init__(self, extract, executor, window=None):
+        """
+        Initialise le traitement.
+
+        Args:
+            extract (callable): Fonction (octets de la photo) -> données d'enrôlement, ou None si aucun visage.
+            executor (object): Exécuteur exposant submit(fn, *args) -> Future (ex. InferenceExecutor).
+            window (int, optional): Photos soumises simultanément (workers de l'exécuteur par défaut).
+        """
+        self.extract = extract
+        self.executor = executor
+        self.window = window or getattr(executor, 'workers', None) or os.cpu_count() or 1
+
+    def _submit(self, pending, image_bytes):
+        # L'exécuteur partagé peut être occupé par le trafic en ligne : attendre qu'une extraction
+        # de l'import se termine ou, si elles le sont toutes, qu'une place se libère (attente croissante)
+        delay = 0.005
+        while True:
+            try:
+                return self.executor.submit(self.extract, image_bytes)
+            except ExecutorSaturated:
+                running = [future for _, _, future in pending if not future.done()]
+                if running:
+                    wait(running, timeout=delay, return_when=FIRST_COMPLETED)
+                else:
+                    time.sleep(delay)
+                delay = min(delay * 2, MAX_SUBMIT_DELAY)
+
+    def run(self, rows, photos):
+        """
+        Traite toutes les lignes d'un import.
+
+        Args:
+            rows (iterable): Lignes (numéro, champs) retournées par read_manifest.
+            photos (PhotoSource): Source des photos.
+
+        Returns:
+            tuple: (enrôlements [(numéro, champs, données d'enrôlement)],
+                    échecs [{'line', 'image', 'error'}]).
+        """
+        enrollments, failures = [], []
+        pending = deque()
+
+        def collect(line, fields, future):
+            try:
+                enrollment = future.result()
+            except Exception as e:
+                enrollment, error = None, str(e)
+            else:
+                error = "Aucun visage détecté dans l'image"
+            if enrollment is None:
+                failures.append({'line': line, 'image': fields['image'], 'error': error})
+            else:
+                enrollments.append((line, fields, enrollment))
+
+        for line, fields in rows:
+            error = self._validate(fields)
+            if error is None:
+                try:
+                    image_bytes = photos.read(fields['image'])
+                except ValueError as e:
+                    error = str(e)
+            if error is not None:
+                failures.append({'line': line, 'image': fields.get('image', ''), 'error': error})
+                continue
+
+            if len(pending) >= self.window:
+                collect(*pending.popleft())
+            pending.append((line, fields, self._submit(pending, image_bytes)))
+
+        while pending:
+            collect(*pending.popleft())
+
+        failures.sort(key=lambda failure: failure['line'])
+        return enrollments, failures
+
+    @staticmethod
+    def _validate(fields):
+        """
+        Returns:
+            str: Message d'erreur, ou None si les champs sont valides.
+        """
+        for field in REQUIRED_COLUMNS:
+            if not fields.get(field):
+                return f"Champ manquant: {field}"
+        try:
+            fields['age'] = int(fields['age'])
+        except ValueError:
+            return f"Âge invalide: {fields['age']}"
+        return None
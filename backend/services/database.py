@@ -4,25 +4,47 @@ Service de base de données pour le système d'authentification faciale.
 
 import os
 import json
+import shutil
+import threading
 import numpy as np
 from models.user import User
+from services.embedding_store import EmbeddingStore
+from services.gallery import template_key
+from services.log_writer import LogWriter
 
 class Database:
     """
     Classe pour la gestion de la base de données des utilisateurs et des journaux.
-    Utilise des fichiers JSON pour le stockage (pour simplifier).
+    Utilise des fichiers JSON pour les métadonnées (pour simplifier) et un
+    stockage binaire projeté en mémoire pour les embeddings. Les journaux sont
+    écrits en ajout seul au format JSON Lines.
+    
+    Les profils sont gardés en mémoire (index {user_id: profil}) et écrits de
+    manière synchrone sur disque ; l'index est rechargé si users.json a été
+    modifié par un autre processus.
     """
     
-    def __init__(self, db_dir='database'):
+    def __init__(self, db_dir='database', embedding_dtype='float32', embedding_space='raw'):
         """
         Initialise la base de données.
         
         Args:
             db_dir (str): Répertoire de la base de données.
+            embedding_dtype (str, optional): Type des embeddings sur disque ('float32', 'float16' ou 'int8') ;
+                None : type des stockages existants. Un stockage dans un autre type lève ValueError.
+            embedding_space (str, optional): Espace des embeddings utilisés ('raw' ou 'pca').
         """
         self.db_dir = db_dir
+        self.embedding_dtype = embedding_dtype
+        self.embedding_space = embedding_space
+        self._stores = {}
         self.users_file = os.path.join(db_dir, 'users.json')
-        self.logs_file = os.path.join(db_dir, 'logs.json')
+        self.logs_file = os.path.join(db_dir, 'logs.jsonl')
+        
+        # Index en mémoire des profils et signature du fichier correspondant
+        self._users = None
+        self._users_signature = None
+        self._users_lock = threading.RLock()
         
         # Créer le répertoire de la base de données s'il n'existe pas
         os.makedirs(db_dir, exist_ok=True)
@@ -31,8 +53,133 @@ class Database:
         if not os.path.exists(self.users_file):
             self._save_data(self.users_file, {})
         
-        if not os.path.exists(self.logs_file):
-            self._save_data(self.logs_file, [])
+        # Journaux en ajout seul, vidés par lots en arrière-plan
+        self._migrate_logs(os.path.join(db_dir, 'logs.json'))
+        self.log_writer = LogWriter(self.logs_file)
+        
+        # Stockage binaire des embeddings (un stockage par espace d'embedding)
+        self.embeddings = self._store(embedding_space)
+        self._migrate_embeddings()
+    
+    def _store(self, space):
+        """
+        Retourne le stockage binaire d'un espace d'embedding ('raw' : embeddings.bin,
+        autre : embeddings_<espace>.bin).
+        """
+        if space not in self._stores:
+            self._stores[space] = EmbeddingStore(self.db_dir, name=store_name(space), dtype=self.embedding_dtype)
+        return self._stores[space]
+    
+    def _existing_spaces(self):
+        """
+        Liste les espaces d'embedding présents sur disque.
+        """
+        spaces = set(self._stores)
+        for file_name in os.listdir(self.db_dir):
+            if file_name == 'embeddings.json':
+                spaces.add('raw')
+            elif file_name.startswith('embeddings_') and file_name.endswith('.json'):
+                spaces.add(file_name[len('embeddings_'):-len('.json')])
+        return spaces
+    
+    def _existing_store(self, space):
+        """
+        Retourne le stockage d'un espace s'il existe déjà, sans en créer de nouveau.
+        Un stockage présent sur disque mais pas encore ouvert est ouvert dans sa propre
+        précision, sans être conservé.
+        
+        Args:
+            space (str): Espace d'embedding.
+        
+        Returns:
+            EmbeddingStore: Stockage de l'espace ou None s'il n'existe pas.
+        """
+        if space in self._stores:
+            return self._stores[space]
+        if not os.path.exists(os.path.join(self.db_dir, f'{store_name(space)}.json')):
+            return None
+        return EmbeddingStore(self.db_dir, name=store_name(space), dtype=None)
+    
+    def _migrate_embeddings(self):
+        """
+        Déplace les embeddings encore stockés sous forme de listes dans users.json
+        vers le stockage binaire, puis réécrit users.json avec les seules métadonnées.
+        """
+        users = self._load_data(self.users_file)
+        legacy = {
+            user_id: user_data.pop('face_embedding')
+            for user_id, user_data in users.items()
+            if 'face_embedding' in user_data
+        }
+        if not legacy:
+            return
+        
+        embeddings = {user_id: e for user_id, e in legacy.items() if e}
+        # Ne créer le stockage 'raw' que s'il y a réellement des vecteurs à déplacer
+        if not embeddings or self._store('raw').put_many(list(embeddings.keys()), np.array(list(embeddings.values()))):
+            self._save_users(users)
+    
+    def _file_signature(self, file_path):
+        """
+        Calcule une signature (inode, date de modification, taille) d'un fichier.
+        
+        Returns:
+            tuple: Signature ou None si le fichier n'existe pas.
+        """
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    
+    def _users_index(self):
+        """
+        Retourne l'index en mémoire des profils, rechargé uniquement si
+        users.json a changé sur disque depuis le dernier chargement.
+        
+        Returns:
+            dict: Dictionnaire {user_id: profil}.
+        """
+        with self._users_lock:
+            signature = self._file_signature(self.users_file)
+            if self._users is None or signature != self._users_signature:
+                self._users = self._load_data(self.users_file)
+                self._users_signature = signature
+            return self._users
+    
+    def _save_users(self, users):
+        """
+        Écrit les profils sur disque puis met à jour l'index en mémoire.
+        
+        Args:
+            users (dict): Dictionnaire {user_id: profil}.
+            
+        Returns:
+            bool: True si la sauvegarde a réussi, False sinon.
+        """
+        with self._users_lock:
+            if not self._save_data(self.users_file, users):
+                return False
+            self._users = users
+            self._users_signature = self._file_signature(self.users_file)
+            return True
+    
+    def _migrate_logs(self, legacy_file):
+        """
+        Convertit l'ancien fichier logs.json (tableau JSON) au format JSON Lines.
+        L'ancien fichier est conservé sous le nom logs.json.bak.
+        """
+        if not os.path.exists(legacy_file) or os.path.exists(self.logs_file):
+            return
+        
+        logs = self._load_data(legacy_file)
+        try:
+            with open(self.logs_file, 'w') as f:
+                for log_entry in logs:
+                    f.write(json.dumps(log_entry) + '\n')
+            os.replace(legacy_file, legacy_file + '.bak')
+        except Exception as e:
+            print(f"Erreur lors de la migration des journaux: {e}")
     
     def _load_data(self, file_path):
         """
@@ -63,8 +210,11 @@ class Database:
             bool: True si la sauvegarde a réussi, False sinon.
         """
         try:
-            with open(file_path, 'w') as f:
+            # Écriture atomique : fichier temporaire puis renommage
+            tmp_file = file_path + '.tmp'
+            with open(tmp_file, 'w') as f:
                 json.dump(data, f, indent=2)
+            os.replace(tmp_file, file_path)
             return True
         except Exception as e:
             print(f"Erreur lors de la sauvegarde des données: {e}")
@@ -78,38 +228,122 @@ class Database:
             user_id (str): ID de l'utilisateur.
             
         Returns:
-            User: Objet utilisateur ou None si non trouvé.
+            User: Profil de l'utilisateur (sans embedding) ou None si non trouvé.
         """
-        users = self._load_data(self.users_file)
-        user_data = users.get(user_id)
+        user_data = self._users_index().get(user_id)
         
         if user_data:
-            # Convertir l'embedding de liste à numpy array
-            if 'face_embedding' in user_data and user_data['face_embedding']:
-                user_data['face_embedding'] = np.array(user_data['face_embedding'])
-            
+            # Profil seul : l'embedding se lit à part (get_embedding)
             return User.from_dict(user_data)
         
         return None
     
+    def get_embedding(self, user_id, space=None):
+        """
+        Récupère l'embedding principal d'un utilisateur.
+        
+        Args:
+            user_id (str): ID de l'utilisateur.
+            space (str, optional): Espace d'embedding (celui de la base par défaut).
+            
+        Returns:
+            numpy.ndarray: Embedding ou None si absent.
+        """
+        store = self._existing_store(space or self.embedding_space)
+        return store.get(user_id) if store is not None else None
+    
     def get_all_users(self):
         """
         Récupère tous les utilisateurs.
         
         Returns:
-            list: Liste des objets utilisateur.
+            list: Liste des profils utilisateur (sans embedding).
+        """
+        return [User.from_dict(user_data) for user_data in list(self._users_index().values())]
+    
+    def count_users(self):
+        """
+        Compte les utilisateurs sans construire leurs profils.
+        
+        Returns:
+            int: Nombre d'utilisateurs.
+        """
+        return len(self._users_index())
+    
+    def get_all_embeddings(self, space=None):
         """
-        users_data = self._load_data(self.users_file)
-        users = []
+        Récupère tous les embeddings en une seule lecture du stockage binaire.
         
-        for user_id, user_data in users_data.items():
-            # Convertir l'embedding de liste à numpy array
-            if 'face_embedding' in user_data and user_data['face_embedding']:
-                user_data['face_embedding'] = np.array(user_data['face_embedding'])
+        Args:
+            space (str, optional): Espace d'embedding (celui de la base par défaut).
+        
+        Returns:
+            tuple: (user_ids, matrice (N, dim) des embeddings).
+        """
+        return self._store(space or self.embedding_space).all()
+    
+    def put_embeddings(self, user_ids, embeddings, space=None):
+        """
+        Écrit des embeddings dans un espace donné (sans modifier les profils).
+        
+        Args:
+            user_ids (list): Identifiants des utilisateurs.
+            embeddings (numpy.ndarray): Matrice (N, dim) des embeddings.
+            space (str, optional): Espace d'embedding (celui de la base par défaut).
+            
+        Returns:
+            bool: True si l'écriture a réussi, False sinon.
+        """
+        return self._store(space or self.embedding_space).put_many(user_ids, embeddings)
+    
+    def get_templates(self, user_id, space=None):
+        """
+        Récupère tous les modèles (templates) d'un utilisateur, le principal en premier.
+        
+        Args:
+            user_id (str): ID de l'utilisateur.
+            space (str, optional): Espace d'embedding (celui de la base par défaut).
             
-            users.append(User.from_dict(user_data))
+        Returns:
+            numpy.ndarray: Matrice (T, dim) des modèles (T = 0 si l'utilisateur n'en a aucun).
+        """
+        store = self._store(space or self.embedding_space)
+        templates = []
+        while True:
+            embedding = store.get(template_key(user_id, len(templates)))
+            if embedding is None:
+                break
+            templates.append(embedding)
+        if not templates:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.array(templates, dtype=np.float32).reshape(len(templates), -1)
+    
+    def put_templates(self, user_id, templates, space=None):
+        """
+        Remplace les modèles d'un utilisateur (le premier devient son embedding principal).
         
-        return users
+        Args:
+            user_id (str): ID de l'utilisateur.
+            templates (numpy.ndarray): Matrice (T, dim) des modèles.
+            space (str, optional): Espace d'embedding (celui de la base par défaut).
+            
+        Returns:
+            bool: True si l'écriture a réussi, False sinon.
+        """
+        store = self._store(space or self.embedding_space)
+        keys = [template_key(user_id, i) for i in range(len(templates))]
+        if not store.put_many(keys, np.asarray(templates)):
+            return False
+        self._delete_templates(store, user_id, start=len(keys))
+        return True
+    
+    def _delete_templates(self, store, user_id, start=0):
+        """
+        Supprime les modèles d'un utilisateur à partir du n° start (clés contiguës).
+        """
+        index = start
+        while store.delete(template_key(user_id, index)):
+            index += 1
     
     def add_user(self, user):
         """
@@ -121,19 +355,47 @@ class Database:
         Returns:
             bool: True si l'ajout a réussi, False sinon.
         """
-        users = self._load_data(self.users_file)
-        
-        # Créer un dictionnaire à partir de l'objet utilisateur
+        # Créer un dictionnaire à partir de l'objet utilisateur (sans l'embedding)
         user_dict = user.__dict__.copy()
+        user_dict.pop('face_embedding', None)
         
-        # Convertir l'embedding numpy array en liste pour le stockage JSON
+        # Écrire l'embedding dans le stockage binaire
         if user.face_embedding is not None:
-            user_dict['face_embedding'] = user.face_embedding.tolist()
+            if not self.embeddings.put(user.user_id, user.face_embedding):
+                return False
         
-        # Ajouter l'utilisateur
-        users[user.user_id] = user_dict
+        # Ajouter l'utilisateur (écriture synchrone puis mise à jour de l'index)
+        with self._users_lock:
+            users = dict(self._users_index())
+            users[user.user_id] = user_dict
+            return self._save_users(users)
+    
+    def add_users(self, users):
+        """
+        Ajoute ou met à jour plusieurs utilisateurs : un seul écrit des embeddings
+        et une seule réécriture de users.json.
+        
+        Args:
+            users (list): Objets utilisateur.
+            
+        Returns:
+            bool: True si l'ajout a réussi, False sinon.
+        """
+        # Écrire les embeddings dans le stockage binaire
+        with_embedding = [user for user in users if user.face_embedding is not None]
+        if with_embedding:
+            embeddings = np.array([np.ravel(user.face_embedding) for user in with_embedding])
+            if not self.embeddings.put_many([user.user_id for user in with_embedding], embeddings):
+                return False
         
-        return self._save_data(self.users_file, users)
+        # Ajouter les utilisateurs (une seule écriture puis mise à jour de l'index)
+        with self._users_lock:
+            users_index = dict(self._users_index())
+            for user in users:
+                user_dict = user.__dict__.copy()
+                user_dict.pop('face_embedding', None)
+                users_index[user.user_id] = user_dict
+            return self._save_users(users_index)
     
     def delete_user(self, user_id):
         """
@@ -145,40 +407,121 @@ class Database:
         Returns:
             bool: True si la suppression a réussi, False sinon.
         """
-        users = self._load_data(self.users_file)
-        
-        if user_id in users:
-            del users[user_id]
-            return self._save_data(self.users_file, users)
+        with self._users_lock:
+            users = dict(self._users_index())
+            
+            if user_id in users:
+                del users[user_id]
+                for space in self._existing_spaces():
+                    store = self._existing_store(space)
+                    if store is not None:
+                        self._delete_templates(store, user_id)
+                return self._save_users(users)
         
         return False
     
     def add_log(self, log_entry):
         """
-        Ajoute une entrée de journal.
+        Ajoute une entrée de journal (écrite par lots en arrière-plan).
         
         Args:
             log_entry (dict): Entrée de journal.
             
         Returns:
-            bool: True si l'ajout a réussi, False sinon.
+            bool: True si l'entrée a été acceptée, False sinon.
         """
-        logs = self._load_data(self.logs_file)
-        logs.append(log_entry)
-        
-        return self._save_data(self.logs_file, logs)
+        return self.log_writer.write(log_entry)
     
-    def get_logs(self, limit=100):
+    def get_logs(self, limit=100, action=None, user_id=None, since=None, until=None):
         """
         Récupère les entrées de journal.
         
         Args:
             limit (int): Nombre maximum d'entrées à récupérer.
+            action (str, optional): Ne garder que ce type d'action.
+            user_id (str, optional): Ne garder que les entrées de cet utilisateur.
+            since (str, optional): Horodatage ISO minimal (inclus).
+            until (str, optional): Horodatage ISO maximal (inclus).
             
         Returns:
             list: Liste des entrées de journal.
         """
-        logs = self._load_data(self.logs_file)
+        if action is None and user_id is None and since is None and until is None:
+            # Lire les dernières entrées depuis la fin du fichier
+            return self.log_writer.tail(limit)
         
-        # Retourner les dernières entrées
+        # Les filtres nécessitent un parcours complet des fichiers JSON Lines
+        logs = [
+            log_entry for log_entry in self.log_writer.iter_entries()
+            if (action is None or log_entry.get('action') == action)
+            and (user_id is None or log_entry.get('user_id') == user_id)
+            and (since is None or log_entry.get('timestamp', '') >= since)
+            and (until is None or log_entry.get('timestamp', '') <= until)
+        ]
         return logs[-limit:]
+    
+    def close(self):
+        """
+        Écrit les journaux en attente et libère les ressources.
+        """
+        self.log_writer.close()
+
+
+def store_name(space):
+    """
+    Préfixe des fichiers du stockage binaire d'un espace d'embedding
+    ('raw' : embeddings.bin, autre : embeddings_<espace>.bin).
+    """
+    return 'embeddings' if space == 'raw' else f'embeddings_{space}'
+
+def convert_embedding_precision(db_dir, precision, backup_dir=None):
+    """
+    Convertit tous les stockages binaires d'embeddings (tous les espaces) dans une autre
+    précision. Migration explicite, à lancer serveur arrêté (manage.py convert-precision).
+    
+    Args:
+        db_dir (str): Répertoire de la base de données.
+        precision (str): Nouvelle précision ('float32', 'float16' ou 'int8').
+        backup_dir (str, optional): Répertoire recevant une copie des stockages float32 avant leur
+            conversion (la quantification est irréversible ; la copie sert de référence à check-precision).
+        
+    Returns:
+        list: Tuples (nom du stockage, ancienne précision, nombre d'embeddings convertis).
+    """
+    converted = []
+    for file_name in sorted(os.listdir(db_dir)):
+        if file_name == 'embeddings.json' or (file_name.startswith('embeddings_') and file_name.endswith('.json')):
+            name = file_name[:-len('.json')]
+            store = EmbeddingStore(db_dir, name=name, dtype=None)
+            previous = store.dtype.name
+            if previous == precision:
+                converted.append((name, previous, 0))
+                continue
+            if backup_dir and previous == 'float32':
+                os.makedirs(backup_dir, exist_ok=True)
+                for file_path in (store.data_file, store.scales_file, store.index_file):
+                    shutil.copy2(file_path, backup_dir)
+            converted.append((name, previous, store.convert(precision)))
+    return converted
+
+def create_database(backend=None, db_dir='database', **kwargs):
+    """
+    Crée le service de base de données selon la configuration.
+    
+    Args:
+        backend (str, optional): 'json' ou 'sqlite' (variable DB_BACKEND par défaut).
+        db_dir (str): Répertoire de la base de données.
+        **kwargs: Options transmises au moteur choisi.
+        
+    Returns:
+        Database/SQLiteDatabase: Service de base de données.
+    """
+    backend = (backend or os.getenv('DB_BACKEND', 'json')).lower()
+    
+    if backend == 'json':
+        return Database(db_dir=db_dir, **kwargs)
+    if backend == 'sqlite':
+        from services.sqlite_database import SQLiteDatabase
+        return SQLiteDatabase(db_dir=db_dir, **kwargs)
+    
+    raise ValueError(f"Moteur de base de données inconnu: {backend}")
@@ -0,0 +1,151 @@
+"""
+Détecteurs de visage à base de réseaux de neurones (cv2.dnn) pour le système d'authentification faciale.
+Le modèle est chargé une seule fois ; les inférences sont protégées par un verrou car un réseau
+OpenCV ne peut pas être utilisé simultanément par plusieurs threads.
+"""
+
+import os
+import threading
+import cv2
+import numpy as np
+from services.face_detector import BaseFaceDetector
+
+class DnnFaceDetector(BaseFaceDetector):
+    """
+    Classe de base des détecteurs DNN : conversion des entrées et filtrage des rectangles.
+    """
+
+    def __init__(self, model_path):
+        if not model_path or not os.path.exists(model_path):
+            raise RuntimeError(f"Modèle de détection introuvable: {model_path} (variable DETECTOR_MODEL)")
+        super().__init__('dnn')
+        self.model_path = model_path
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _to_bgr(image):
+        # Les réseaux attendent une image couleur, y compris pour une image décodée en niveaux de gris
+        return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR) if len(image.shape) == 2 else image
+
+    @staticmethod
+    def _filter(boxes, shape, min_size=None, max_size=None):
+        """
+        Ramène des rectangles (x1, y1, x2, y2) en pixels dans l'image, au format (x, y, w, h),
+        et écarte ceux dont la taille sort de [min_size, max_size].
+
+        Returns:
+            numpy.ndarray: Matrice (N, 4) d'entiers.
+        """
+        height, width = shape[:2]
+        min_w, min_h = min_size or (30, 30)
+        max_w, max_h = max_size or (width, height)
+        faces = []
+        for x1, y1, x2, y2 in boxes:
+            x1, y1 = max(0, int(round(x1))), max(0, int(round(y1)))
+            x2, y2 = min(width, int(round(x2))), min(height, int(round(y2)))
+            w, h = x2 - x1, y2 - y1
+            if min_w <= w <= max_w and min_h <= h <= max_h:
+                faces.append((x1, y1, w, h))
+        return np.array(faces, dtype=np.int32).reshape(-1, 4)
+
+    def detect(self, image, min_size=None, max_size=None):
+        return self.detect_batch([image], min_size=min_size, max_size=max_size)[0]
+
+class SSDFaceDetector(DnnFaceDetector):
+    """
+    Détecteur SSD (ex. res10_300x300_ssd_iter_140000.caffemodel + deploy.prototxt, ou export ONNX/TensorFlow).
+    Plusieurs images sont traitées en une seule inférence (cv2.dnn.blobFromImages).
+    """
+
+    def __init__(self, model_path, config_path=None, confidence=0.5, input_size=(300, 300),
+                 mean=(104.0, 177.0, 123.0)):
+        """
+        Initialise le détecteur SSD.
+
+        Args:
+            model_path (str): Chemin des poids du modèle.
+            config_path (str, optional): Chemin de la description du réseau (prototxt, pbtxt).
+            confidence (float, optional): Score minimal d'une détection.
+            input_size (tuple, optional): Taille d'entrée du réseau.
+            mean (tuple, optional): Moyenne BGR soustraite aux pixels.
+        """
+        super().__init__(model_path)
+        self.net = cv2.dnn.readNet(model_path, config_path or '')
+        self.confidence = confidence
+        self.input_size = tuple(input_size)
+        self.mean = mean
+
+    def detect_batch(self, images, min_size=None, max_size=None):
+        """
+        Détecte les visages de plusieurs images en une seule inférence.
+
+        Args:
+            images (list): Images (BGR ou niveaux de gris).
+            min_size (tuple, optional): Taille minimale des visages, en pixels.
+            max_size (tuple, optional): Taille maximale des visages, en pixels.
+
+        Returns:
+            list: Pour chaque image, une matrice (N, 4) de rectangles (x, y, w, h).
+        """
+        if not images:
+            return []
+        images = [self._to_bgr(image) for image in images]
+        blob = cv2.dnn.blobFromImages(images, 1.0, self.input_size, self.mean, swapRB=False, crop=False)
+        with self._lock:
+            self.net.setInput(blob)
+            detections = self.net.forward()
+
+        # Sortie (1, 1, N, 7) : [indice d'image, classe, score, x1, y1, x2, y2] en coordonnées relatives
+        boxes = [[] for _ in images]
+        for image_id, _, score, x1, y1, x2, y2 in detections.reshape(-1, 7):
+            index = int(image_id)
+            if score < self.confidence or not 0 <= index < len(images):
+                continue
+            height, width = images[index].shape[:2]
+            boxes[index].append((x1 * width, y1 * height, x2 * width, y2 * height))
+
+        return [self._filter(image_boxes, image.shape, min_size, max_size) for image_boxes, image in zip(boxes, images)]
+
+class YuNetFaceDetector(DnnFaceDetector):
+    """
+    Détecteur YuNet (cv2.FaceDetectorYN, ex. face_detection_yunet_2023mar.onnx).
+    L'API YuNet traite une image par appel ; detect_batch les enchaîne.
+    """
+
+    def __init__(self, model_path, score_threshold=0.7, nms_threshold=0.3, top_k=50):
+        """
+        Initialise le détecteur YuNet.
+
+        Args:
+            model_path (str): Chemin du modèle ONNX.
+            score_threshold (float, optional): Score minimal d'une détection.
+            nms_threshold (float, optional): Seuil de suppression des non-maxima.
+            top_k (int, optional): Nombre maximal de candidats conservés avant NMS.
+        """
+        super().__init__(model_path)
+        self.model = cv2.FaceDetectorYN.create(model_path, '', (320, 320), score_threshold, nms_threshold, top_k)
+
+    def detect_batch(self, images, min_size=None, max_size=None):
+        """
+        Détecte les visages de plusieurs images.
+
+        Args:
+            images (list): Images (BGR ou niveaux de gris).
+            min_size (tuple, optional): Taille minimale des visages, en pixels.
+            max_size (tuple, optional): Taille maximale des visages, en pixels.
+
+        Returns:
+            list: Pour chaque image, une matrice (N, 4) de rectangles (x, y, w, h).
+        """
+        results = []
+        for image in images:
+            image = self._to_bgr(image)
+            height, width = image.shape[:2]
+            with self._lock:
+                self.model.setInputSize((width, height))
+                _, faces = self.model.detect(image)
+
+            # Lignes [x, y, w, h, 5 points de repère..., score]
+            boxes = [] if faces is None else [(x, y, x + w, y + h) for x, y, w, h in faces[:, :4]]
+            results.append(self._filter(boxes, image.shape, min_size, max_size))
+        return results
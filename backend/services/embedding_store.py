@@ -0,0 +1,310 @@
+"""
+Stockage binaire des embeddings faciaux pour le système d'authentification faciale.
+Les vecteurs sont écrits dans un fichier binaire brut projeté en mémoire (mmap),
+avec un petit index JSON qui associe chaque user_id à une ligne.
+"""
+
+import os
+import json
+import fcntl
+import threading
+from contextlib import contextmanager
+import numpy as np
+from utils.quantization import quantize, dequantize
+
+class EmbeddingStore:
+    """
+    Classe pour le stockage compact des embeddings.
+    Fichiers utilisés :
+      - <name>.bin    : matrice (lignes, dim) de float32/float16/int8, sans en-tête
+      - <name>.scales : échelles float32 par ligne (précision int8 uniquement)
+      - <name>.json   : métadonnées (dim, dtype) et index {user_id: ligne}
+    """
+
+    def __init__(self, db_dir='database', name='embeddings', dtype='float32'):
+        """
+        Initialise le stockage des embeddings.
+
+        Args:
+            db_dir (str): Répertoire de la base de données.
+            name (str, optional): Préfixe des fichiers du stockage.
+            dtype (str, optional): Type des vecteurs sur disque ('float32', 'float16' ou 'int8').
+                None : type du stockage existant (float32 pour un nouveau stockage).
+
+        Raises:
+            ValueError: Stockage existant dans un autre type. L'ouverture ne modifie jamais le
+                format sur disque : la conversion est une migration explicite (convert).
+        """
+        self.data_file = os.path.join(db_dir, f'{name}.bin')
+        self.scales_file = os.path.join(db_dir, f'{name}.scales')
+        self.index_file = os.path.join(db_dir, f'{name}.json')
+        self.lock_path = os.path.join(db_dir, f'{name}.lock')
+        self._lock = threading.RLock()
+        self._mmap = None
+        self._scales_mmap = None
+
+        os.makedirs(db_dir, exist_ok=True)
+
+        self._index_signature = None
+        self._meta = self._load_index()
+        if self._meta is None:
+            self._meta = {'dim': None, 'dtype': dtype or 'float32', 'count': 0, 'rows': {}, 'free': []}
+            self._save_index()
+        self.dtype = np.dtype(self._meta['dtype'])
+        if dtype is not None and self.dtype != np.dtype(dtype):
+            raise ValueError(f"Embeddings de {self.index_file} stockés en {self.dtype.name}, {dtype} demandé "
+                             f"(lancer 'python manage.py convert-precision --precision {dtype}')")
+
+        for file_path in (self.data_file, self.scales_file):
+            if not os.path.exists(file_path):
+                open(file_path, 'wb').close()
+
+    def convert(self, dtype):
+        """
+        Réécrit tous les embeddings dans un nouveau type (migration explicite). Les fichiers
+        sont écrits à côté puis remplacés, l'index en dernier : un autre processus continue
+        de lire l'ancien format jusqu'à ce qu'il recharge l'index.
+
+        Args:
+            dtype (str): Nouveau type ('float32', 'float16' ou 'int8').
+
+        Returns:
+            int: Nombre d'embeddings convertis.
+        """
+        dtype = np.dtype(dtype)
+        with self._write_lock():
+            user_ids, matrix = self.all()
+            data, scales = quantize(matrix, dtype.name)
+            for file_path, content in ((self.data_file, data), (self.scales_file, scales)):
+                tmp_file = file_path + '.tmp'
+                with open(tmp_file, 'wb') as f:
+                    if content is not None and len(user_ids):
+                        f.write(np.ascontiguousarray(content).tobytes())
+                os.replace(tmp_file, file_path)
+
+            self._meta = {'dim': self.dim, 'dtype': dtype.name, 'count': len(user_ids),
+                          'rows': {user_id: row for row, user_id in enumerate(user_ids)}, 'free': []}
+            self.dtype = dtype
+            self._mmap = None
+            self._scales_mmap = None
+            self._save_index()
+            return len(user_ids)
+
+    @contextmanager
+    def _write_lock(self):
+        """
+        Sérialise les écritures entre threads (verrou du stockage) et entre processus
+        (verrou fcntl), puis recharge l'index : l'allocation des lignes part toujours de
+        l'index le plus récent.
+        """
+        with self._lock:
+            with open(self.lock_path, 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    self._refresh()
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load_index(self):
+        """
+        Charge l'index JSON du stockage.
+
+        Returns:
+            dict: Métadonnées ou None si l'index n'existe pas.
+        """
+        if not os.path.exists(self.index_file):
+            return None
+        try:
+            self._index_signature = self._signature()
+            with open(self.index_file, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Erreur lors du chargement de l'index des embeddings: {e}")
+            return None
+
+    def _save_index(self):
+        """
+        Sauvegarde l'index JSON de manière atomique.
+        """
+        tmp_file = self.index_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(self._meta, f)
+        os.replace(tmp_file, self.index_file)
+        self._index_signature = self._signature()
+
+    def _signature(self):
+        """
+        Signature (inode, date de modification, taille) de l'index sur disque.
+        """
+        try:
+            stat = os.stat(self.index_file)
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _refresh(self):
+        """
+        Recharge l'index si un autre processus l'a modifié.
+        """
+        if self._signature() != self._index_signature:
+            meta = self._load_index()
+            if meta is not None:
+                # Le type a pu changer (manage.py convert-precision)
+                self._meta = meta
+                self.dtype = np.dtype(meta['dtype'])
+                self._mmap = None
+                self._scales_mmap = None
+
+    @property
+    def dim(self):
+        return self._meta['dim']
+
+    def __len__(self):
+        return len(self._meta['rows'])
+
+    def __contains__(self, user_id):
+        return user_id in self._meta['rows']
+
+    def _matrix(self):
+        """
+        Retourne la projection mémoire (lecture seule) du fichier binaire.
+        La projection est recréée si le fichier a grandi depuis la dernière ouverture.
+        """
+        count = self._meta['count']
+        if count == 0 or not self.dim:
+            return np.zeros((0, self.dim or 0), dtype=self.dtype)
+
+        if self._mmap is None or self._mmap.shape[0] < count:
+            self._mmap = np.memmap(self.data_file, dtype=self.dtype, mode='r', shape=(count, self.dim))
+        return self._mmap
+
+    def _scales(self):
+        """
+        Retourne la projection mémoire des échelles (None hors précision int8).
+        """
+        count = self._meta['count']
+        if self.dtype != np.int8 or count == 0:
+            return None
+
+        if self._scales_mmap is None or self._scales_mmap.shape[0] < count:
+            self._scales_mmap = np.memmap(self.scales_file, dtype=np.float32, mode='r', shape=(count,))
+        return self._scales_mmap
+
+    def _read(self, rows):
+        """
+        Lit et déquantifie des lignes du stockage.
+
+        Returns:
+            numpy.ndarray: Matrice (len(rows), dim) float32.
+        """
+        scales = self._scales()
+        return dequantize(self._matrix()[rows], None if scales is None else scales[rows])
+
+    def put(self, user_id, embedding):
+        """
+        Écrit (ou remplace) l'embedding d'un utilisateur.
+
+        Args:
+            user_id (str): Identifiant de l'utilisateur.
+            embedding (numpy.ndarray): Vecteur d'embedding facial.
+
+        Returns:
+            bool: True si l'écriture a réussi, False sinon.
+        """
+        return self.put_many([user_id], np.ravel(embedding)[np.newaxis, :])
+
+    def put_many(self, user_ids, embeddings):
+        """
+        Écrit plusieurs embeddings et ne sauvegarde l'index qu'une seule fois.
+
+        Args:
+            user_ids (list): Identifiants des utilisateurs.
+            embeddings (numpy.ndarray): Matrice (N, dim) des embeddings.
+
+        Returns:
+            bool: True si l'écriture a réussi, False sinon.
+        """
+        user_ids = list(user_ids)
+        if not user_ids:
+            return True
+
+        with self._write_lock():
+            # Quantifier dans le type courant (un autre processus a pu le convertir)
+            matrix, scales = quantize(np.asarray(embeddings).reshape(len(user_ids), -1), self.dtype.name)
+            if self.dim is None:
+                self._meta['dim'] = int(matrix.shape[1])
+            elif matrix.shape[1] != self.dim:
+                print(f"Dimension d'embedding invalide: {matrix.shape[1]} (attendu {self.dim})")
+                return False
+
+            rows = self._meta['rows']
+            row_size = self.dim * self.dtype.itemsize
+            try:
+                with open(self.data_file, 'r+b') as f, open(self.scales_file, 'r+b') as f_scales:
+                    for i, (user_id, vector) in enumerate(zip(user_ids, matrix)):
+                        row = rows.get(user_id)
+                        if row is None:
+                            row = self._meta['free'].pop() if self._meta['free'] else self._meta['count']
+                        f.seek(row * row_size)
+                        f.write(vector.tobytes())
+                        if scales is not None:
+                            f_scales.seek(row * 4)
+                            f_scales.write(scales[i:i + 1].tobytes())
+                        rows[user_id] = row
+                        self._meta['count'] = max(self._meta['count'], row + 1)
+            except Exception as e:
+                print(f"Erreur lors de l'écriture des embeddings: {e}")
+                return False
+
+            self._save_index()
+            return True
+
+    def get(self, user_id):
+        """
+        Lit l'embedding d'un utilisateur.
+
+        Args:
+            user_id (str): Identifiant de l'utilisateur.
+
+        Returns:
+            numpy.ndarray: Copie de l'embedding (float32) ou None si absent.
+        """
+        with self._lock:
+            self._refresh()
+            row = self._meta['rows'].get(user_id)
+            if row is None:
+                return None
+            return self._read([row])[0]
+
+    def delete(self, user_id):
+        """
+        Supprime l'embedding d'un utilisateur ; sa ligne sera réutilisée.
+
+        Args:
+            user_id (str): Identifiant de l'utilisateur.
+
+        Returns:
+            bool: True si l'embedding existait, False sinon.
+        """
+        with self._write_lock():
+            row = self._meta['rows'].pop(user_id, None)
+            if row is None:
+                return False
+            self._meta['free'].append(row)
+            self._save_index()
+            return True
+
+    def all(self):
+        """
+        Lit tous les embeddings en une seule opération.
+
+        Returns:
+            tuple: (user_ids, matrice (N, dim) float32).
+        """
+        with self._lock:
+            self._refresh()
+            user_ids = list(self._meta['rows'].keys())
+            rows = np.fromiter(self._meta['rows'].values(), dtype=np.int64, count=len(user_ids))
+            matrix = self._read(rows)
+            return user_ids, matrix
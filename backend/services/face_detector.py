@@ -2,45 +2,52 @@
 Service de détection de visage utilisant OpenCV.
 """
 
+import os
 import cv2
 import numpy as np
 
-class FaceDetector:
+# Préréglages de détection : largeur de l'image analysée (None = pleine résolution), paramètres de la
+# cascade, tailles de visage min/max relatives à la largeur de l'image, et affinage du visage principal
+DETECTION_PRESETS = {
+    'accurate': {'detection_width': None, 'scale_factor': 1.1, 'min_neighbors': 5,
+                 'min_face': None, 'max_face': None, 'refine': False},
+    'balanced': {'detection_width': 480, 'scale_factor': 1.1, 'min_neighbors': 5,
+                 'min_face': 0.08, 'max_face': None, 'refine': False},
+    'fast': {'detection_width': 320, 'scale_factor': 1.15, 'min_neighbors': 4,
+             'min_face': 0.12, 'max_face': None, 'refine': True},
+    'kiosk': {'detection_width': 240, 'scale_factor': 1.2, 'min_neighbors': 3,
+              'min_face': 0.2, 'max_face': 0.9, 'refine': True},
+}
+
+class BaseFaceDetector:
     """
-    Classe pour la détection de visages dans les images.
-    Utilise les cascades de Haar d'OpenCV pour la détection.
+    Base commune des détecteurs de visages : détection par lots, extraction et
+    prétraitement du visage. Les sous-classes fournissent detect ou detect_batch.
     """
     
-    def __init__(self):
+    def __init__(self, preset):
         """
-        Initialise le détecteur de visage avec le classificateur en cascade de Haar.
+        Args:
+            preset (str): Nom du préréglage (ou de la famille de détecteurs).
         """
-        # Charger le classificateur en cascade pré-entraîné pour la détection de visage
-        self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        
-    def detect(self, image):
+        self.preset = preset
+    
+    def detect(self, image, min_size=None, max_size=None):
+        raise NotImplementedError
+    
+    def detect_batch(self, images, min_size=None, max_size=None):
         """
-        Détecte les visages dans une image.
+        Détecte les visages de plusieurs images (une détection par image par défaut).
         
         Args:
-            image (numpy.ndarray): Image à analyser (format BGR d'OpenCV).
+            images (list): Images à analyser.
+            min_size (tuple, optional): Taille minimale des visages recherchés.
+            max_size (tuple, optional): Taille maximale des visages recherchés.
             
         Returns:
-            list: Liste des coordonnées des visages détectés [(x, y, w, h), ...].
+            list: Pour chaque image, la liste des coordonnées des visages détectés.
         """
-        # Convertir l'image en niveaux de gris
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        
-        # Détecter les visages
-        faces = self.face_cascade.detectMultiScale(
-            gray,
-            scaleFactor=1.1,
-            minNeighbors=5,
-            minSize=(30, 30),
-            flags=cv2.CASCADE_SCALE_IMAGE
-        )
-        
-        return faces
+        return [self.detect(image, min_size=min_size, max_size=max_size) for image in images]
     
     def extract_face(self, image, face_coords):
         """
@@ -81,3 +88,146 @@ class FaceDetector:
         face_normalized = face_gray / 255.0
         
         return face_normalized
+
+class FaceDetector(BaseFaceDetector):
+    """
+    Classe pour la détection de visages dans les images.
+    Utilise les cascades de Haar d'OpenCV pour la détection, éventuellement sur une
+    image réduite dont les rectangles sont ramenés aux coordonnées d'origine.
+    """
+    
+    def __init__(self, preset='accurate', **options):
+        """
+        Initialise le détecteur de visage avec le classificateur en cascade de Haar.
+        
+        Args:
+            preset (str, optional): Préréglage de DETECTION_PRESETS ('accurate' : pleine résolution).
+            **options: Paramètres remplaçant ceux du préréglage (detection_width, scale_factor,
+                min_neighbors, min_face, max_face, refine).
+        """
+        if preset not in DETECTION_PRESETS:
+            raise ValueError(f"Préréglage de détection inconnu: {preset}")
+        settings = dict(DETECTION_PRESETS[preset], **options)
+        super().__init__(preset)
+        
+        self.detection_width = settings['detection_width']
+        self.scale_factor = settings['scale_factor']
+        self.min_neighbors = settings['min_neighbors']
+        self.min_face = settings['min_face']
+        self.max_face = settings['max_face']
+        self.refine = settings['refine']
+        
+        # Charger le classificateur en cascade pré-entraîné pour la détection de visage
+        self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        
+    def detect(self, image, min_size=None, max_size=None):
+        """
+        Détecte les visages dans une image.
+        
+        Args:
+            image (numpy.ndarray): Image à analyser (format BGR d'OpenCV, ou niveaux de gris).
+            min_size (tuple, optional): Taille minimale des visages recherchés, en pixels de l'image
+                (par défaut min_face x largeur, ou 30 x 30).
+            max_size (tuple, optional): Taille maximale des visages recherchés (par défaut max_face x largeur).
+            
+        Returns:
+            list: Liste des coordonnées des visages détectés [(x, y, w, h), ...].
+        """
+        # Convertir l'image en niveaux de gris si ce n'est pas déjà fait
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) == 3 else image
+        width = gray.shape[1]
+        
+        if min_size is None:
+            side = int(self.min_face * width) if self.min_face else 30
+            min_size = (side, side)
+        if max_size is None and self.max_face:
+            side = int(self.max_face * width)
+            max_size = (side, side)
+        
+        # Réduire l'image analysée ; les tailles de visage sont réduites dans la même proportion
+        scale = 1.0
+        if self.detection_width and width > self.detection_width:
+            scale = self.detection_width / width
+            gray_small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        else:
+            gray_small = gray
+        
+        # Détecter les visages
+        faces = self.face_cascade.detectMultiScale(
+            gray_small,
+            scaleFactor=self.scale_factor,
+            minNeighbors=self.min_neighbors,
+            minSize=tuple(int(v * scale) for v in min_size),
+            maxSize=tuple(int(v * scale) for v in max_size) if max_size else (0, 0),
+            flags=cv2.CASCADE_SCALE_IMAGE
+        )
+        
+        if scale == 1.0 or len(faces) == 0:
+            return faces
+        
+        # Ramener les rectangles aux coordonnées de l'image d'origine
+        faces = np.round(np.asarray(faces) / scale).astype(np.int32)
+        if self.refine:
+            largest = int(np.argmax(faces[:, 2] * faces[:, 3]))
+            faces[largest] = self._refine(gray, faces[largest])
+        return faces
+    
+    def _refine(self, gray, face_coords, padding=0.2, scale_range=0.25):
+        """
+        Affine un visage trouvé sur l'image réduite par une seconde passe en pleine résolution,
+        limitée à une région autour du visage et à des tailles proches.
+        
+        Args:
+            gray (numpy.ndarray): Image en niveaux de gris, pleine résolution.
+            face_coords (tuple): Coordonnées approximatives du visage (x, y, w, h).
+            padding (float, optional): Marge autour du visage (fraction de sa taille).
+            scale_range (float, optional): Variation de taille tolérée.
+            
+        Returns:
+            tuple: Coordonnées affinées (ou celles d'origine si la seconde passe échoue).
+        """
+        x, y, w, h = (int(v) for v in face_coords)
+        height, width = gray.shape[:2]
+        x0, y0 = max(0, int(x - padding * w)), max(0, int(y - padding * h))
+        x1, y1 = min(width, int(x + w + padding * w)), min(height, int(y + h + padding * h))
+        
+        size = max(w, h)
+        min_side = int(size * (1 - scale_range))
+        max_side = int(size * (1 + scale_range))
+        faces = self.face_cascade.detectMultiScale(
+            gray[y0:y1, x0:x1],
+            scaleFactor=1.05,
+            minNeighbors=3,
+            minSize=(min_side, min_side),
+            maxSize=(max_side, max_side)
+        )
+        if len(faces) == 0:
+            return face_coords
+        fx, fy, fw, fh = max(faces, key=lambda rect: rect[2] * rect[3])
+        return (fx + x0, fy + y0, fw, fh)
+
+def create_face_detector(backend=None, preset='accurate', **options):
+    """
+    Crée le détecteur de visages configuré.
+    
+    Args:
+        backend (str, optional): 'haar' (cascade de Haar), 'ssd' ou 'yunet' (cv2.dnn).
+            Par défaut, la variable d'environnement DETECTOR_BACKEND ('haar' si absente).
+        preset (str, optional): Préréglage de la cascade de Haar.
+        **options: Paramètres supplémentaires de la cascade de Haar.
+        
+    Returns:
+        FaceDetector: Détecteur de visages.
+    """
+    backend = (backend or os.getenv('DETECTOR_BACKEND', 'haar')).lower()
+    if backend == 'haar':
+        return FaceDetector(preset=preset, **options)
+    
+    from services.dnn_face_detector import SSDFaceDetector, YuNetFaceDetector
+    model_path = os.getenv('DETECTOR_MODEL')
+    confidence = float(os.getenv('DETECTOR_CONFIDENCE', 0.5 if backend == 'ssd' else 0.7))
+    if backend == 'ssd':
+        return SSDFaceDetector(model_path, config_path=os.getenv('DETECTOR_CONFIG'), confidence=confidence)
+    if backend == 'yunet':
+        return YuNetFaceDetector(model_path, score_threshold=confidence)
+    raise ValueError(f"Détecteur inconnu: {backend}")
@@ -2,9 +2,32 @@
 Service de reconnaissance faciale utilisant OpenCV.
 """
 
+import re
 import cv2
 import numpy as np
 import os
+import hashlib
+import threading
+from services.gallery import Gallery, template_key, template_index, reduce_templates, template_centroids, TEMPLATE_SEPARATOR
+from services.ann_index import IVFIndex
+
+def model_space(model_path):
+    """
+    Identifiant d'espace d'embedding d'un modèle : nom du fichier et empreinte de son contenu,
+    pour que les galeries construites avec des extracteurs différents ne soient jamais mélangées.
+    
+    Args:
+        model_path (str): Chemin du modèle.
+        
+    Returns:
+        str: Identifiant (ex. 'dnn_nn4_small2_v1_1a2b3c4d').
+    """
+    digest = hashlib.sha1()
+    with open(model_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    name = re.sub(r'[^a-z0-9]+', '_', os.path.splitext(os.path.basename(model_path))[0].lower()).strip('_')
+    return f"dnn_{name}_{digest.hexdigest()[:8]}"
 
 class FaceRecognizer:
     """
@@ -12,34 +35,83 @@ class FaceRecognizer:
     Utilise OpenCV DNN pour l'extraction de caractéristiques et la comparaison.
     """
     
-    def __init__(self, model_path=None, threshold=0.6):
+    def __init__(self, model_path=None, threshold=0.6, projection=None, precision='float32', gallery=None,
+                 input_size=(96, 96), batch_size=32, num_threads=None, max_templates=1, template_reduction='min'):
         """
         Initialise le reconnaisseur de visage.
         
         Args:
-            model_path (str, optional): Chemin vers le modèle pré-entraîné.
+            model_path (str, optional): Chemin vers le modèle pré-entraîné (Torch .t7, ONNX...).
             threshold (float, optional): Seuil de similarité pour la reconnaissance.
+            projection (PCAProjection, optional): Projection appliquée aux vecteurs bruts.
+            precision (str, optional): Précision de la galerie en mémoire ('float32', 'float16' ou 'int8').
+            gallery (Gallery, optional): Galerie à utiliser (ex. SharedGallery partagée entre processus).
+            input_size (tuple, optional): Taille d'entrée du modèle.
+            batch_size (int, optional): Nombre maximal de visages par inférence.
+            num_threads (int, optional): Nombre de threads d'OpenCV (cv2.setNumThreads).
+            max_templates (int, optional): Nombre maximal de modèles (templates) par utilisateur.
+            template_reduction (str, optional): Comparaison à un utilisateur : 'min' (distance au plus
+                proche de ses modèles, un modèle par ligne de la galerie) ou 'centroid' (distance au
+                centroïde précalculé de ses modèles, une ligne par utilisateur).
         """
+        if template_reduction not in ('min', 'centroid'):
+            raise ValueError(f"Réduction des modèles inconnue: {template_reduction} (attendu 'min' ou 'centroid')")
         self.threshold = threshold
-        self.known_faces = {}  # Dictionnaire {user_id: embedding}
+        self.max_templates = max(1, int(max_templates))
+        self.template_reduction = template_reduction
+        self.projection = projection
+        self.input_size = tuple(input_size)
+        self.batch_size = batch_size
+        # Matrice des embeddings connus
+        self.gallery = gallery if gallery is not None else Gallery(precision=precision)
+        self.index = None  # Index approximatif optionnel (recherche exacte par défaut)
+        self._index_generation = None  # Génération de la galerie couverte par l'index
+        self._index_rebuild = None  # Reconstruction de l'index en arrière-plan
+        self._index_save = None  # Sauvegarde différée de l'index (threading.Timer)
+        self._index_save_path = None
+        self._index_save_lock = threading.Lock()
+        self._model_lock = threading.Lock()  # Un réseau OpenCV n'est pas utilisable par plusieurs threads à la fois
+        
+        if num_threads:
+            cv2.setNumThreads(int(num_threads))
         
         # Utiliser le modèle DNN d'OpenCV pour la reconnaissance faciale
         if model_path and os.path.exists(model_path):
-            self.model = cv2.dnn.readNetFromTorch(model_path)
+            if projection is not None:
+                raise ValueError("La projection PCA ne s'applique qu'aux vecteurs bruts, pas aux embeddings d'un modèle")
+            if model_path.endswith(('.t7', '.net')):
+                self.model = cv2.dnn.readNetFromTorch(model_path)
+            else:
+                self.model = cv2.dnn.readNet(model_path)
+            self.model_id = model_space(model_path)
+            self.embedding_dim = self._embed([np.zeros(self.input_size, dtype=np.float32)]).shape[1]
+            print(f"Modèle d'embedding {self.model_id} chargé ({self.embedding_dim} dimensions)")
         else:
             # Utiliser une approche plus simple basée sur LBPH si le modèle n'est pas disponible
             print("OpenCV face module not available, using simplified recognition approach")
             self.model = None
+            self.model_id = None
+            self.embedding_dim = 100 * 100 if projection is None else projection.dim
     
-    def extract_features(self, face_img):
+    @property
+    def embedding_space(self):
         """
-        Extrait les caractéristiques faciales (embeddings) d'une image de visage.
+        Espace des embeddings produits (identifiant du modèle s'il est chargé, 'pca' si une
+        projection est active, 'raw' sinon).
+        """
+        if self.model is not None:
+            return self.model_id
+        return 'raw' if self.projection is None else 'pca'
+    
+    def extract_raw_features(self, face_img):
+        """
+        Extrait le vecteur brut (pixels normalisés) d'une image de visage.
         
         Args:
             face_img (numpy.ndarray): Image du visage prétraitée.
             
         Returns:
-            numpy.ndarray: Vecteur d'embedding facial.
+            numpy.ndarray: Vecteur brut de dimension 100 x 100.
         """
         # Pour une approche simplifiée, nous utilisons une version normalisée de l'image
         # Dans une implémentation réelle, nous utiliserions un modèle DNN pour extraire les embeddings
@@ -55,6 +127,113 @@ class FaceRecognizer:
         
         return face_vector
     
+    def extract_raw_features_batch(self, face_imgs):
+        """
+        Extrait les vecteurs bruts de plusieurs visages en une seule matrice.
+        
+        Args:
+            face_imgs (list): Images de visages prétraitées.
+            
+        Returns:
+            numpy.ndarray: Matrice (N, 100 x 100) des vecteurs bruts normalisés.
+        """
+        if len(face_imgs) == 0:
+            return np.zeros((0, 100 * 100), dtype=np.float32)
+        
+        # Redimensionner puis empiler toutes les images en une matrice
+        vectors = np.stack([cv2.resize(face_img, (100, 100)).ravel() for face_img in face_imgs])
+        
+        # Normaliser toutes les lignes en une seule opération
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+    
+    def project(self, raw_features):
+        """
+        Applique la projection PCA éventuelle à des vecteurs bruts.
+        
+        Args:
+            raw_features (numpy.ndarray): Vecteur (dim,) ou matrice (N, dim) de vecteurs bruts.
+            
+        Returns:
+            numpy.ndarray: Embeddings projetés et normalisés (inchangés sans projection).
+        """
+        if self.projection is None:
+            return raw_features
+        
+        projected = self.projection.transform(raw_features)
+        norms = np.linalg.norm(projected, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return projected / norms
+    
+    def _embed(self, face_imgs):
+        """
+        Calcule les embeddings du modèle DNN, par lots de `batch_size` visages (cv2.dnn.blobFromImages).
+        
+        Args:
+            face_imgs (list): Images de visages (niveaux de gris [0, 1] prétraités, ou BGR uint8).
+            
+        Returns:
+            numpy.ndarray: Matrice (N, dim) des embeddings normalisés.
+        """
+        images = []
+        for face_img in face_imgs:
+            if face_img.dtype != np.uint8:
+                face_img = np.clip(face_img * 255.0, 0, 255).astype(np.uint8)
+            if len(face_img.shape) == 2:
+                face_img = cv2.cvtColor(face_img, cv2.COLOR_GRAY2BGR)
+            images.append(face_img)
+        
+        outputs = []
+        for start in range(0, len(images), self.batch_size):
+            blob = cv2.dnn.blobFromImages(images[start:start + self.batch_size], 1.0 / 255, self.input_size,
+                                          (0, 0, 0), swapRB=True, crop=False)
+            with self._model_lock:
+                self.model.setInput(blob)
+                outputs.append(self.model.forward().reshape(blob.shape[0], -1))
+        
+        embeddings = np.concatenate(outputs).astype(np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return embeddings / norms
+    
+    def extract_features(self, face_img):
+        """
+        Extrait les caractéristiques faciales (embeddings) d'une image de visage.
+        
+        Args:
+            face_img (numpy.ndarray): Image du visage prétraitée.
+            
+        Returns:
+            numpy.ndarray: Vecteur d'embedding facial.
+        """
+        if self.model is not None:
+            return self._embed([face_img])[0]
+        return self.project(self.extract_raw_features(face_img))
+    
+    def extract_features_batch(self, face_imgs):
+        """
+        Extrait les embeddings de plusieurs visages en une seule matrice.
+        
+        Args:
+            face_imgs (list): Images de visages prétraitées.
+            
+        Returns:
+            numpy.ndarray: Matrice (N, dim) des embeddings normalisés.
+        """
+        if self.model is not None:
+            if len(face_imgs) == 0:
+                return np.zeros((0, self.embedding_dim), dtype=np.float32)
+            return self._embed(face_imgs)
+        return self.project(self.extract_raw_features_batch(face_imgs))
+    
+    @property
+    def known_faces(self):
+        """
+        Vue dictionnaire {user_id: embedding} des visages connus (lecture seule).
+        """
+        return dict(zip(self.gallery.ids, self.gallery.matrix))
+    
     def add_face(self, user_id, face_img):
         """
         Ajoute un visage à la base de données des visages connus.
@@ -71,13 +250,305 @@ class FaceRecognizer:
             embedding = self.extract_features(face_img)
             
             # Stocker l'embedding
-            self.known_faces[user_id] = embedding
+            self.add_embedding(user_id, embedding)
             
             return True
         except Exception as e:
             print(f"Erreur lors de l'ajout du visage: {e}")
             return False
     
+    def add_embedding(self, user_id, embedding):
+        """
+        Ajoute un embedding déjà calculé à la base de données des visages connus.
+        
+        Args:
+            user_id (str): Identifiant de l'utilisateur.
+            embedding (numpy.ndarray): Vecteur d'embedding facial.
+        """
+        in_sync = self._index_in_sync()
+        self.gallery.add(user_id, embedding)
+        
+        # Insertion incrémentale dans l'index approximatif
+        if self.index is not None:
+            if self.index.is_trained and in_sync:
+                self.index.add(user_id, embedding)
+                self._index_generation = self.gallery.generation
+            else:
+                self.rebuild_index()
+    
+    def add_embeddings(self, user_ids, embeddings):
+        """
+        Ajoute plusieurs embeddings déjà calculés en une seule mise à jour de la galerie.
+        
+        Args:
+            user_ids (list): Identifiants des utilisateurs.
+            embeddings (numpy.ndarray): Matrice (N, dim) des embeddings.
+        """
+        in_sync = self._index_in_sync()
+        self.gallery.add_many(user_ids, embeddings)
+        
+        # Insertion incrémentale dans l'index approximatif
+        if self.index is not None:
+            if self.index.is_trained and in_sync:
+                self.index.add_many(user_ids, np.asarray(embeddings).reshape(len(user_ids), -1))
+                self._index_generation = self.gallery.generation
+            else:
+                self.rebuild_index()
+    
+    def set_templates(self, user_id, templates):
+        """
+        Remplace les modèles d'un utilisateur (au plus max_templates, le premier étant le principal).
+        
+        Args:
+            user_id (str): Identifiant de l'utilisateur.
+            templates (numpy.ndarray): Matrice (T, dim) des embeddings de ses modèles.
+        """
+        templates = np.asarray(templates, dtype=np.float32).reshape(len(templates), -1)[:self.max_templates]
+        if self.template_reduction == 'centroid':
+            keys, matrix = template_centroids([user_id] * len(templates), templates)
+        else:
+            keys, matrix = [template_key(user_id, i) for i in range(len(templates))], templates
+        
+        # Modèles devenus surnuméraires (les clés d'un utilisateur sont contiguës)
+        stale = []
+        while template_key(user_id, len(keys) + len(stale)) in self.gallery:
+            stale.append(template_key(user_id, len(keys) + len(stale)))
+        
+        in_sync = self._index_in_sync()
+        self.gallery.add_many(keys, matrix)
+        for key in stale:
+            self.gallery.remove(key)
+        
+        if self.index is not None:
+            if self.index.is_trained and in_sync:
+                self.index.add_many(keys, matrix)
+                for key in stale:
+                    self.index.remove(key)
+                self._index_generation = self.gallery.generation
+            else:
+                self.rebuild_index()
+    
+    def load_embeddings(self, user_ids, embeddings):
+        """
+        Remplace l'ensemble des visages connus en une seule opération.
+        
+        Args:
+            user_ids (list): Clés des modèles (identifiant de l'utilisateur ou "<user_id>#<n>").
+            embeddings (numpy.ndarray): Matrice (N, dim) des embeddings.
+        """
+        user_ids = list(user_ids)
+        if any(TEMPLATE_SEPARATOR in key for key in user_ids):
+            embeddings = np.asarray(embeddings).reshape(len(user_ids), -1)
+            if self.template_reduction == 'centroid':
+                user_ids, embeddings = template_centroids(user_ids, embeddings)
+            else:
+                # Ignorer les modèles au-delà de max_templates
+                keep = [i for i, key in enumerate(user_ids) if template_index(key) < self.max_templates]
+                user_ids, embeddings = [user_ids[i] for i in keep], embeddings[keep]
+        self.gallery.load(user_ids, embeddings)
+        
+        # L'index doit être reconstruit sur la nouvelle galerie
+        if self.index is not None:
+            self.rebuild_index()
+    
+    def remove_face(self, user_id):
+        """
+        Supprime un visage (tous les modèles d'un utilisateur) de la base de données des visages connus.
+        
+        Args:
+            user_id (str): Identifiant de l'utilisateur.
+            
+        Returns:
+            bool: True si le visage était présent, False sinon.
+        """
+        in_sync = self._index_in_sync()
+        removed = self.gallery.remove(user_id)
+        keys = [user_id]
+        while self.gallery.remove(template_key(user_id, len(keys))):
+            keys.append(template_key(user_id, len(keys)))
+        if self.index is not None:
+            for key in keys:
+                self.index.remove(key)
+            if in_sync:
+                self._index_generation = self.gallery.generation
+        return removed
+    
+    def enable_index(self, n_lists=None, n_probe=8, index_path=None):
+        """
+        Active la recherche approximative (IVF) à la place de la recherche exacte.
+        
+        Args:
+            n_lists (int, optional): Nombre de listes de l'index (√N par défaut).
+            n_probe (int, optional): Nombre de listes explorées par recherche.
+            index_path (str, optional): Index sauvegardé à recharger s'il correspond à la galerie
+                (même espace d'embedding, même dimension, même empreinte de projection et de contenu).
+        
+        Returns:
+            bool: True si l'index sauvegardé a été rechargé, False s'il a été reconstruit.
+        """
+        index = None
+        if index_path and os.path.exists(index_path):
+            try:
+                index = IVFIndex.load(index_path)
+            except Exception as e:
+                # Fichier tronqué ou corrompu : reconstruire plutôt que d'empêcher le démarrage
+                print(f"Index sauvegardé illisible ({index_path}: {e}), reconstruction")
+        if index is not None:
+            index.n_probe = n_probe
+            if index.space == self.embedding_space and index.dim == self.gallery.dim \
+                    and index.fingerprint == self.index_fingerprint() \
+                    and set(index.keys()) == set(self.gallery.ids):
+                self.index = index
+                self._index_generation = self.gallery.generation
+                return True
+            print("Index sauvegardé obsolète, reconstruction")
+        
+        self.index = IVFIndex(n_lists=n_lists, n_probe=n_probe)
+        self.rebuild_index()
+        return False
+    
+    def disable_index(self):
+        """
+        Revient à la recherche exacte.
+        """
+        self.index = None
+    
+    def rebuild_index(self):
+        """
+        Ré-entraîne l'index approximatif sur l'ensemble de la galerie.
+        """
+        index = self.index
+        if index is None:
+            return
+        # Identifiants et vecteurs lus ensemble : une suppression (éventuellement dans un autre
+        # processus avec une galerie partagée) déplace la dernière ligne
+        generation, ids, matrix = self.gallery.snapshot()
+        if len(ids) == 0:
+            # Index non entraîné : recherche exacte jusqu'au prochain ré-entraînement
+            index.centroids = None
+        else:
+            index.train(ids, matrix)
+        self._index_generation = generation
+    
+    def _index_in_sync(self):
+        """
+        Indique si l'index couvre la génération courante de la galerie.
+        Avec une galerie partagée, un autre processus peut l'avoir modifiée.
+        """
+        return self._index_generation == self.gallery.generation
+    
+    def _schedule_index_rebuild(self):
+        """
+        Lance (au plus une fois à la fois) la reconstruction de l'index en arrière-plan.
+        """
+        if self._index_rebuild is not None and self._index_rebuild.is_alive():
+            return
+        self._index_rebuild = threading.Thread(target=self.rebuild_index, daemon=True)
+        self._index_rebuild.start()
+    
+    def index_fingerprint(self):
+        """
+        Empreinte à laquelle un index sauvegardé doit correspondre : projection PCA éventuelle
+        (un ré-ajustement à dimension égale change l'espace) et contenu de la galerie.
+        
+        Returns:
+            str: Empreinte hexadécimale.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(self.embedding_space.encode('utf-8'))
+        if self.projection is not None:
+            digest.update(self.projection.fingerprint().encode('ascii'))
+        digest.update(self.gallery.digest().encode('ascii'))
+        return digest.hexdigest()
+    
+    def save_index(self, index_path):
+        """
+        Sauvegarde l'index approximatif (s'il est actif, entraîné et à jour de la galerie).
+        
+        Args:
+            index_path (str): Chemin du fichier .npz.
+        """
+        if self.index is not None and self.index.is_trained and self._index_in_sync():
+            self.index.space = self.embedding_space
+            self.index.fingerprint = self.index_fingerprint()
+            self.index.save(index_path)
+    
+    def schedule_index_save(self, index_path, delay=10.0):
+        """
+        Programme la sauvegarde de l'index hors du chemin des requêtes : les modifications
+        survenues pendant `delay` secondes sont sauvegardées ensemble, en une seule écriture.
+        
+        Args:
+            index_path (str): Chemin du fichier .npz.
+            delay (float, optional): Délai avant la sauvegarde, en secondes.
+        """
+        if self.index is None:
+            return
+        with self._index_save_lock:
+            self._index_save_path = index_path
+            if self._index_save is None:
+                self._index_save = threading.Timer(delay, self.flush_index_save)
+                self._index_save.daemon = True
+                self._index_save.start()
+    
+    def flush_index_save(self):
+        """
+        Effectue immédiatement la sauvegarde programmée, s'il y en a une (ex. à l'arrêt du processus).
+        """
+        with self._index_save_lock:
+            if self._index_save is not None:
+                self._index_save.cancel()
+            index_path, self._index_save, self._index_save_path = self._index_save_path, None, None
+        if index_path:
+            try:
+                self.save_index(index_path)
+            except OSError as e:
+                print(f"Erreur lors de la sauvegarde de l'index: {e}")
+    
+    def _confidence(self, distance):
+        """
+        Convertit une distance en score de confiance (0-100%).
+        """
+        return max(0, min(100, 100 * (1 - distance / self.threshold)))
+    
+    def match(self, embedding, top_k=1):
+        """
+        Compare un embedding à tous les visages connus en un seul produit matrice-vecteur.
+        
+        Args:
+            embedding (numpy.ndarray): Vecteur d'embedding de la sonde.
+            top_k (int, optional): Nombre de candidats à retourner.
+            
+        Returns:
+            list: Liste [(user_id, distance), ...] triée par distance croissante.
+        """
+        return self.match_batch(np.ravel(embedding)[np.newaxis, :], top_k=top_k)[0]
+    
+    def match_batch(self, embeddings, top_k=1):
+        """
+        Compare plusieurs embeddings aux visages connus (index approximatif s'il est actif).
+        Avec plusieurs modèles par utilisateur, la recherche retourne les top_k x max_templates
+        modèles les plus proches, réduits à la distance minimale par utilisateur.
+        
+        Args:
+            embeddings (numpy.ndarray): Matrice (M, dim) des sondes.
+            top_k (int, optional): Nombre de candidats (utilisateurs distincts) par sonde.
+            
+        Returns:
+            list: Pour chaque sonde, une liste [(user_id, distance), ...].
+        """
+        k = top_k * (self.max_templates if self.template_reduction == 'min' else 1)
+        results = None
+        if self.index is not None and self.index.is_trained:
+            if self._index_in_sync():
+                results = self.index.search_batch(embeddings, self.gallery, k=k)
+            else:
+                # Galerie modifiée ailleurs : recherche exacte le temps de reconstruire l'index
+                self._schedule_index_rebuild()
+        if results is None:
+            results = self.gallery.search_batch(embeddings, k=k)
+        return [reduce_templates(candidates, top_k) for candidates in results]
+    
     def recognize(self, face_img):
         """
         Reconnaît un visage en le comparant aux visages connus.
@@ -91,23 +562,34 @@ class FaceRecognizer:
         # Extraire les caractéristiques du visage
         embedding = self.extract_features(face_img)
         
-        best_match = None
-        best_distance = float('inf')
-        
         # Comparer avec tous les visages connus
-        for user_id, known_embedding in self.known_faces.items():
-            # Calculer la distance euclidienne
-            distance = np.linalg.norm(embedding - known_embedding)
-            
-            # Mettre à jour le meilleur match si la distance est plus petite
-            if distance < best_distance:
-                best_distance = distance
-                best_match = user_id
+        candidates = self.match(embedding, top_k=1)
         
         # Vérifier si la distance est inférieure au seuil
-        if best_match and best_distance < self.threshold:
-            # Convertir la distance en score de confiance (0-100%)
-            confidence = max(0, min(100, 100 * (1 - best_distance / self.threshold)))
-            return best_match, confidence
+        if candidates and candidates[0][1] < self.threshold:
+            best_match, best_distance = candidates[0]
+            return best_match, self._confidence(best_distance)
         
         return None, None
+    
+    def recognize_batch(self, face_imgs):
+        """
+        Reconnaît plusieurs visages avec une seule comparaison matricielle contre la galerie.
+        
+        Args:
+            face_imgs (list): Images de visages prétraitées.
+            
+        Returns:
+            list: Liste de tuples (user_id, confidence), (None, None) pour les visages non reconnus.
+        """
+        embeddings = self.extract_features_batch(face_imgs)
+        
+        results = []
+        for candidates in self.match_batch(embeddings, top_k=1):
+            if candidates and candidates[0][1] < self.threshold:
+                user_id, distance = candidates[0]
+                results.append((user_id, self._confidence(distance)))
+            else:
+                results.append((None, None))
+        
+        return results
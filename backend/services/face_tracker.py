@@ -0,0 +1,108 @@
+"""
+Suivi de visage entre images successives pour le système d'authentification faciale.
+Une fois un visage trouvé, la détection est limitée à une région élargie autour de sa
+position précédente ; une détection sur l'image entière est refaite périodiquement ou en cas de perte.
+"""
+
+class FaceTracker:
+    """
+    Classe pour le suivi d'un visage (le plus grand) dans un flux d'images.
+    """
+
+    def __init__(self, detector, padding=0.5, redetect_interval=10, stable_iou=0.6, scale_range=0.5):
+        """
+        Initialise le suivi.
+
+        Args:
+            detector (FaceDetector): Détecteur utilisé sur l'image entière ou la région de recherche.
+            padding (float, optional): Marge ajoutée de chaque côté du visage précédent (en fraction de sa taille).
+            redetect_interval (int, optional): Nombre d'images entre deux détections sur l'image entière.
+            stable_iou (float, optional): Recouvrement minimal (IoU) pour considérer le visage comme stable.
+            scale_range (float, optional): Variation de taille tolérée d'une image à l'autre.
+        """
+        self.detector = detector
+        self.padding = padding
+        self.redetect_interval = redetect_interval
+        self.stable_iou = stable_iou
+        self.scale_range = scale_range
+        self.box = None  # Dernière position (x, y, w, h) du visage suivi
+        self._since_full = 0
+        self.full_detections = 0
+        self.roi_detections = 0
+
+    def reset(self):
+        """
+        Oublie le visage suivi (la prochaine image est analysée entièrement).
+        """
+        self.box = None
+
+    @staticmethod
+    def iou(a, b):
+        """
+        Calcule le recouvrement (intersection sur union) de deux rectangles (x, y, w, h).
+        """
+        ax, ay, aw, ah = a
+        bx, by, bw, bh = b
+        inter_w = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+        inter_h = max(0, min(ay + ah, by + bh) - max(ay, by))
+        inter = inter_w * inter_h
+        union = aw * ah + bw * bh - inter
+        return inter / union if union else 0.0
+
+    def _detect_full(self, image):
+        self.full_detections += 1
+        self._since_full = 0
+        faces = self.detector.detect(image)
+        if len(faces) == 0:
+            return None
+        return tuple(int(v) for v in max(faces, key=lambda rect: rect[2] * rect[3]))
+
+    def _detect_roi(self, image):
+        """
+        Recherche le visage dans une région élargie autour de la position précédente,
+        en limitant les tailles testées autour de la taille précédente.
+        """
+        self.roi_detections += 1
+        x, y, w, h = self.box
+        height, width = image.shape[:2]
+        x0 = max(0, int(x - self.padding * w))
+        y0 = max(0, int(y - self.padding * h))
+        x1 = min(width, int(x + w + self.padding * w))
+        y1 = min(height, int(y + h + self.padding * h))
+
+        size = max(w, h)
+        min_side = max(30, int(size * (1 - self.scale_range)))
+        max_side = int(size * (1 + self.scale_range))
+        faces = self.detector.detect(image[y0:y1, x0:x1], min_size=(min_side, min_side), max_size=(max_side, max_side))
+        if len(faces) == 0:
+            return None
+        fx, fy, fw, fh = max(faces, key=lambda rect: rect[2] * rect[3])
+        return (int(fx) + x0, int(fy) + y0, int(fw), int(fh))
+
+    def update(self, image):
+        """
+        Localise le visage dans une nouvelle image.
+
+        Args:
+            image (numpy.ndarray): Image du flux (BGR ou niveaux de gris).
+
+        Returns:
+            tuple: (coordonnées (x, y, w, h) ou None, True si le visage est suivi de manière stable
+                   depuis l'image précédente et que son identité peut être réutilisée).
+        """
+        previous = self.box
+        box = None
+        tracked = False
+
+        if previous is not None and self._since_full < self.redetect_interval:
+            box = self._detect_roi(image)
+            tracked = box is not None
+        if box is None:
+            # Détection périodique, ou visage perdu : analyser l'image entière
+            box = self._detect_full(image)
+        else:
+            self._since_full += 1
+
+        self.box = box
+        stable = tracked and self.iou(previous, box) >= self.stable_iou
+        return box, stable
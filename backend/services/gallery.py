@@ -0,0 +1,464 @@
+"""
+Galerie d'embeddings faciaux pour le système d'authentification faciale.
+Stocke tous les embeddings connus dans une matrice contiguë pour une comparaison vectorisée.
+"""
+
+import hashlib
+import threading
+import numpy as np
+from utils.quantization import quantize, dequantize
+
+# Un utilisateur peut avoir plusieurs modèles (templates) : le premier est rangé sous son
+# identifiant, les suivants sous "<user_id>#<n>" (dans la galerie comme dans la base)
+TEMPLATE_SEPARATOR = '#'
+
+def template_key(user_id, index):
+    """
+    Clé du modèle n° index d'un utilisateur (son identifiant pour le premier modèle).
+    """
+    return user_id if index == 0 else f"{user_id}{TEMPLATE_SEPARATOR}{index}"
+
+def template_owner(key):
+    """
+    Identifiant de l'utilisateur auquel appartient une clé de modèle.
+    """
+    return key.split(TEMPLATE_SEPARATOR, 1)[0]
+
+def template_index(key):
+    """
+    Numéro du modèle désigné par une clé (0 pour le modèle principal).
+    """
+    _, _, index = key.partition(TEMPLATE_SEPARATOR)
+    return int(index) if index else 0
+
+def reduce_templates(candidates, k):
+    """
+    Réduit des candidats par modèle en candidats par utilisateur : distance minimale
+    parmi ses modèles (les candidats sont triés par distance croissante).
+
+    Args:
+        candidates (list): Liste [(clé de modèle, distance), ...] triée.
+        k (int): Nombre d'utilisateurs à retourner.
+
+    Returns:
+        list: Liste [(user_id, distance), ...] d'utilisateurs distincts.
+    """
+    results, seen = [], set()
+    for key, distance in candidates:
+        user_id = template_owner(key)
+        if user_id not in seen:
+            seen.add(user_id)
+            results.append((user_id, distance))
+            if len(results) == k:
+                break
+    return results
+
+def template_centroids(keys, embeddings):
+    """
+    Calcule le centroïde (moyenne normalisée des modèles normalisés) de chaque utilisateur.
+
+    Args:
+        keys (list): Clés des modèles.
+        embeddings (numpy.ndarray): Matrice (N, dim) des modèles.
+
+    Returns:
+        tuple: (user_ids, matrice (U, dim) des centroïdes normalisés).
+    """
+    matrix = Gallery._normalize(np.asarray(embeddings).reshape(len(keys), -1))
+    user_ids, owners = np.unique(np.array([template_owner(key) for key in keys], dtype=object), return_inverse=True)
+    centroids = np.zeros((len(user_ids), matrix.shape[1]), dtype=np.float32)
+    np.add.at(centroids, owners, matrix)
+    return list(user_ids), Gallery._normalize(centroids)
+
+class Gallery:
+    """
+    Classe représentant la galerie des visages connus.
+    Les embeddings sont normalisés et stockés dans une matrice contiguë
+    (une ligne par utilisateur), avec un tableau parallèle des identifiants.
+    La matrice peut être conservée en float32, float16 ou int8 (échelle par ligne) ;
+    les distances sont alors calculées par blocs convertis en float32.
+    """
+
+    def __init__(self, dim=None, initial_capacity=64, precision='float32', block_size=4096):
+        """
+        Initialise une galerie vide.
+
+        Args:
+            dim (int, optional): Dimension des embeddings (déduite au premier ajout sinon).
+            initial_capacity (int, optional): Nombre de lignes pré-allouées.
+            precision (str, optional): Précision de stockage ('float32', 'float16' ou 'int8').
+            block_size (int, optional): Nombre de lignes converties à la fois lors d'une recherche.
+        """
+        self.dim = dim
+        self.precision = precision
+        self.block_size = block_size
+        self._dtype = np.dtype(precision)
+        self._capacity = max(1, int(initial_capacity))
+        self._count = 0
+        self._matrix = np.zeros((self._capacity, dim), dtype=self._dtype) if dim else None
+        self._scales = np.ones(self._capacity, dtype=np.float32) if precision == 'int8' else None
+        self._ids = np.empty(self._capacity, dtype=object)
+        self._rows = {}  # Dictionnaire {user_id: indice de ligne}
+        self._lock = threading.RLock()
+        self.generation = 0  # Incrémenté à chaque modification
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, user_id):
+        return user_id in self._rows
+
+    @property
+    def ids(self):
+        """
+        Identifiants des utilisateurs, dans l'ordre des lignes de la matrice.
+        """
+        return self._ids[:self._count]
+
+    @property
+    def matrix(self):
+        """
+        Matrice (N, dim) des embeddings normalisés, en float32.
+        """
+        if self._matrix is None:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        if self.precision == 'float32':
+            return self._matrix[:self._count]
+        return dequantize(self._matrix[:self._count], self._row_scales(0, self._count))
+
+    @property
+    def nbytes(self):
+        """
+        Mémoire occupée par les embeddings (et leurs échelles).
+        """
+        if self._matrix is None:
+            return 0
+        scales = self._count * 4 if self._scales is not None else 0
+        return self._count * self.dim * self._dtype.itemsize + scales
+
+    def snapshot(self):
+        """
+        Copie cohérente des identifiants et de la matrice, lus ensemble sous le verrou
+        (une suppression intermédiaire déplace la dernière ligne).
+
+        Returns:
+            tuple: (génération, identifiants, matrice (N, dim) en float32).
+        """
+        with self._lock:
+            return self.generation, self.ids.copy(), np.array(self.matrix, dtype=np.float32)
+
+    def digest(self):
+        """
+        Empreinte du contenu (identifiants et lignes stockées, indépendante de l'ordre des
+        lignes), pour vérifier qu'un index sauvegardé a été construit sur cette galerie.
+
+        Returns:
+            str: Empreinte hexadécimale.
+        """
+        with self._lock:
+            ids = self._ids[:self._count]
+            order = np.argsort(ids.astype(str), kind='stable') if self._count else np.zeros(0, dtype=int)
+            digest = hashlib.blake2b(digest_size=16)
+            digest.update(self.precision.encode('ascii'))
+            digest.update('\0'.join(ids[order]).encode('utf-8'))
+            if self._matrix is not None:
+                digest.update(np.ascontiguousarray(self._matrix[order]).tobytes())
+            if self._scales is not None:
+                digest.update(np.ascontiguousarray(self._scales[order]).tobytes())
+            return digest.hexdigest()
+
+    def _row_scales(self, start, stop):
+        return None if self._scales is None else self._scales[start:stop]
+
+    @staticmethod
+    def _normalize(vectors):
+        """
+        Normalise des vecteurs (ou une matrice ligne par ligne) en float32.
+
+        Args:
+            vectors (numpy.ndarray): Vecteur (dim,) ou matrice (N, dim).
+
+        Returns:
+            numpy.ndarray: Vecteurs de norme unitaire.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _reserve(self, capacity):
+        """
+        Agrandit la matrice pour contenir au moins `capacity` lignes.
+        """
+        if self._matrix is not None and capacity <= self._capacity:
+            return
+
+        new_capacity = self._capacity
+        while new_capacity < capacity:
+            new_capacity *= 2
+
+        matrix = np.zeros((new_capacity, self.dim), dtype=self._dtype)
+        ids = np.empty(new_capacity, dtype=object)
+        if self._matrix is not None:
+            matrix[:self._count] = self._matrix[:self._count]
+        ids[:self._count] = self._ids[:self._count]
+        if self._scales is not None:
+            scales = np.ones(new_capacity, dtype=np.float32)
+            scales[:self._count] = self._scales[:self._count]
+            self._scales = scales
+
+        self._matrix = matrix
+        self._ids = ids
+        self._capacity = new_capacity
+
+    def _write_row(self, row, vector):
+        """
+        Écrit un vecteur normalisé dans la matrice, dans la précision de la galerie.
+        """
+        data, scale = quantize(vector, self.precision)
+        self._matrix[row] = data
+        if self._scales is not None:
+            self._scales[row] = scale
+
+    def add(self, user_id, embedding):
+        """
+        Ajoute ou remplace l'embedding d'un utilisateur.
+
+        Args:
+            user_id (str): Identifiant de l'utilisateur.
+            embedding (numpy.ndarray): Vecteur d'embedding facial.
+        """
+        vector = self._normalize(np.ravel(embedding))
+
+        with self._lock:
+            if self.dim is None:
+                self.dim = vector.shape[0]
+            elif vector.shape[0] != self.dim:
+                raise ValueError(f"Dimension d'embedding invalide: {vector.shape[0]} (attendu {self.dim})")
+
+            row = self._rows.get(user_id)
+            if row is None:
+                self._reserve(self._count + 1)
+                row = self._count
+                self._count += 1
+                self._rows[user_id] = row
+                self._ids[row] = user_id
+
+            self._write_row(row, vector)
+            self.generation += 1
+
+    def add_many(self, user_ids, embeddings):
+        """
+        Ajoute ou remplace plusieurs embeddings en une seule opération (une seule réallocation).
+
+        Args:
+            user_ids (list): Identifiants des utilisateurs.
+            embeddings (numpy.ndarray): Matrice (N, dim) des embeddings.
+        """
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+        matrix = self._normalize(np.asarray(embeddings).reshape(len(user_ids), -1))
+
+        with self._lock:
+            if self.dim is None:
+                self.dim = matrix.shape[1]
+            elif matrix.shape[1] != self.dim:
+                raise ValueError(f"Dimension d'embedding invalide: {matrix.shape[1]} (attendu {self.dim})")
+
+            self._reserve(self._count + len(set(user_ids) - set(self._rows)))
+            for user_id, vector in zip(user_ids, matrix):
+                row = self._rows.get(user_id)
+                if row is None:
+                    row = self._count
+                    self._count += 1
+                    self._rows[user_id] = row
+                    self._ids[row] = user_id
+                self._write_row(row, vector)
+            self.generation += 1
+
+    def remove(self, user_id):
+        """
+        Supprime l'embedding d'un utilisateur (la dernière ligne prend sa place).
+
+        Args:
+            user_id (str): Identifiant de l'utilisateur.
+
+        Returns:
+            bool: True si l'utilisateur était présent, False sinon.
+        """
+        with self._lock:
+            row = self._rows.pop(user_id, None)
+            if row is None:
+                return False
+
+            last = self._count - 1
+            if row != last:
+                moved_id = self._ids[last]
+                self._matrix[row] = self._matrix[last]
+                if self._scales is not None:
+                    self._scales[row] = self._scales[last]
+                self._ids[row] = moved_id
+                self._rows[moved_id] = row
+
+            self._ids[last] = None
+            self._count = last
+            self.generation += 1
+            return True
+
+    def get(self, user_id):
+        """
+        Récupère une copie de l'embedding normalisé d'un utilisateur.
+
+        Args:
+            user_id (str): Identifiant de l'utilisateur.
+
+        Returns:
+            numpy.ndarray: Embedding (float32) ou None si l'utilisateur est inconnu.
+        """
+        with self._lock:
+            row = self._rows.get(user_id)
+            if row is None:
+                return None
+            return dequantize(self._matrix[row:row + 1], self._row_scales(row, row + 1))[0]
+
+    def load(self, user_ids, embeddings):
+        """
+        Remplace le contenu de la galerie en une seule opération.
+
+        Args:
+            user_ids (list): Identifiants des utilisateurs.
+            embeddings (numpy.ndarray): Matrice (N, dim) des embeddings.
+        """
+        user_ids = list(user_ids)
+        if user_ids:
+            matrix = self._normalize(np.asarray(embeddings).reshape(len(user_ids), -1))
+        else:
+            matrix = np.zeros((0, self.dim or 0), dtype=np.float32)
+
+        with self._lock:
+            self.dim = matrix.shape[1] if len(user_ids) else self.dim
+            self._count = 0
+            self._rows = {}
+            self._matrix = None
+            self._capacity = max(1, len(user_ids))
+            self._ids = np.empty(self._capacity, dtype=object)
+            self._scales = np.ones(self._capacity, dtype=np.float32) if self.precision == 'int8' else None
+            if self.dim:
+                self._reserve(self._capacity)
+
+            for user_id, vector in zip(user_ids, matrix):
+                row = self._rows.get(user_id)
+                if row is None:
+                    row = self._count
+                    self._count += 1
+                    self._rows[user_id] = row
+                    self._ids[row] = user_id
+                self._write_row(row, vector)
+            self.generation += 1
+
+    def clear(self):
+        """
+        Vide la galerie.
+        """
+        self.load([], np.zeros((0, self.dim or 0), dtype=np.float32))
+
+    def _similarities(self, probes):
+        """
+        Calcule les similarités cosinus sondes x galerie.
+        Hors float32, la matrice est convertie par blocs de `block_size` lignes.
+
+        Args:
+            probes (numpy.ndarray): Matrice (M, dim) de sondes normalisées.
+
+        Returns:
+            numpy.ndarray: Matrice (M, N) des similarités.
+        """
+        stored = self._matrix[:self._count]
+        if self.precision == 'float32':
+            return probes @ stored.T
+
+        similarities = np.empty((probes.shape[0], self._count), dtype=np.float32)
+        for start in range(0, self._count, self.block_size):
+            stop = min(start + self.block_size, self._count)
+            block = stored[start:stop].astype(np.float32)
+            similarities[:, start:stop] = probes @ block.T
+            if self._scales is not None:
+                similarities[:, start:stop] *= self._scales[start:stop]
+        return similarities
+
+    def score(self, candidates, probes):
+        """
+        Calcule les similarités cosinus de chaque sonde avec ses seuls candidats (listes
+        explorées d'un index), à partir des lignes stockées dans la précision de la galerie.
+
+        Args:
+            candidates (list): Pour chaque sonde, liste des identifiants candidats.
+            probes (numpy.ndarray): Matrice (M, dim) des sondes normalisées.
+
+        Returns:
+            list: Pour chaque sonde, (identifiants présents dans la galerie, similarités).
+        """
+        results = []
+        with self._lock:
+            for keys, probe in zip(candidates, probes):
+                keys = [key for key in keys if key in self._rows]
+                if not keys or self._matrix is None:
+                    results.append(([], np.zeros(0, dtype=np.float32)))
+                    continue
+                rows = np.fromiter((self._rows[key] for key in keys), dtype=np.intp, count=len(keys))
+                similarities = self._matrix[rows].astype(np.float32) @ probe
+                if self._scales is not None:
+                    similarities *= self._scales[rows]
+                results.append((keys, similarities))
+        return results
+
+    def search(self, embedding, k=1):
+        """
+        Recherche les k embeddings les plus proches d'une sonde.
+
+        Args:
+            embedding (numpy.ndarray): Vecteur d'embedding de la sonde.
+            k (int, optional): Nombre de voisins à retourner.
+
+        Returns:
+            list: Liste [(user_id, distance), ...] triée par distance croissante.
+        """
+        return self.search_batch(np.ravel(embedding)[np.newaxis, :], k=k)[0]
+
+    def search_batch(self, embeddings, k=1):
+        """
+        Recherche les k plus proches voisins de plusieurs sondes en un seul produit matriciel.
+
+        Args:
+            embeddings (numpy.ndarray): Matrice (M, dim) des sondes.
+            k (int, optional): Nombre de voisins par sonde.
+
+        Returns:
+            list: Pour chaque sonde, une liste [(user_id, distance), ...].
+        """
+        probes = self._normalize(np.atleast_2d(embeddings))
+
+        with self._lock:
+            if self._count == 0:
+                return [[] for _ in range(probes.shape[0])]
+
+            # Pour des vecteurs unitaires : ||a - b||² = 2 - 2 a·b
+            similarities = self._similarities(probes)
+            ids = self.ids.copy()
+
+        k = min(k, similarities.shape[1])
+        if k == 1:
+            top = np.argmax(similarities, axis=1)[:, np.newaxis]
+        else:
+            top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+            order = np.argsort(-np.take_along_axis(similarities, top, axis=1), axis=1)
+            top = np.take_along_axis(top, order, axis=1)
+
+        best = np.take_along_axis(similarities, top, axis=1)
+        distances = np.sqrt(np.maximum(0.0, 2.0 - 2.0 * best))
+
+        return [
+            [(ids[j], float(d)) for j, d in zip(row_idx, row_dist)]
+            for row_idx, row_dist in zip(top, distances)
+        ]
@@ -0,0 +1,285 @@
+"""
+Exécution des traitements d'inférence (décodage, détection, reconnaissance, encodage) pour le
+système d'authentification faciale, hors des threads de requête du serveur WSGI.
+Le nombre de traitements en cours est borné : au-delà, les requêtes sont refusées immédiatement
+plutôt que mises en attente indéfiniment.
+"""
+
+import time
+import asyncio
+import threading
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import cv2
+
+class ExecutorSaturated(RuntimeError):
+    """
+    Levée quand l'exécuteur ne peut pas accepter ou terminer un traitement à temps (réponse 503).
+    """
+
+class StageTimings:
+    """
+    Durées des étapes d'une requête, en millisecondes.
+    """
+
+    def __init__(self):
+        self.durations = {}
+
+    def add(self, stage, duration_ms):
+        self.durations[stage] = self.durations.get(stage, 0.0) + duration_ms
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Mesure la durée d'un bloc.
+
+        Args:
+            name (str): Nom de l'étape (ex. 'decode', 'detect').
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - start) * 1000)
+
+    def server_timing(self):
+        """
+        Returns:
+            str: Valeur de l'en-tête HTTP Server-Timing (ex. "queue;dur=0.1, detect;dur=21.3").
+        """
+        return ', '.join(f"{name};dur={duration:.1f}" for name, duration in self.durations.items())
+
+class InferenceExecutor:
+    """
+    Classe représentant un pool borné de threads d'inférence.
+    OpenCV et NumPy libèrent le GIL pendant les calculs : des threads suffisent et partagent
+    la galerie et les modèles déjà chargés, sans copie entre processus.
+    """
+
+    def __init__(self, workers=2, max_queue=8, cv_threads=None):
+        """
+        Initialise l'exécuteur (les threads ne sont créés qu'à la première soumission).
+
+        Args:
+            workers (int, optional): Nombre de traitements exécutés simultanément.
+            max_queue (int, optional): Nombre de traitements pouvant attendre un thread libre.
+            cv_threads (int, optional): Threads internes d'OpenCV (cv2.setNumThreads), pour ne pas
+                multiplier les threads d'OpenCV par le nombre de workers.
+        """
+        self.workers = workers
+        self.max_queue = max_queue
+        if cv_threads:
+            cv2.setNumThreads(int(cv_threads))
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='inference')
+        self._lock = threading.Lock()
+        self.in_flight = 0  # Traitements en cours ou en attente
+        self.completed = 0
+        self.rejected = 0
+
+    def submit(self, fn, *args, timings=None, **kwargs):
+        """
+        Soumet une fonction au pool, sans attendre son résultat.
+
+        Args:
+            fn (callable): Traitement à exécuter.
+            *args: Arguments positionnels du traitement.
+            timings (StageTimings, optional): Reçoit l'attente dans la file (étape 'queue').
+            **kwargs: Arguments nommés du traitement.
+
+        Returns:
+            concurrent.futures.Future: Résultat à venir du traitement.
+
+        Raises:
+            ExecutorSaturated: File pleine.
+        """
+        with self._lock:
+            if self.in_flight >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise ExecutorSaturated("Serveur saturé, réessayer plus tard")
+            self.in_flight += 1
+
+        submitted = time.perf_counter()
+
+        def task():
+            if timings is not None:
+                timings.add('queue', (time.perf_counter() - submitted) * 1000)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.in_flight -= 1
+                    self.completed += 1
+
+        try:
+            return self._pool.submit(task)
+        except Exception:
+            with self._lock:
+                self.in_flight -= 1
+            raise
+
+    def run(self, fn, *args, timings=None, timeout=None, **kwargs):
+        """
+        Exécute une fonction dans le pool et attend son résultat.
+
+        Args:
+            fn (callable): Traitement à exécuter.
+            *args: Arguments positionnels du traitement.
+            timings (StageTimings, optional): Reçoit l'attente dans la file (étape 'queue').
+            timeout (float, optional): Délai maximal d'attente du résultat, en secondes.
+            **kwargs: Arguments nommés du traitement.
+
+        Returns:
+            object: Résultat du traitement (ses exceptions sont propagées).
+
+        Raises:
+            ExecutorSaturated: File pleine, ou résultat non obtenu dans le délai.
+        """
+        future = self.submit(fn, *args, timings=timings, **kwargs)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            # Le traitement se termine en arrière-plan et libère sa place à ce moment-là
+            raise ExecutorSaturated("Délai de traitement dépassé")
+
+    async def run_async(self, fn, *args, timings=None, timeout=None, **kwargs):
+        """
+        Variante asynchrone de run : la boucle d'événements reste libre pendant le traitement.
+
+        Raises:
+            ExecutorSaturated: File pleine, ou résultat non obtenu dans le délai.
+        """
+        future = self.submit(fn, *args, timings=timings, **kwargs)
+        try:
+            # shield : l'expiration du délai n'annule pas le traitement déjà lancé
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+        except asyncio.TimeoutError:
+            raise ExecutorSaturated("Délai de traitement dépassé")
+
+    def stats(self):
+        """
+        Returns:
+            dict: Occupation de l'exécuteur.
+        """
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_queue': self.max_queue,
+                'in_flight': self.in_flight,
+                'completed': self.completed,
+                'rejected': self.rejected
+            }
+
+class MicroBatcher:
+    """
+    Classe regroupant les appels concurrents d'une fonction par lots.
+    Les lots sont exécutés par les threads qui soumettent (ceux de l'exécuteur d'inférence) : au
+    plus `concurrency` lots à la fois, et les éléments soumis pendant ce temps forment les lots
+    suivants. Aucune attente n'est ajoutée à faible charge, et la charge élevée est absorbée
+    par des lots plus grands.
+    """
+
+    def __init__(self, fn, max_batch=32, max_wait_ms=0.0, concurrency=1):
+        """
+        Initialise le regroupement.
+
+        Args:
+            fn (callable): Fonction traitant une liste d'éléments et retournant la liste des résultats.
+            max_batch (int, optional): Taille maximale d'un lot.
+            max_wait_ms (float, optional): Attente supplémentaire pour compléter un lot.
+            concurrency (int, optional): Nombre de lots exécutés simultanément.
+        """
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.concurrency = max(1, int(concurrency))
+        self._pending = []  # [(élément, Future)] en attente d'un lot
+        self._running = 0
+        self._condition = threading.Condition()
+        self.batches = 0
+        self.items = 0
+
+    def submit(self, item, timeout=None):
+        """
+        Soumet un élément et attend son résultat. Si moins de `concurrency` lots sont en cours,
+        le thread appelant exécute lui-même le lot suivant (qui contient son élément).
+
+        Args:
+            item (object): Élément à traiter.
+            timeout (float, optional): Délai maximal d'attente, en secondes.
+
+        Returns:
+            object: Résultat de l'élément (l'exception levée pour cet élément sinon).
+
+        Raises:
+            ExecutorSaturated: Résultat non obtenu dans le délai.
+        """
+        future = Future()
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        with self._condition:
+            self._pending.append((item, future))
+            self._condition.notify_all()
+
+        while not future.done():
+            with self._condition:
+                while not future.done() and (self._running >= self.concurrency or not self._pending):
+                    remaining = None if deadline is None else deadline - time.perf_counter()
+                    if remaining is not None and remaining <= 0:
+                        # Encore en attente d'un lot : le retirer (un lot en cours se termine sans lui)
+                        self._pending = [entry for entry in self._pending if entry[1] is not future]
+                        if not future.done():
+                            raise ExecutorSaturated("Délai de traitement dépassé")
+                        break
+                    self._condition.wait(remaining)
+                if future.done():
+                    break
+                batch = self._next_batch()
+                self._running += 1
+
+            try:
+                self._run(batch)
+            finally:
+                with self._condition:
+                    self._running -= 1
+                    self._condition.notify_all()
+
+        return future.result()
+
+    def _next_batch(self):
+        # Appelé avec la condition détenue
+        if self.max_wait and len(self._pending) < self.max_batch:
+            deadline = time.perf_counter() + self.max_wait
+            while len(self._pending) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+        batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+        return batch
+
+    def _run(self, batch):
+        try:
+            results = self.fn([item for item, _ in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0][1].set_exception(e)
+                return
+            # Un élément invalide ne doit pas faire échouer les autres : les traiter séparément
+            for entry in batch:
+                self._run([entry])
+            return
+
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+        with self._condition:
+            self.batches += 1
+            self.items += len(batch)
+
+    def stats(self):
+        """
+        Returns:
+            dict: Nombre de lots traités et taille moyenne des lots.
+        """
+        return {
+            'batches': self.batches,
+            'mean_batch_size': round(self.items / self.batches, 2) if self.batches else 0.0
+        }
@@ -0,0 +1,223 @@
+"""
+Écriture des journaux en ajout seul (JSON Lines) pour le système d'authentification faciale.
+Les entrées sont mises en tampon et écrites par lots par un thread d'arrière-plan.
+"""
+
+import os
+import json
+import time
+import atexit
+import threading
+
+class LogWriter:
+    """
+    Classe pour l'écriture des journaux au format JSON Lines.
+    Chaque entrée est une ligne JSON ajoutée en fin de fichier ; le fichier est
+    renommé (rotation) lorsqu'il dépasse une taille ou une durée donnée.
+    """
+
+    def __init__(self, log_file, flush_interval=1.0, batch_size=100,
+                 max_bytes=10 * 1024 * 1024, rotate_interval=None, backup_count=5):
+        """
+        Initialise l'écrivain de journaux et démarre le thread de vidage.
+
+        Args:
+            log_file (str): Chemin du fichier JSON Lines.
+            flush_interval (float, optional): Délai maximal (secondes) avant l'écriture d'une entrée.
+            batch_size (int, optional): Nombre d'entrées en tampon déclenchant une écriture immédiate.
+            max_bytes (int, optional): Taille au-delà de laquelle le fichier est renommé (0 pour désactiver).
+            rotate_interval (float, optional): Durée (secondes) au-delà de laquelle le fichier est renommé.
+            backup_count (int, optional): Nombre de fichiers renommés conservés.
+        """
+        self.log_file = log_file
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.backup_count = backup_count
+
+        self._buffer = []
+        self._condition = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._closed = False
+        self._opened_at = time.time()
+
+        self._start_thread()
+        atexit.register(self.close)
+
+        # Les threads ne survivent pas à un fork (workers gunicorn préchargés)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _start_thread(self):
+        self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+        self._thread.start()
+
+    def _after_fork(self):
+        """
+        Recrée les verrous et le thread de vidage dans un processus enfant.
+        """
+        self._buffer = []  # Les entrées en attente appartiennent au processus parent
+        self._condition = threading.Condition()
+        self._write_lock = threading.Lock()
+        if not self._closed:
+            self._start_thread()
+
+    def write(self, entry):
+        """
+        Ajoute une entrée au tampon.
+
+        Args:
+            entry (dict): Entrée de journal.
+
+        Returns:
+            bool: True si l'entrée a été acceptée, False si l'écrivain est fermé.
+        """
+        with self._condition:
+            if self._closed:
+                return False
+            self._buffer.append(entry)
+            if len(self._buffer) >= self.batch_size:
+                self._condition.notify()
+        return True
+
+    def _run(self):
+        """
+        Boucle du thread d'arrière-plan : vide le tampon par lots.
+        """
+        while True:
+            with self._condition:
+                if not self._closed and len(self._buffer) < self.batch_size:
+                    self._condition.wait(self.flush_interval)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+
+    def flush(self):
+        """
+        Écrit immédiatement toutes les entrées en attente.
+        """
+        with self._condition:
+            entries, self._buffer = self._buffer, []
+        if not entries:
+            return
+
+        data = ''.join(json.dumps(entry) + '\n' for entry in entries)
+        with self._write_lock:
+            try:
+                self._rotate_if_needed()
+                with open(self.log_file, 'a') as f:
+                    f.write(data)
+            except Exception as e:
+                print(f"Erreur lors de l'écriture des journaux: {e}")
+
+    def close(self):
+        """
+        Arrête le thread de vidage après avoir écrit les entrées en attente.
+        """
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify()
+        self._thread.join(timeout=5)
+        self.flush()
+
+    def _backup_file(self, index):
+        root, ext = os.path.splitext(self.log_file)
+        return f"{root}.{index}{ext}"
+
+    def _rotate_if_needed(self):
+        """
+        Renomme le fichier courant si sa taille ou son âge dépasse la limite.
+        """
+        if not os.path.exists(self.log_file):
+            self._opened_at = time.time()
+            return
+
+        too_big = self.max_bytes and os.path.getsize(self.log_file) >= self.max_bytes
+        too_old = self.rotate_interval and time.time() - self._opened_at >= self.rotate_interval
+        if not (too_big or too_old):
+            return
+
+        for index in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(self._backup_file(index)):
+                os.replace(self._backup_file(index), self._backup_file(index + 1))
+        if self.backup_count > 0:
+            os.replace(self.log_file, self._backup_file(1))
+        else:
+            os.remove(self.log_file)
+        self._opened_at = time.time()
+
+    @staticmethod
+    def _read_tail_lines(file_path, limit, block_size=8192):
+        """
+        Lit les `limit` dernières lignes d'un fichier en partant de la fin.
+
+        Returns:
+            list: Lignes (bytes) dans l'ordre du fichier.
+        """
+        if limit <= 0 or not os.path.exists(file_path):
+            return []
+
+        with open(file_path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            position = f.tell()
+            data = b''
+            while position > 0 and data.count(b'\n') <= limit:
+                read_size = min(block_size, position)
+                position -= read_size
+                f.seek(position)
+                data = f.read(read_size) + data
+
+        lines = [line for line in data.split(b'\n') if line.strip()]
+        return lines[-limit:]
+
+    def tail(self, limit=100):
+        """
+        Récupère les dernières entrées sans désérialiser tout l'historique.
+
+        Args:
+            limit (int): Nombre maximum d'entrées à récupérer.
+
+        Returns:
+            list: Entrées de journal, de la plus ancienne à la plus récente.
+        """
+        self.flush()
+
+        lines = []
+        with self._write_lock:
+            files = [self.log_file] + [self._backup_file(i) for i in range(1, self.backup_count + 1)]
+            for file_path in files:
+                if len(lines) >= limit:
+                    break
+                lines = self._read_tail_lines(file_path, limit - len(lines)) + lines
+
+        entries = []
+        for line in lines:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+        return entries
+
+    def iter_entries(self):
+        """
+        Parcourt toutes les entrées, des fichiers renommés les plus anciens au fichier courant.
+
+        Yields:
+            dict: Entrée de journal.
+        """
+        self.flush()
+
+        files = [self._backup_file(i) for i in range(self.backup_count, 0, -1)] + [self.log_file]
+        for file_path in files:
+            if not os.path.exists(file_path):
+                continue
+            with open(file_path, 'r') as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
@@ -0,0 +1,102 @@
+"""
+Projection PCA (eigenfaces) des embeddings pour le système d'authentification faciale.
+Réduit les vecteurs bruts de 10 000 pixels à quelques centaines de composantes.
+"""
+
+import hashlib
+import numpy as np
+
+class PCAProjection:
+    """
+    Classe représentant une projection linéaire apprise par analyse en composantes principales.
+    """
+
+    def __init__(self, mean=None, components=None):
+        """
+        Initialise la projection (vide tant qu'elle n'est pas ajustée).
+
+        Args:
+            mean (numpy.ndarray, optional): Vecteur moyen (input_dim,).
+            components (numpy.ndarray, optional): Composantes principales (dim, input_dim).
+        """
+        self.mean = mean
+        self.components = components
+
+    @property
+    def dim(self):
+        return None if self.components is None else self.components.shape[0]
+
+    @property
+    def input_dim(self):
+        return None if self.components is None else self.components.shape[1]
+
+    def fit(self, embeddings, n_components=128):
+        """
+        Ajuste la projection sur une matrice d'embeddings bruts.
+
+        Args:
+            embeddings (numpy.ndarray): Matrice (N, input_dim).
+            n_components (int, optional): Nombre de composantes conservées (≤ N).
+
+        Returns:
+            PCAProjection: La projection ajustée.
+        """
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        if matrix.shape[0] < 2:
+            raise ValueError("Au moins deux embeddings sont nécessaires pour ajuster la PCA")
+
+        self.mean = matrix.mean(axis=0)
+        centered = matrix - self.mean
+
+        # SVD réduite : les lignes de vt sont les composantes principales
+        _, _, vt = np.linalg.svd(centered, full_matrices=False)
+        self.components = np.ascontiguousarray(vt[:min(n_components, vt.shape[0])], dtype=np.float32)
+        return self
+
+    def transform(self, embeddings):
+        """
+        Projette un vecteur (input_dim,) ou une matrice (N, input_dim).
+
+        Args:
+            embeddings (numpy.ndarray): Embeddings bruts.
+
+        Returns:
+            numpy.ndarray: Embeddings projetés (dim,) ou (N, dim).
+        """
+        return (np.asarray(embeddings, dtype=np.float32) - self.mean) @ self.components.T
+
+    def fingerprint(self):
+        """
+        Empreinte de la projection (différente après chaque ré-ajustement, même à dimension égale).
+
+        Returns:
+            str: Empreinte hexadécimale.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        for array in (self.mean, self.components):
+            digest.update(np.ascontiguousarray(array, dtype=np.float32).tobytes())
+        return digest.hexdigest()
+
+    def save(self, path):
+        """
+        Sauvegarde la projection dans un fichier .npz.
+
+        Args:
+            path (str): Chemin du fichier.
+        """
+        with open(path, 'wb') as f:
+            np.savez(f, mean=self.mean, components=self.components)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Charge une projection sauvegardée par `save`.
+
+        Args:
+            path (str): Chemin du fichier.
+
+        Returns:
+            PCAProjection: Projection chargée.
+        """
+        with np.load(path) as data:
+            return cls(mean=data['mean'], components=data['components'])
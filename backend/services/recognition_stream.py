@@ -0,0 +1,198 @@
+"""
+Reconnaissance en continu d'un flux d'images (session WebSocket) pour le système d'authentification faciale.
+Le client envoie des images JPEG/PNG binaires ; seule la plus récente est traitée (les images en attente
+sont abandonnées) et un résultat n'est émis que lorsque l'identité change.
+"""
+
+import threading
+import numpy as np
+from utils.image_processing import base64_to_image, bytes_to_image
+from services.inference_executor import ExecutorSaturated
+
+class LatestFrame:
+    """
+    Boîte aux lettres à une seule place : une nouvelle image remplace celle qui n'a pas encore
+    été traitée, de sorte que le traitement ne prend jamais de retard sur le flux (contre-pression).
+    """
+
+    def __init__(self):
+        self._frame = None
+        self._closed = False
+        self._condition = threading.Condition()
+        self.received = 0  # Images reçues
+        self.dropped = 0   # Images remplacées avant d'avoir été traitées
+
+    def put(self, frame):
+        """
+        Dépose une image, en abandonnant l'éventuelle image précédente non traitée.
+
+        Args:
+            frame (bytes | str): Image encodée (octets JPEG/PNG ou chaîne base64).
+        """
+        with self._condition:
+            if self._frame is not None:
+                self.dropped += 1
+            self._frame = frame
+            self.received += 1
+            self._condition.notify()
+
+    def drop(self):
+        """
+        Compte une image retirée mais abandonnée sans traitement (serveur saturé).
+        """
+        with self._condition:
+            self.dropped += 1
+
+    def take(self):
+        """
+        Attend et retire l'image la plus récente.
+
+        Returns:
+            bytes | str: Image encodée, ou None une fois la boîte fermée.
+        """
+        with self._condition:
+            while self._frame is None and not self._closed:
+                self._condition.wait()
+            frame, self._frame = self._frame, None
+            return frame
+
+    def close(self):
+        """
+        Ferme la boîte et réveille le consommateur.
+        """
+        with self._condition:
+            self._closed = True
+            self._frame = None
+            self._condition.notify()
+
+class RecognitionSession:
+    """
+    Classe représentant une session de reconnaissance sur un flux d'images.
+    L'identité courante est conservée d'une image à l'autre ; le profil n'est lu qu'à chaque
+    changement d'identité (jamais mis en cache, il reste à jour après une modification).
+    """
+
+    def __init__(self, detector, recognizer, database, tracker=None):
+        """
+        Initialise la session.
+
+        Args:
+            detector (FaceDetector): Détecteur de visages.
+            recognizer (FaceRecognizer): Reconnaisseur de visages.
+            database (Database): Base de données (profils et journaux).
+            tracker (FaceTracker, optional): Suivi du visage entre images (détection sur l'image entière sinon).
+        """
+        self.detector = detector
+        self.recognizer = recognizer
+        self.database = database
+        self.tracker = tracker
+        self.identity = None  # Clé de l'identité courante (None tant que rien n'a été émis)
+        self.processed = 0
+        self.reused = 0  # Images dont l'identité a été reprise du visage suivi
+
+    def process(self, frame):
+        """
+        Traite une image du flux.
+
+        Args:
+            frame (bytes | str): Image encodée (octets JPEG/PNG ou chaîne base64).
+
+        Returns:
+            dict: Événement à émettre si l'identité a changé, None sinon.
+        """
+        # La détection et la reconnaissance n'utilisent que les niveaux de gris
+        if isinstance(frame, str):
+            image = base64_to_image(frame, grayscale=True)
+        else:
+            image = bytes_to_image(frame, grayscale=True)
+        self.processed += 1
+
+        if self.tracker is not None:
+            face_coords, stable = self.tracker.update(image)
+            # Visage suivi de manière stable : l'identité précédente est conservée sans reconnaissance
+            if stable and self.identity not in (None, 'no_face'):
+                self.reused += 1
+                return None
+        else:
+            faces = self.detector.detect(image)
+            # Prendre le visage le plus grand
+            face_coords = max(faces, key=lambda rect: rect[2] * rect[3]) if len(faces) else None
+
+        if face_coords is None:
+            identity, event = 'no_face', {'recognized': False, 'face': None, 'message': 'Aucun visage détecté'}
+        else:
+            face_img = self.detector.extract_face(image, face_coords)
+            user_id, confidence = self.recognizer.recognize(self.detector.preprocess_face(face_img))
+
+            x, y, w, h = face_coords
+            face = {'x': int(x), 'y': int(y), 'width': int(w), 'height': int(h)}
+            if user_id:
+                identity = user_id
+                event = {
+                    'recognized': True,
+                    'user': None,  # Profil lu seulement si l'identité change
+                    'confidence': float(confidence),
+                    'face': face
+                }
+            else:
+                identity, event = 'unknown', {'recognized': False, 'face': face, 'message': 'Visage non reconnu'}
+
+        if identity == self.identity:
+            return None
+        self.identity = identity
+
+        if event['recognized']:
+            user = self.database.get_user(identity)
+            event['user'] = user.to_dict() if user else None
+
+        # Journaliser chaque changement d'identité (et non chaque image)
+        if identity == 'unknown':
+            self.database.add_log({
+                'timestamp': str(np.datetime64('now')),
+                'action': 'recognition',
+                'result': 'failure',
+                'message': 'Visage non reconnu'
+            })
+        elif identity != 'no_face':
+            self.database.add_log({
+                'timestamp': str(np.datetime64('now')),
+                'action': 'recognition',
+                'user_id': identity,
+                'result': 'success',
+                'confidence': event['confidence']
+            })
+
+        return dict(event, type='identity')
+
+    def run(self, frames, emit, execute=None):
+        """
+        Boucle de traitement : prend toujours l'image la plus récente jusqu'à la fermeture du flux.
+
+        Args:
+            frames (LatestFrame): Boîte aux lettres alimentée par la réception.
+            emit (callable): Fonction envoyant un événement (dict) au client.
+            execute (callable, optional): Exécute process(frame) (ex. dans l'exécuteur d'inférence) ;
+                appel direct sinon.
+        """
+        while True:
+            frame = frames.take()
+            if frame is None:
+                return
+
+            try:
+                event = execute(self.process, frame) if execute else self.process(frame)
+            except ExecutorSaturated as e:
+                # Serveur saturé : l'image est abandonnée, le client peut ralentir son envoi
+                frames.drop()
+                event = {'type': 'busy', 'error': str(e), 'status': 503}
+            except Exception as e:
+                event = {'type': 'error', 'error': str(e)}
+
+            if event is not None:
+                event.update({'frames': self.processed, 'dropped': frames.dropped})
+                try:
+                    emit(event)
+                except Exception:
+                    # Connexion fermée : arrêter la session
+                    frames.close()
+                    return
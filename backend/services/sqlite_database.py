@@ -0,0 +1,527 @@
+"""
+Service de base de données SQLite pour le système d'authentification faciale.
+Même interface que services.database.Database, avec un stockage transactionnel
+(mode WAL) partageable entre plusieurs processus.
+"""
+
+import os
+import json
+import sqlite3
+import threading
+import numpy as np
+from models.user import User
+from utils.quantization import quantize, dequantize
+from services.gallery import template_key, template_owner, template_index, TEMPLATE_SEPARATOR
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    name TEXT,
+    age,
+    profession TEXT,
+    embedding BLOB,
+    embedding_dim INTEGER,
+    embedding_dtype TEXT
+);
+
+CREATE TABLE IF NOT EXISTS logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT,
+    action TEXT,
+    user_id TEXT,
+    result TEXT,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS embeddings (
+    user_id TEXT NOT NULL,
+    space TEXT NOT NULL,
+    embedding BLOB,
+    embedding_dim INTEGER,
+    embedding_dtype TEXT,
+    PRIMARY KEY (space, user_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_logs_timestamp ON logs (timestamp);
+CREATE INDEX IF NOT EXISTS idx_logs_action ON logs (action, timestamp);
+CREATE INDEX IF NOT EXISTS idx_logs_user_id ON logs (user_id, timestamp);
+"""
+
+class SQLiteDatabase:
+    """
+    Classe pour la gestion de la base de données des utilisateurs et des journaux.
+    Utilise SQLite en mode WAL ; les embeddings sont stockés en BLOB binaires.
+    """
+
+    def __init__(self, db_dir='database', db_file='facial_auth.db', embedding_dtype='float32',
+                 embedding_space='raw'):
+        """
+        Initialise la base de données.
+
+        Args:
+            db_dir (str): Répertoire de la base de données.
+            db_file (str, optional): Nom du fichier SQLite.
+            embedding_dtype (str, optional): Type des embeddings stockés ('float32', 'float16' ou 'int8').
+            embedding_space (str, optional): Espace des embeddings utilisés ('raw' ou 'pca').
+        """
+        self.db_dir = db_dir
+        self.db_path = os.path.join(db_dir, db_file)
+        self.embedding_dtype = np.dtype(embedding_dtype)
+        self.embedding_space = embedding_space
+        self._local = threading.local()
+        # Connexions ouvertes, par thread : fermées à la fin du thread (au plus tard à la
+        # prochaine ouverture) ou par close()
+        self._connections = {}
+        self._connections_lock = threading.Lock()
+
+        # Une connexion SQLite ne doit pas être réutilisée après un fork
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_connections)
+
+        # Créer le répertoire de la base de données s'il n'existe pas
+        os.makedirs(db_dir, exist_ok=True)
+
+        # Créer le schéma s'il n'existe pas
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _reset_connections(self):
+        # Processus enfant : les connexions héritées appartiennent au parent, ne pas les fermer
+        self._local = threading.local()
+        self._connections = {}
+        self._connections_lock = threading.Lock()
+
+    def _connection(self):
+        """
+        Retourne la connexion SQLite du thread courant (une connexion par thread).
+
+        Returns:
+            sqlite3.Connection: Connexion ouverte en mode WAL.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Utilisée par un seul thread, mais close() doit pouvoir la fermer depuis un autre
+            conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._register(conn)
+        return conn
+
+    def _register(self, conn):
+        """
+        Enregistre la connexion du thread courant et ferme celles des threads terminés.
+        """
+        with self._connections_lock:
+            alive = {thread.ident for thread in threading.enumerate()}
+            for ident in [ident for ident in self._connections if ident not in alive]:
+                self._connections.pop(ident).close()
+            # Identifiant réutilisé par un nouveau thread : l'ancien est terminé
+            stale = self._connections.pop(threading.get_ident(), None)
+            if stale is not None:
+                stale.close()
+            self._connections[threading.get_ident()] = conn
+
+    def _encode_embedding(self, embedding):
+        """
+        Convertit un embedding en BLOB (précédé de son échelle float32 en précision int8).
+
+        Returns:
+            tuple: (blob, dimension, type) ou (None, None, None).
+        """
+        if embedding is None:
+            return None, None, None
+        data, scale = quantize(np.ravel(embedding), self.embedding_dtype.name)
+        blob = data.tobytes() if scale is None else scale.tobytes() + data.tobytes()
+        return blob, int(data.shape[0]), self.embedding_dtype.name
+
+    @staticmethod
+    def _decode_embedding(blob, dtype):
+        """
+        Convertit un BLOB en embedding float32.
+        """
+        if blob is None:
+            return None
+        if dtype == 'int8':
+            return dequantize(np.frombuffer(blob[4:], dtype=np.int8), np.frombuffer(blob[:4], dtype=np.float32)[0])
+        return np.frombuffer(blob, dtype=np.dtype(dtype)).astype(np.float32)
+
+    def get_user(self, user_id):
+        """
+        Récupère un utilisateur par son ID.
+
+        Args:
+            user_id (str): ID de l'utilisateur.
+
+        Returns:
+            User: Profil de l'utilisateur (sans embedding) ou None si non trouvé.
+        """
+        row = self._connection().execute(
+            'SELECT user_id, name, age, profession FROM users WHERE user_id = ?', (user_id,)
+        ).fetchone()
+        return User(*row) if row else None
+
+    def get_all_users(self):
+        """
+        Récupère tous les utilisateurs.
+
+        Returns:
+            list: Liste des profils utilisateur (sans embedding).
+        """
+        rows = self._connection().execute('SELECT user_id, name, age, profession FROM users').fetchall()
+        return [User(*row) for row in rows]
+
+    def count_users(self):
+        """
+        Compte les utilisateurs sans lire leurs profils.
+
+        Returns:
+            int: Nombre d'utilisateurs.
+        """
+        return self._connection().execute('SELECT COUNT(*) FROM users').fetchone()[0]
+
+    def get_embedding(self, user_id, space=None):
+        """
+        Récupère l'embedding principal d'un utilisateur.
+        L'espace 'raw' est stocké dans la table users, les autres dans la table embeddings.
+
+        Args:
+            user_id (str): ID de l'utilisateur.
+            space (str, optional): Espace d'embedding (celui de la base par défaut).
+
+        Returns:
+            numpy.ndarray: Embedding ou None si absent.
+        """
+        space = space or self.embedding_space
+        if space == 'raw':
+            row = self._connection().execute(
+                'SELECT embedding, embedding_dtype FROM users WHERE user_id = ?', (user_id,)
+            ).fetchone()
+        else:
+            row = self._connection().execute(
+                'SELECT embedding, embedding_dtype FROM embeddings WHERE user_id = ? AND space = ?',
+                (user_id, space)
+            ).fetchone()
+        return self._decode_embedding(*row) if row else None
+
+    def get_all_embeddings(self, space=None):
+        """
+        Récupère tous les embeddings (y compris les modèles supplémentaires) en une seule requête.
+
+        Args:
+            space (str, optional): Espace d'embedding (celui de la base par défaut).
+
+        Returns:
+            tuple: (clés des modèles, matrice (N, dim) des embeddings).
+        """
+        space = space or self.embedding_space
+        if space == 'raw':
+            # Modèle principal dans la table users, modèles supplémentaires dans la table embeddings
+            rows = self._connection().execute(
+                'SELECT user_id, embedding, embedding_dtype FROM users WHERE embedding IS NOT NULL '
+                'UNION ALL SELECT user_id, embedding, embedding_dtype FROM embeddings WHERE space = ?', (space,)
+            ).fetchall()
+        else:
+            rows = self._connection().execute(
+                'SELECT user_id, embedding, embedding_dtype FROM embeddings WHERE space = ?', (space,)
+            ).fetchall()
+        if not rows:
+            return [], np.zeros((0, 0), dtype=np.float32)
+
+        user_ids = [row[0] for row in rows]
+        matrix = np.stack([self._decode_embedding(blob, dtype) for _, blob, dtype in rows])
+        return user_ids, matrix
+
+    def put_embeddings(self, user_ids, embeddings, space=None):
+        """
+        Écrit des embeddings dans un espace donné (sans modifier les profils).
+
+        Args:
+            user_ids (list): Identifiants des utilisateurs.
+            embeddings (numpy.ndarray): Matrice (N, dim) des embeddings.
+            space (str, optional): Espace d'embedding (celui de la base par défaut).
+
+        Returns:
+            bool: True si l'écriture a réussi, False sinon.
+        """
+        space = space or self.embedding_space
+        rows = [(user_id, *self._encode_embedding(embedding)) for user_id, embedding in zip(user_ids, embeddings)]
+        try:
+            with self._connection() as conn:
+                if space == 'raw':
+                    conn.executemany(
+                        'UPDATE users SET embedding = ?, embedding_dim = ?, embedding_dtype = ? WHERE user_id = ?',
+                        [(blob, dim, dtype, user_id) for user_id, blob, dim, dtype in rows]
+                    )
+                else:
+                    conn.executemany(
+                        'INSERT OR REPLACE INTO embeddings (user_id, space, embedding, embedding_dim, embedding_dtype) '
+                        'VALUES (?, ?, ?, ?, ?)',
+                        [(user_id, space, blob, dim, dtype) for user_id, blob, dim, dtype in rows]
+                    )
+            return True
+        except sqlite3.Error as e:
+            print(f"Erreur lors de l'écriture des embeddings: {e}")
+            return False
+
+    def get_templates(self, user_id, space=None):
+        """
+        Récupère tous les modèles (templates) d'un utilisateur, le principal en premier.
+
+        Args:
+            user_id (str): ID de l'utilisateur.
+            space (str, optional): Espace d'embedding (celui de la base par défaut).
+
+        Returns:
+            numpy.ndarray: Matrice (T, dim) des modèles (T = 0 si l'utilisateur n'en a aucun).
+        """
+        space = space or self.embedding_space
+        prefix = user_id + TEMPLATE_SEPARATOR
+        query = 'SELECT user_id, embedding, embedding_dtype FROM embeddings ' \
+                'WHERE space = ? AND (user_id = ? OR substr(user_id, 1, ?) = ?)'
+        params = [space, user_id, len(prefix), prefix]
+        if space == 'raw':
+            query = 'SELECT user_id, embedding, embedding_dtype FROM users WHERE user_id = ? AND embedding IS NOT NULL ' \
+                    'UNION ALL ' + query
+            params = [user_id] + params
+        rows = sorted(self._connection().execute(query, params).fetchall(), key=lambda row: template_index(row[0]))
+        templates = [self._decode_embedding(blob, dtype) for _, blob, dtype in rows]
+        if not templates:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.array(templates, dtype=np.float32).reshape(len(templates), -1)
+
+    def put_templates(self, user_id, templates, space=None):
+        """
+        Remplace les modèles d'un utilisateur dans une seule transaction (le premier devient
+        son embedding principal).
+
+        Args:
+            user_id (str): ID de l'utilisateur.
+            templates (numpy.ndarray): Matrice (T, dim) des modèles.
+            space (str, optional): Espace d'embedding (celui de la base par défaut).
+
+        Returns:
+            bool: True si l'écriture a réussi, False sinon.
+        """
+        space = space or self.embedding_space
+        prefix = user_id + TEMPLATE_SEPARATOR
+        rows = [(template_key(user_id, i), *self._encode_embedding(embedding)) for i, embedding in enumerate(templates)]
+        try:
+            with self._connection() as conn:
+                conn.execute('DELETE FROM embeddings WHERE space = ? AND substr(user_id, 1, ?) = ?',
+                             (space, len(prefix), prefix))
+                if space == 'raw' and rows:
+                    # Modèle principal dans la table users
+                    _, blob, dim, dtype = rows.pop(0)
+                    conn.execute('UPDATE users SET embedding = ?, embedding_dim = ?, embedding_dtype = ? WHERE user_id = ?',
+                                 (blob, dim, dtype, user_id))
+                conn.executemany(
+                    'INSERT OR REPLACE INTO embeddings (user_id, space, embedding, embedding_dim, embedding_dtype) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    [(key, space, blob, dim, dtype) for key, blob, dim, dtype in rows]
+                )
+            return True
+        except sqlite3.Error as e:
+            print(f"Erreur lors de l'écriture des embeddings: {e}")
+            return False
+
+    def add_user(self, user):
+        """
+        Ajoute ou met à jour un utilisateur.
+
+        Args:
+            user (User): Objet utilisateur.
+
+        Returns:
+            bool: True si l'ajout a réussi, False sinon.
+        """
+        return self.add_users([user])
+
+    def add_users(self, users):
+        """
+        Ajoute ou met à jour plusieurs utilisateurs dans une seule transaction.
+
+        Args:
+            users (list): Objets utilisateur.
+
+        Returns:
+            bool: True si l'ajout a réussi, False sinon.
+        """
+        try:
+            with self._connection() as conn:
+                if self.embedding_space == 'raw':
+                    conn.executemany(
+                        'INSERT OR REPLACE INTO users '
+                        '(user_id, name, age, profession, embedding, embedding_dim, embedding_dtype) '
+                        'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                        [(user.user_id, user.name, user.age, user.profession,
+                          *self._encode_embedding(user.face_embedding)) for user in users]
+                    )
+                else:
+                    # Conserver l'embedding brut éventuellement présent dans la table users
+                    conn.executemany(
+                        'INSERT INTO users (user_id, name, age, profession) VALUES (?, ?, ?, ?) '
+                        'ON CONFLICT(user_id) DO UPDATE SET '
+                        'name = excluded.name, age = excluded.age, profession = excluded.profession',
+                        [(user.user_id, user.name, user.age, user.profession) for user in users]
+                    )
+                    conn.executemany(
+                        'INSERT OR REPLACE INTO embeddings (user_id, space, embedding, embedding_dim, embedding_dtype) '
+                        'VALUES (?, ?, ?, ?, ?)',
+                        [(user.user_id, self.embedding_space, *self._encode_embedding(user.face_embedding))
+                         for user in users if user.face_embedding is not None]
+                    )
+            return True
+        except sqlite3.Error as e:
+            print(f"Erreur lors de la sauvegarde des données: {e}")
+            return False
+
+    def delete_user(self, user_id):
+        """
+        Supprime un utilisateur.
+
+        Args:
+            user_id (str): ID de l'utilisateur.
+
+        Returns:
+            bool: True si la suppression a réussi, False sinon.
+        """
+        try:
+            with self._connection() as conn:
+                cursor = conn.execute('DELETE FROM users WHERE user_id = ?', (user_id,))
+                prefix = user_id + TEMPLATE_SEPARATOR
+                conn.execute('DELETE FROM embeddings WHERE user_id = ? OR substr(user_id, 1, ?) = ?',
+                             (user_id, len(prefix), prefix))
+            return cursor.rowcount > 0
+        except sqlite3.Error as e:
+            print(f"Erreur lors de la suppression des données: {e}")
+            return False
+
+    def add_log(self, log_entry):
+        """
+        Ajoute une entrée de journal.
+
+        Args:
+            log_entry (dict): Entrée de journal.
+
+        Returns:
+            bool: True si l'ajout a réussi, False sinon.
+        """
+        return self.add_logs([log_entry])
+
+    def add_logs(self, log_entries):
+        """
+        Ajoute plusieurs entrées de journal dans une seule transaction.
+
+        Args:
+            log_entries (list): Entrées de journal.
+
+        Returns:
+            bool: True si l'ajout a réussi, False sinon.
+        """
+        rows = [
+            (entry.get('timestamp'), entry.get('action'), entry.get('user_id'),
+             entry.get('result'), json.dumps(entry))
+            for entry in log_entries
+        ]
+        try:
+            with self._connection() as conn:
+                conn.executemany(
+                    'INSERT INTO logs (timestamp, action, user_id, result, data) VALUES (?, ?, ?, ?, ?)', rows
+                )
+            return True
+        except sqlite3.Error as e:
+            print(f"Erreur lors de l'écriture des journaux: {e}")
+            return False
+
+    def get_logs(self, limit=100, action=None, user_id=None, since=None, until=None):
+        """
+        Récupère les entrées de journal (requête indexée).
+
+        Args:
+            limit (int): Nombre maximum d'entrées à récupérer.
+            action (str, optional): Ne garder que ce type d'action.
+            user_id (str, optional): Ne garder que les entrées de cet utilisateur.
+            since (str, optional): Horodatage ISO minimal (inclus).
+            until (str, optional): Horodatage ISO maximal (inclus).
+
+        Returns:
+            list: Liste des entrées de journal, de la plus ancienne à la plus récente.
+        """
+        clauses, params = [], []
+        for column, operator, value in (('action', '=', action), ('user_id', '=', user_id),
+                                        ('timestamp', '>=', since), ('timestamp', '<=', until)):
+            if value is not None:
+                clauses.append(f'{column} {operator} ?')
+                params.append(value)
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        rows = self._connection().execute(
+            f'SELECT data FROM logs {where} ORDER BY id DESC LIMIT ?', (*params, limit)
+        ).fetchall()
+
+        return [json.loads(data) for (data,) in reversed(rows)]
+
+    def close(self):
+        """
+        Ferme les connexions de tous les threads (à l'arrêt). Une utilisation ultérieure
+        rouvre une connexion.
+        """
+        with self._connections_lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+            self._local = threading.local()
+        for conn in connections:
+            conn.close()
+
+
+def migrate_json_to_sqlite(db_dir='database', db_file='facial_auth.db', embedding_dtype='float32'):
+    """
+    Importe en une seule fois users.json/logs.json (et les embeddings binaires de
+    tous les espaces : brut, PCA, modèles DNN) dans une base SQLite.
+
+    Args:
+        db_dir (str): Répertoire contenant la base JSON.
+        db_file (str, optional): Nom du fichier SQLite à créer ou compléter.
+        embedding_dtype (str, optional): Précision des embeddings écrits dans SQLite.
+
+    Returns:
+        tuple: (nombre d'utilisateurs, nombre d'entrées de journal) importés.
+    """
+    from services.database import Database
+
+    # Lire les embeddings JSON dans leur précision sur disque, sans les convertir
+    source = Database(db_dir=db_dir, embedding_dtype=None)
+    target = SQLiteDatabase(db_dir=db_dir, db_file=db_file, embedding_dtype=embedding_dtype)
+
+    try:
+        users = source.get_all_users()
+        # Les profils sont chargés sans embedding : y joindre les embeddings principaux bruts
+        keys, embeddings = source.get_all_embeddings(space='raw')
+        principal = dict(zip(keys, embeddings))
+        for user in users:
+            user.face_embedding = principal.get(user.user_id)
+
+        # Ne pas dupliquer les journaux si la migration a déjà été faite
+        already_imported = target._connection().execute('SELECT COUNT(*) FROM logs').fetchone()[0]
+        logs = [] if already_imported else list(source.log_writer.iter_entries())
+
+        if not target.add_users(users) or not target.add_logs(logs):
+            raise RuntimeError("Erreur lors de l'import dans la base SQLite")
+
+        # Modèles supplémentaires des utilisateurs qui en ont
+        keys, _ = source.get_all_embeddings()
+        for user_id in {template_owner(key) for key in keys if TEMPLATE_SEPARATOR in key}:
+            if not target.put_templates(user_id, source.get_templates(user_id)):
+                raise RuntimeError("Erreur lors de l'import dans la base SQLite")
+
+        # Autres espaces d'embedding (projection PCA, modèles DNN)
+        for space in sorted(source._existing_spaces() - {'raw'}):
+            keys, embeddings = source.get_all_embeddings(space=space)
+            if keys and not target.put_embeddings(keys, embeddings, space=space):
+                raise RuntimeError(f"Erreur lors de l'import de l'espace '{space}' dans la base SQLite")
+
+        return len(users), len(logs)
+    finally:
+        source.close()
+        target.close()
@@ -0,0 +1,221 @@
+"""
+Tests de l'index approximatif (IVF) : sauvegarde, rechargement et validation par le reconnaisseur.
+"""
+
+import os
+import numpy as np
+from services.ann_index import IVFIndex
+from services.gallery import Gallery
+from services.face_recognizer import FaceRecognizer
+from services.projection import PCAProjection
+
+def _gallery(n=64, dim=16, seed=0):
+    embeddings = np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+    return [f'u{i}' for i in range(n)], embeddings
+
+def _recognizer(user_ids, embeddings):
+    recognizer = FaceRecognizer()
+    recognizer.add_embeddings(user_ids, embeddings)
+    return recognizer
+
+def test_save_load_round_trip(tmp_path):
+    """
+    L'index rechargé conserve son espace, sa dimension, ses clés et ses résultats.
+    """
+    user_ids, embeddings = _gallery()
+    gallery = Gallery()
+    gallery.add_many(user_ids, embeddings)
+    index = IVFIndex(n_lists=4, n_probe=4)
+    index.train(user_ids, embeddings)
+    index.space = 'pca'
+    path = str(tmp_path / 'ann_index.npz')
+    index.save(path)
+
+    loaded = IVFIndex.load(path)
+    assert loaded.space == 'pca'
+    assert loaded.dim == embeddings.shape[1]
+    assert set(loaded.keys()) == set(user_ids)
+    assert loaded.search_batch(embeddings[:8], gallery) == index.search_batch(embeddings[:8], gallery)
+
+def test_enable_index_reuses_matching_index(tmp_path):
+    """
+    Un index sauvegardé pour la même galerie est rechargé sans ré-entraînement.
+    """
+    user_ids, embeddings = _gallery()
+    path = str(tmp_path / 'ann_index.npz')
+    recognizer = _recognizer(user_ids, embeddings)
+    recognizer.enable_index(n_lists=4, n_probe=4)
+    recognizer.save_index(path)
+
+    reloaded = _recognizer(user_ids, embeddings)
+    reloaded.enable_index(n_lists=8, n_probe=4, index_path=path)
+    assert reloaded.index.space == 'raw'
+    assert reloaded.index.n_lists == 4
+    np.testing.assert_array_equal(reloaded.index.centroids, recognizer.index.centroids)
+
+def test_enable_index_rebuilds_on_space_mismatch(tmp_path):
+    """
+    Un index sauvegardé dans un autre espace d'embedding est reconstruit.
+    """
+    user_ids, embeddings = _gallery()
+    index = IVFIndex(n_lists=4)
+    index.train(user_ids, embeddings)
+    index.space = 'pca'
+    path = str(tmp_path / 'ann_index.npz')
+    index.save(path)
+
+    recognizer = _recognizer(user_ids, embeddings)
+    recognizer.enable_index(n_lists=8, index_path=path)
+    assert recognizer.index.n_lists == 8
+    assert recognizer.match(embeddings[3])[0][0] == 'u3'
+
+def test_enable_index_rebuilds_on_dimension_mismatch(tmp_path):
+    """
+    Un index d'une autre dimension (ex. projection ajustée avec un autre nombre de composantes)
+    est reconstruit au lieu de faire échouer les recherches.
+    """
+    user_ids, embeddings = _gallery()
+    index = IVFIndex(n_lists=4)
+    index.train(user_ids, embeddings[:, :8])
+    index.space = 'raw'
+    path = str(tmp_path / 'ann_index.npz')
+    index.save(path)
+
+    recognizer = _recognizer(user_ids, embeddings)
+    recognizer.enable_index(n_lists=8, index_path=path)
+    assert recognizer.index.dim == embeddings.shape[1]
+    assert recognizer.match(embeddings[5])[0][0] == 'u5'
+
+def test_enable_index_rebuilds_on_gallery_change(tmp_path):
+    """
+    Un index qui ne couvre pas exactement les clés de la galerie est reconstruit.
+    """
+    user_ids, embeddings = _gallery()
+    path = str(tmp_path / 'ann_index.npz')
+    recognizer = _recognizer(user_ids[:-1], embeddings[:-1])
+    recognizer.enable_index(n_lists=4)
+    recognizer.save_index(path)
+
+    reloaded = _recognizer(user_ids, embeddings)
+    reloaded.enable_index(n_lists=8, index_path=path)
+    assert reloaded.index.n_lists == 8
+    assert user_ids[-1] in reloaded.index
+
+def test_projected_index_matches_projected_probes(tmp_path):
+    """
+    Avec une projection PCA, l'index est construit et validé dans l'espace projeté : un index
+    brut sauvegardé est reconstruit et la reconnaissance d'une image aboutit.
+    """
+    rng = np.random.default_rng(1)
+    faces = [rng.integers(0, 256, size=(100, 100), dtype=np.uint8) for _ in range(12)]
+    raw = FaceRecognizer()
+    raw_features = raw.extract_raw_features_batch(faces)
+    user_ids = [f'u{i}' for i in range(len(faces))]
+
+    raw.add_embeddings(user_ids, raw_features)
+    raw.enable_index(n_lists=2)
+    path = str(tmp_path / 'ann_index.npz')
+    raw.save_index(path)
+
+    recognizer = FaceRecognizer(projection=PCAProjection().fit(raw_features, n_components=8))
+    recognizer.add_embeddings(user_ids, recognizer.project(raw_features))
+    recognizer.enable_index(n_lists=2, n_probe=2, index_path=path)
+    assert recognizer.index.dim == 8
+
+    user_id, _ = recognizer.recognize(faces[4])
+    assert user_id == 'u4'
+    recognizer.save_index(path)
+    assert (IVFIndex.load(path).space, IVFIndex.load(path).dim) == ('pca', 8)
+
+def test_enable_index_rebuilds_after_same_dimension_refit(tmp_path):
+    """
+    Une projection ré-ajustée avec le même nombre de composantes garde l'espace, la dimension
+    et les clés : seule l'empreinte distingue l'index construit sur l'ancienne projection.
+    """
+    rng = np.random.default_rng(2)
+    faces = [rng.integers(0, 256, size=(100, 100), dtype=np.uint8) for _ in range(40)]
+    raw_features = FaceRecognizer().extract_raw_features_batch(faces)
+    user_ids = [f'u{i}' for i in range(len(faces))]
+    path = str(tmp_path / 'ann_index.npz')
+
+    old = FaceRecognizer(projection=PCAProjection().fit(raw_features[:20], n_components=8))
+    old.add_embeddings(user_ids, old.project(raw_features))
+    old.enable_index(n_lists=4, n_probe=1)
+    old.save_index(path)
+
+    refit = FaceRecognizer(projection=PCAProjection().fit(raw_features[20:], n_components=8))
+    refit.add_embeddings(user_ids, refit.project(raw_features))
+    assert refit.projection.fingerprint() != old.projection.fingerprint()
+    refit.enable_index(n_lists=4, n_probe=1, index_path=path)
+
+    assert refit.index.fingerprint is None  # Reconstruit, pas rechargé
+    recognized = [refit.recognize(face)[0] for face in faces]
+    assert recognized == user_ids
+
+def test_corrupt_saved_index_is_rebuilt(tmp_path):
+    """
+    Un fichier d'index tronqué ne fait pas échouer le démarrage : l'index est reconstruit.
+    """
+    user_ids, embeddings = _gallery()
+    path = tmp_path / 'ann_index.npz'
+    recognizer = _recognizer(user_ids, embeddings)
+    recognizer.enable_index(n_lists=4)
+    recognizer.save_index(str(path))
+    path.write_bytes(path.read_bytes()[:100])
+
+    reloaded = _recognizer(user_ids, embeddings)
+    assert reloaded.enable_index(n_lists=4, index_path=str(path)) is False
+    assert reloaded.match(embeddings[9])[0][0] == 'u9'
+
+def test_save_replaces_file_atomically(tmp_path):
+    """
+    La sauvegarde passe par un fichier temporaire du même répertoire, qui ne subsiste pas.
+    """
+    user_ids, embeddings = _gallery()
+    recognizer = _recognizer(user_ids, embeddings)
+    recognizer.enable_index(n_lists=4)
+    path = str(tmp_path / 'ann_index.npz')
+    recognizer.save_index(path)
+    recognizer.save_index(path)
+    assert os.listdir(tmp_path) == ['ann_index.npz']
+    assert IVFIndex.load(path).fingerprint == recognizer.index_fingerprint()
+
+def test_scheduled_saves_are_grouped(tmp_path):
+    """
+    Les sauvegardes programmées sont regroupées puis effectuées en une fois (ou à l'arrêt).
+    """
+    user_ids, embeddings = _gallery()
+    recognizer = _recognizer(user_ids[:-2], embeddings[:-2])
+    recognizer.enable_index(n_lists=4)
+    path = str(tmp_path / 'ann_index.npz')
+
+    recognizer.add_embedding(user_ids[-2], embeddings[-2])
+    recognizer.schedule_index_save(path, delay=60)
+    recognizer.add_embedding(user_ids[-1], embeddings[-1])
+    recognizer.schedule_index_save(path, delay=60)
+    assert not os.path.exists(path)
+
+    recognizer.flush_index_save()
+    assert set(IVFIndex.load(path).keys()) == set(user_ids)
+    assert recognizer._index_save is None
+
+def test_index_scores_against_quantized_gallery_rows():
+    """
+    L'index ne garde que les identifiants : les candidats sont comparés aux lignes de la
+    galerie (ici en int8), et un candidat supprimé de la galerie est ignoré.
+    """
+    user_ids, embeddings = _gallery()
+    recognizer = FaceRecognizer(precision='int8')
+    recognizer.add_embeddings(user_ids, embeddings)
+    recognizer.enable_index(n_lists=4, n_probe=4)
+    assert not any(isinstance(value, np.ndarray) and value.ndim == 2 and value.shape[0] == len(user_ids)
+                   for value in vars(recognizer.index).values())
+
+    exact = recognizer.gallery.search_batch(embeddings[:10], k=3)
+    approx = recognizer.index.search_batch(embeddings[:10], recognizer.gallery, k=3)
+    for exact_matches, approx_matches in zip(exact, approx):
+        assert approx_matches[0][0] == exact_matches[0][0]
+        assert abs(approx_matches[0][1] - exact_matches[0][1]) < 1e-3
+
+    recognizer.gallery.remove('u2')
+    assert recognizer.index.search(embeddings[2], recognizer.gallery, k=64)[0][0] != 'u2'
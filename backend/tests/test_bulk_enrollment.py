@@ -0,0 +1,90 @@
+"""
+Tests de l'enrôlement en masse : lecture du CSV, accès aux photos et échecs ligne par ligne.
+"""
+
+import io
+import time
+import zipfile
+import pytest
+from services.bulk_enrollment import read_manifest, PhotoSource, BulkEnrollment
+from services.inference_executor import InferenceExecutor
+
+MANIFEST = """name,age,profession,image
+Alice,30,Engineer,alice.jpg
+Bob,abc,Designer,bob.jpg
+,25,Nurse,carol.jpg
+Dan,41,Pilot,missing.jpg
+Eve,28,Chemist,noface.jpg
+Fay,35,Teacher,broken.jpg
+Gus,50,Chef,gus.jpg
+"""
+
+def _extract(image_bytes):
+    # Faux extracteur : le contenu de la photo décide du résultat
+    time.sleep(0.01)
+    if image_bytes == b'broken':
+        raise ValueError("Image illisible")
+    if image_bytes == b'noface':
+        return None
+    return image_bytes.decode()
+
+@pytest.fixture
+def photos(tmp_path):
+    for name, content in (('alice.jpg', b'alice'), ('bob.jpg', b'bob'), ('carol.jpg', b'carol'),
+                          ('noface.jpg', b'noface'), ('broken.jpg', b'broken'), ('gus.jpg', b'gus')):
+        (tmp_path / name).write_bytes(content)
+    return PhotoSource(str(tmp_path))
+
+def test_read_manifest_requires_columns():
+    """
+    Un CSV sans les colonnes obligatoires est refusé avant toute ligne.
+    """
+    with pytest.raises(ValueError, match='image'):
+        list(read_manifest(io.StringIO("name,age,profession\nAlice,30,Engineer\n")))
+
+def test_row_failures_do_not_stop_import(photos):
+    """
+    Chaque ligne invalide est signalée avec son numéro et sa cause ; les autres sont enrôlées.
+    Avec un seul thread et sans file d'attente, les soumissions refusées sont réessayées.
+    """
+    executor = InferenceExecutor(workers=1, max_queue=0)
+    enrollments, failures = BulkEnrollment(_extract, executor, window=3).run(
+        read_manifest(io.StringIO(MANIFEST)), photos)
+
+    assert [(line, fields['name'], enrollment) for line, fields, enrollment in enrollments] == \
+        [(2, 'Alice', 'alice'), (8, 'Gus', 'gus')]
+    assert enrollments[0][1]['age'] == 30
+    assert [(failure['line'], failure['image']) for failure in failures] == \
+        [(3, 'bob.jpg'), (4, 'carol.jpg'), (5, 'missing.jpg'), (6, 'noface.jpg'), (7, 'broken.jpg')]
+    errors = [failure['error'] for failure in failures]
+    assert errors[0] == "Âge invalide: abc"
+    assert errors[1] == "Champ manquant: name"
+    assert errors[2] == "Photo introuvable: missing.jpg"
+    assert errors[3] == "Aucun visage détecté dans l'image"
+    assert errors[4] == "Image illisible"
+    assert executor.stats()['rejected'] > 0
+
+def test_photo_directory_rejects_escaping_paths(photos):
+    """
+    Un chemin sortant du répertoire des photos est traité comme une photo introuvable.
+    """
+    with pytest.raises(ValueError, match='introuvable'):
+        photos.read('../outside.jpg')
+
+def test_zip_archive_lookup():
+    """
+    Dans une archive, une photo est trouvée par son chemin, sans le dossier racine commun, ou
+    par son seul nom de fichier s'il est unique.
+    """
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr('photos/team/alice.jpg', b'alice')
+        archive.writestr('photos/bob.jpg', b'bob')
+    source = PhotoSource(buffer)
+
+    assert source.read('photos/team/alice.jpg') == b'alice'
+    assert source.read('team/alice.jpg') == b'alice'
+    assert source.read('alice.jpg') == b'alice'
+    with pytest.raises(ValueError):
+        source.read('carol.jpg')
+    source.close()
@@ -0,0 +1,143 @@
+"""
+Tests des bases de données JSON et SQLite (mêmes cas pour les deux implémentations).
+"""
+
+import os
+import threading
+import numpy as np
+import pytest
+from models.user import User
+from services.database import Database, store_name
+from services.sqlite_database import SQLiteDatabase
+
+@pytest.fixture(params=['json', 'sqlite'])
+def database(request, tmp_path):
+    if request.param == 'json':
+        db = Database(db_dir=str(tmp_path))
+    else:
+        db = SQLiteDatabase(db_dir=str(tmp_path))
+    yield db
+    db.close()
+
+def _user(user_id, seed=0, dim=8):
+    embedding = np.random.default_rng(seed).normal(size=dim).astype(np.float32)
+    return User(user_id=user_id, name=f'User {user_id}', age=30, profession='Tester', face_embedding=embedding)
+
+def test_user_crud(database):
+    """
+    Ajout, lecture, mise à jour (même identifiant) et suppression d'un utilisateur.
+    """
+    assert database.add_user(_user('alice'))
+    assert database.add_users([_user('bob', seed=1), _user('carol', seed=2)])
+    assert sorted(u.user_id for u in database.get_all_users()) == ['alice', 'bob', 'carol']
+
+    updated = _user('alice')
+    updated.profession = 'Chercheuse'
+    assert database.add_user(updated)
+    assert database.get_user('alice').profession == 'Chercheuse'
+    assert database.count_users() == 3
+
+    assert database.delete_user('bob')
+    assert not database.delete_user('bob')
+    assert database.get_user('bob') is None
+    assert database.get_embedding('bob') is None
+    assert database.count_users() == 2
+
+def test_log_filters(database):
+    """
+    Filtres par action, utilisateur et intervalle de dates, dans l'ordre chronologique.
+    """
+    entries = [
+        {'timestamp': '2024-01-01T10:00:00', 'action': 'login', 'user_id': 'alice'},
+        {'timestamp': '2024-01-02T10:00:00', 'action': 'recognize', 'user_id': 'bob'},
+        {'timestamp': '2024-01-03T10:00:00', 'action': 'login', 'user_id': 'bob'},
+        {'timestamp': '2024-01-04T10:00:00', 'action': 'login', 'user_id': 'alice'},
+    ]
+    for entry in entries:
+        assert database.add_log(entry)
+
+    assert database.get_logs() == entries
+    assert database.get_logs(limit=2) == entries[2:]
+    assert database.get_logs(action='login') == [entries[0], entries[2], entries[3]]
+    assert database.get_logs(user_id='bob') == entries[1:3]
+    assert database.get_logs(action='login', user_id='alice', limit=1) == [entries[3]]
+    assert database.get_logs(since='2024-01-02T00:00:00', until='2024-01-03T23:59:59') == entries[1:3]
+
+@pytest.mark.parametrize('space', ['raw', 'pca'])
+def test_embedding_round_trip(database, space):
+    """
+    Embeddings et modèles multiples relus à l'identique, dans chaque espace.
+    """
+    embeddings = np.random.default_rng(3).normal(size=(3, 8)).astype(np.float32)
+    if space == 'raw':
+        database.add_users([User(user_id=f'u{i}', name=f'U{i}', face_embedding=e) for i, e in enumerate(embeddings)])
+    else:
+        assert database.put_embeddings([f'u{i}' for i in range(3)], embeddings, space=space)
+    assert database.put_templates('u0', np.stack([embeddings[0], embeddings[2]]), space=space)
+
+    keys, matrix = database.get_all_embeddings(space=space)
+    stored = dict(zip(keys, matrix))
+    assert sorted(stored) == ['u0', 'u0#1', 'u1', 'u2']
+    np.testing.assert_allclose(stored['u1'], embeddings[1], atol=1e-6)
+    np.testing.assert_allclose(stored['u0#1'], embeddings[2], atol=1e-6)
+    np.testing.assert_allclose(database.get_templates('u0', space=space), embeddings[[0, 2]], atol=1e-6)
+    np.testing.assert_allclose(database.get_embedding('u2', space=space), embeddings[2], atol=1e-6)
+
+def test_sqlite_close_closes_every_thread_connection(tmp_path):
+    """
+    close() ferme les connexions ouvertes par les autres threads ; la base reste utilisable.
+    """
+    db = SQLiteDatabase(db_dir=str(tmp_path))
+    db.add_user(_user('alice'))
+    opened = []
+    worker = threading.Thread(target=lambda: opened.append(db._connection()) or db.get_user('alice'))
+    worker.start()
+    worker.join()
+    assert len(db._connections) == 2
+
+    db.close()
+    assert db._connections == {}
+    with pytest.raises(Exception):
+        opened[0].execute('SELECT 1')
+    assert db.get_user('alice').name == 'User alice'
+    db.close()
+
+def test_profile_reads_skip_embedding(database):
+    """
+    get_user/get_all_users ne chargent que le profil ; l'embedding se lit avec get_embedding.
+    """
+    user = _user('alice')
+    assert database.add_user(user)
+
+    loaded = database.get_user('alice')
+    assert loaded.name == 'User alice' and loaded.face_embedding is None
+    assert [u.face_embedding for u in database.get_all_users()] == [None]
+    assert database.count_users() == 1
+    np.testing.assert_allclose(database.get_embedding('alice'), user.face_embedding, atol=1e-6)
+    assert database.get_embedding('bob') is None
+    assert database.get_embedding('alice', space='pca') is None
+
+def test_delete_user_touches_existing_stores_only(tmp_path):
+    """
+    La suppression ne crée aucun stockage et ouvre les espaces existants dans leur propre précision.
+    """
+    db = Database(db_dir=str(tmp_path))
+    db.add_user(_user('alice'))
+    # Espace écrit par une autre instance dans une autre précision
+    other = Database(db_dir=str(tmp_path), embedding_dtype='int8', embedding_space='pca')
+    other.put_templates('alice', np.ones((2, 4), dtype=np.float32))
+    other.close()
+
+    assert db.delete_user('alice')
+    reopened = Database(db_dir=str(tmp_path), embedding_dtype='int8', embedding_space='pca')
+    assert reopened.get_all_embeddings()[0] == []
+    reopened.close()
+    db.close()
+
+def test_pca_database_does_not_create_raw_store(tmp_path):
+    """
+    Une base sans embeddings à migrer n'ouvre que le stockage de son espace.
+    """
+    Database(db_dir=str(tmp_path), embedding_space='pca').close()
+    assert os.path.exists(os.path.join(str(tmp_path), f"{store_name('pca')}.json"))
+    assert not os.path.exists(os.path.join(str(tmp_path), f"{store_name('raw')}.json"))
@@ -0,0 +1,103 @@
+"""
+Tests du stockage binaire des embeddings : précision sur disque et conversion explicite.
+"""
+
+import os
+import multiprocessing
+import numpy as np
+import pytest
+from services.embedding_store import EmbeddingStore
+from services.database import convert_embedding_precision
+
+def _embeddings(n=5, dim=16, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+
+@pytest.mark.parametrize('dtype, tolerance', [('float32', 0), ('float16', 1e-2), ('int8', 2e-2)])
+def test_round_trip(tmp_path, dtype, tolerance):
+    """
+    Les embeddings relus après réouverture correspondent aux originaux, à la précision près.
+    """
+    embeddings = _embeddings()
+    store = EmbeddingStore(str(tmp_path), dtype=dtype)
+    store.put_many([f'u{i}' for i in range(len(embeddings))], embeddings)
+
+    reopened = EmbeddingStore(str(tmp_path), dtype=dtype)
+    assert reopened.dtype == np.dtype(dtype)
+    user_ids, matrix = reopened.all()
+    assert sorted(user_ids) == [f'u{i}' for i in range(len(embeddings))]
+    for user_id in user_ids:
+        original = embeddings[int(user_id[1:])]
+        np.testing.assert_allclose(reopened.get(user_id), original, atol=tolerance * np.abs(original).max())
+    assert os.path.getsize(reopened.data_file) == embeddings.size * np.dtype(dtype).itemsize
+
+def test_open_never_converts(tmp_path):
+    """
+    Ouvrir un stockage dans une autre précision échoue sans modifier les fichiers.
+    """
+    store = EmbeddingStore(str(tmp_path), dtype='int8')
+    store.put_many(['a', 'b'], _embeddings(2))
+    with open(store.data_file, 'rb') as f:
+        content = f.read()
+
+    with pytest.raises(ValueError, match='convert-precision'):
+        EmbeddingStore(str(tmp_path), dtype='float32')
+
+    with open(store.data_file, 'rb') as f:
+        assert f.read() == content
+    assert EmbeddingStore(str(tmp_path), dtype=None).dtype == np.dtype('int8')
+
+def test_convert_keeps_float32_backup(tmp_path):
+    """
+    La conversion explicite change la précision et conserve une copie float32 de référence.
+    """
+    embeddings = _embeddings()
+    user_ids = [f'u{i}' for i in range(len(embeddings))]
+    EmbeddingStore(str(tmp_path), dtype='float32').put_many(user_ids, embeddings)
+    backup_dir = str(tmp_path / 'backup')
+
+    assert convert_embedding_precision(str(tmp_path), 'int8', backup_dir=backup_dir) == \
+        [('embeddings', 'float32', len(embeddings))]
+
+    converted = EmbeddingStore(str(tmp_path), dtype='int8')
+    assert len(converted) == len(embeddings)
+    backup = EmbeddingStore(backup_dir, dtype='float32')
+    np.testing.assert_array_equal(backup.get('u3'), embeddings[3])
+    # Déjà dans la précision demandée : rien à convertir
+    assert convert_embedding_precision(str(tmp_path), 'int8') == [('embeddings', 'int8', 0)]
+
+def test_writers_in_other_processes_get_distinct_rows(tmp_path):
+    """
+    Deux processus qui écrivent dans le même stockage ne réutilisent jamais la même ligne.
+    """
+    embeddings = _embeddings(4)
+    ctx = multiprocessing.get_context('fork')
+    workers = [ctx.Process(target=_put_all, args=(str(tmp_path), f'p{p}', embeddings)) for p in range(2)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    store = EmbeddingStore(str(tmp_path), dtype=None)
+    user_ids, matrix = store.all()
+    assert len(user_ids) == 8 and len(set(store._meta['rows'].values())) == 8
+    for user_id, vector in zip(user_ids, matrix):
+        np.testing.assert_allclose(vector, embeddings[int(user_id.split('-')[1])])
+
+def test_write_after_conversion_by_another_process(tmp_path):
+    """
+    Un écrivain dont le stockage a été converti ailleurs écrit dans la nouvelle précision.
+    """
+    store = EmbeddingStore(str(tmp_path), dtype='float32')
+    store.put('a', _embeddings(1)[0])
+    EmbeddingStore(str(tmp_path), dtype=None).convert('int8')
+
+    embedding = _embeddings(1, seed=1)[0]
+    assert store.put('b', embedding)
+    reopened = EmbeddingStore(str(tmp_path), dtype='int8')
+    np.testing.assert_allclose(reopened.get('b'), embedding, atol=2e-2 * np.abs(embedding).max())
+
+def _put_all(db_dir, prefix, embeddings):
+    store = EmbeddingStore(db_dir, dtype='float32')
+    for i, embedding in enumerate(embeddings):
+        assert store.put(f'{prefix}-{i}', embedding)
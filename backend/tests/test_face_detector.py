@@ -0,0 +1,65 @@
+"""
+Tests communs aux détecteurs de visages (cascade de Haar et détecteurs cv2.dnn).
+Les détecteurs DNN utilisent le modèle de DETECTOR_MODEL lorsque DETECTOR_BACKEND les désigne ;
+sinon leurs cas sont ignorés.
+"""
+
+import os
+import numpy as np
+import pytest
+from services.face_detector import BaseFaceDetector, create_face_detector
+
+def _detector(backend):
+    if backend != 'haar':
+        model_path = os.getenv('DETECTOR_MODEL')
+        if os.getenv('DETECTOR_BACKEND', 'haar').lower() != backend or not model_path or not os.path.exists(model_path):
+            pytest.skip(f"Modèle '{backend}' absent (DETECTOR_BACKEND={backend} et DETECTOR_MODEL requis)")
+    return create_face_detector(backend)
+
+@pytest.fixture(params=['haar', 'ssd', 'yunet'])
+def backend(request):
+    return request.param
+
+@pytest.fixture
+def detector(backend):
+    return _detector(backend)
+
+def _images():
+    rng = np.random.default_rng(0)
+    return [np.zeros((240, 320, 3), dtype=np.uint8),
+            rng.integers(0, 256, size=(200, 300, 3), dtype=np.uint8),
+            np.full((120, 160), 128, dtype=np.uint8)]
+
+def test_detector_initialises_base(backend, detector):
+    """
+    Tous les détecteurs passent par l'initialisation de la classe de base.
+    """
+    assert isinstance(detector, BaseFaceDetector)
+    assert detector.preset == ('accurate' if backend == 'haar' else 'dnn')
+
+def test_detect_batch_matches_detect(detector):
+    """
+    detect_batch rend une liste de rectangles (x, y, w, h) par image, identique à detect ;
+    les images en niveaux de gris sont acceptées.
+    """
+    images = _images()
+    batch = detector.detect_batch(images)
+    assert len(batch) == len(images)
+    for image, faces in zip(images, batch):
+        faces = np.asarray(faces).reshape(-1, 4)
+        np.testing.assert_array_equal(faces, np.asarray(detector.detect(image)).reshape(-1, 4))
+        if len(faces):
+            assert (faces[:, 0] >= 0).all() and (faces[:, 0] + faces[:, 2] <= image.shape[1]).all()
+            assert (faces[:, 1] >= 0).all() and (faces[:, 1] + faces[:, 3] <= image.shape[0]).all()
+    assert len(np.asarray(batch[0]).reshape(-1, 4)) == 0
+
+def test_extract_and_preprocess_face(detector):
+    """
+    Le visage extrait est recadré puis ramené en niveaux de gris normalisés.
+    """
+    image = _images()[1]
+    face = detector.extract_face(image, (10, 20, 50, 60))
+    assert face.shape == (60, 50, 3)
+    processed = detector.preprocess_face(face)
+    assert processed.shape == (96, 96)
+    assert 0 <= processed.min() and processed.max() <= 1
@@ -0,0 +1,77 @@
+"""
+Tests de l'exécuteur d'inférence et du regroupement des reconnaissances par lots.
+"""
+
+import time
+import threading
+import pytest
+from services.inference_executor import InferenceExecutor, MicroBatcher, ExecutorSaturated
+
+def test_executor_rejects_beyond_queue():
+    """
+    Au-delà des threads et de la file d'attente, les soumissions sont refusées immédiatement.
+    """
+    executor = InferenceExecutor(workers=1, max_queue=1)
+    release = threading.Event()
+    futures = [executor.submit(release.wait) for _ in range(2)]
+    with pytest.raises(ExecutorSaturated):
+        executor.submit(release.wait)
+    release.set()
+    assert all(future.result(timeout=5) for future in futures)
+    assert executor.stats()['rejected'] == 1
+
+def test_failing_item_fails_only_its_caller():
+    """
+    Un élément qui fait échouer son lot n'échoue que pour son appelant.
+    """
+    def upper(items):
+        time.sleep(0.02)
+        if 'bad' in items:
+            raise ValueError('bad item')
+        return [item.upper() for item in items]
+
+    batcher = MicroBatcher(upper, max_batch=8)
+    executor = InferenceExecutor(workers=6, max_queue=0)
+
+    def call(item):
+        try:
+            return batcher.submit(item, timeout=5)
+        except ValueError as e:
+            return str(e)
+
+    futures = [executor.submit(call, item) for item in ('a', 'b', 'bad', 'c', 'd', 'e')]
+    assert [future.result(timeout=5) for future in futures] == ['A', 'B', 'bad item', 'C', 'D', 'E']
+
+def test_batches_run_concurrently_up_to_limit():
+    """
+    Les lots sont exécutés par les threads appelants, au plus `concurrency` à la fois.
+    """
+    lock, running, peak = threading.Lock(), [0], [0]
+
+    def slow(items):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+        return items
+
+    batcher = MicroBatcher(slow, max_batch=2, concurrency=2)
+    executor = InferenceExecutor(workers=8, max_queue=0)
+    futures = [executor.submit(batcher.submit, i, timeout=5) for i in range(8)]
+    assert sorted(future.result(timeout=5) for future in futures) == list(range(8))
+    assert peak[0] == 2
+
+def test_submit_times_out_while_waiting():
+    """
+    Un élément encore en attente d'un lot à l'expiration du délai est retiré et refusé.
+    """
+    batcher = MicroBatcher(lambda items: time.sleep(0.5) or items)
+    thread = threading.Thread(target=batcher.submit, args=('first',))
+    thread.start()
+    time.sleep(0.05)
+    with pytest.raises(ExecutorSaturated):
+        batcher.submit('second', timeout=0.05)
+    thread.join()
+    assert batcher.stats() == {'batches': 1, 'mean_batch_size': 1.0}
@@ -0,0 +1,79 @@
+"""
+Tests de la session de reconnaissance en continu (identité courante, profils, images abandonnées).
+"""
+
+import threading
+import cv2
+import numpy as np
+from models.user import User
+from services.inference_executor import ExecutorSaturated
+from services.recognition_stream import LatestFrame, RecognitionSession
+
+class _Detector:
+    def detect(self, image):
+        return [(0, 0, 8, 8)]
+
+    def extract_face(self, image, face_coords):
+        return image
+
+    def preprocess_face(self, face_img):
+        return face_img
+
+class _Recognizer:
+    def __init__(self, results):
+        self.results = iter(results)
+
+    def recognize(self, face):
+        return next(self.results)
+
+class _Database:
+    def __init__(self):
+        self.users = {'alice': User(user_id='alice', name='Alice'), 'bob': User(user_id='bob', name='Bob')}
+        self.reads = 0
+        self.logs = []
+
+    def get_user(self, user_id):
+        self.reads += 1
+        return self.users.get(user_id)
+
+    def add_log(self, entry):
+        self.logs.append(entry)
+
+FRAME = cv2.imencode('.png', np.zeros((16, 16), dtype=np.uint8))[1].tobytes()
+
+def test_profile_read_on_identity_change_only():
+    """
+    Le profil est relu à chaque changement d'identité (une modification est visible), jamais pour
+    une image qui confirme l'identité courante.
+    """
+    database = _Database()
+    recognizer = _Recognizer([('alice', 0.9), ('alice', 0.9), ('bob', 0.8), ('alice', 0.9)])
+    session = RecognitionSession(_Detector(), recognizer, database)
+
+    assert session.process(FRAME)['user']['name'] == 'Alice'
+    assert session.process(FRAME) is None
+    assert session.process(FRAME)['user']['name'] == 'Bob'
+    database.users['alice'].name = 'Alice Martin'
+    assert session.process(FRAME)['user']['name'] == 'Alice Martin'
+    assert database.reads == 3
+
+def test_busy_frames_are_counted_as_dropped():
+    """
+    Une image refusée par l'exécuteur saturé est comptée comme abandonnée.
+    """
+    frames = LatestFrame()
+    events = []
+    session = RecognitionSession(_Detector(), _Recognizer([]), _Database())
+
+    def execute(function, frame):
+        raise ExecutorSaturated('saturé')
+
+    def emit(event):
+        events.append(event)
+        frames.close()
+
+    worker = threading.Thread(target=session.run, args=(frames, emit, execute))
+    worker.start()
+    frames.put(FRAME)
+    worker.join(timeout=5)
+    assert events[0]['type'] == 'busy' and events[0]['dropped'] == 1 and frames.dropped == 1
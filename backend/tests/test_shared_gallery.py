@@ -0,0 +1,147 @@
+"""
+Tests de la galerie partagée entre processus (fichier projeté en mémoire, protocole de génération).
+"""
+
+import os
+import struct
+import threading
+import numpy as np
+import pytest
+from services import shared_gallery
+from services.shared_gallery import SharedGallery
+
+def _embeddings(n=20, dim=8, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+
+def _generation(gallery):
+    return struct.unpack_from('<Q', gallery._map, shared_gallery.GENERATION_OFFSET)[0]
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'gallery.bin')
+
+def test_writes_are_visible_to_other_instances(path):
+    """
+    Un ajout ou une suppression d'une instance est vu par les autres, génération paire.
+    """
+    embeddings = _embeddings()
+    writer, reader = SharedGallery(path, initial_capacity=4), SharedGallery(path)
+    writer.load([f'u{i}' for i in range(10)], embeddings[:10])
+    assert len(reader) == 10
+
+    writer.add_many([f'u{i}' for i in range(10, 20)], embeddings[10:])  # Agrandissement du fichier
+    writer.remove('u0')
+    assert sorted(reader.ids) == sorted(writer.ids) == sorted(f'u{i}' for i in range(1, 20))
+    assert reader.search(embeddings[7])[0][0] == 'u7'
+    assert _generation(writer) % 2 == 0
+
+def test_id_cache_follows_incremental_writes(path):
+    """
+    Le cache local des identifiants reste cohérent avec le fichier après des écritures sur place.
+    """
+    embeddings = _embeddings()
+    gallery = SharedGallery(path)
+    gallery.load(['a', 'b', 'c'], embeddings[:3])
+    gallery.add('d', embeddings[3])
+    gallery.add('b', embeddings[4])
+    gallery.remove('a')
+
+    expected = [raw.decode('utf-8') for raw in gallery._id_bytes[:len(gallery)]]
+    assert list(gallery.ids) == expected
+    assert {user_id: row for row, user_id in enumerate(expected)} == gallery._rows
+    np.testing.assert_allclose(gallery.get('b'), gallery._normalize(embeddings[4]), atol=1e-6)
+
+def test_load_skips_identical_content(path):
+    """
+    Un worker qui charge le contenu déjà présent ne réécrit pas le fichier ; un contenu
+    différent, ou modifié depuis le chargement, le remplace.
+    """
+    user_ids, embeddings = ['a', 'b', 'c'], _embeddings(3)
+    first, second = SharedGallery(path), SharedGallery(path)
+    first.load(user_ids, embeddings)
+    inode = os.stat(path).st_ino
+
+    second.load(user_ids, embeddings)
+    assert os.stat(path).st_ino == inode
+
+    first.add('d', _embeddings(1, seed=1)[0])
+    second.load(user_ids, embeddings)
+    assert os.stat(path).st_ino != inode
+    assert sorted(first.ids) == user_ids
+
+def test_reader_repairs_interrupted_write(path, monkeypatch, capsys):
+    """
+    Une génération restée impaire (écrivain tué pendant une suppression) est refermée par un
+    lecteur après un nombre borné d'attentes, au lieu de le bloquer indéfiniment.
+    """
+    monkeypatch.setattr(shared_gallery, 'SPIN_LIMIT', 10)
+    writer, reader = SharedGallery(path), SharedGallery(path)
+    writer.load([f'u{i}' for i in range(5)], _embeddings(5))
+    len(reader)
+
+    # Suppression de u1 interrompue : dernière ligne recopiée, nombre de lignes non publié
+    struct.pack_into('<Q', writer._map, shared_gallery.GENERATION_OFFSET, _generation(writer) + 1)
+    writer._id_bytes[1] = writer._id_bytes[4]
+
+    assert sorted(reader.ids) == ['u0', 'u2', 'u3', 'u4']
+    assert _generation(reader) % 2 == 0
+    assert 'écriture interrompue' in capsys.readouterr().out
+
+    writer.add('u5', _embeddings(1, seed=2)[0])
+    assert len(reader) == 5
+
+def test_concurrent_reads_see_consistent_snapshots(path):
+    """
+    Les recherches concurrentes d'une autre instance ne voient jamais une écriture à moitié faite.
+    """
+    embeddings = _embeddings(200)
+    writer, reader = SharedGallery(path, initial_capacity=8), SharedGallery(path)
+    writer.add('anchor', embeddings[0])
+    errors, done = [], threading.Event()
+
+    def read():
+        while not done.is_set():
+            try:
+                results = reader.search(embeddings[0], k=1)
+                assert results[0][0] == 'anchor'
+                ids = list(reader.ids)
+                assert len(ids) == len(set(ids))
+            except Exception as e:
+                errors.append(e)
+                return
+
+    thread = threading.Thread(target=read)
+    thread.start()
+    for i in range(1, 200):
+        writer.add(f'u{i}', embeddings[i])
+        if i % 3 == 0:
+            writer.remove(f'u{i - 1}')
+    done.set()
+    thread.join()
+    assert not errors
+
+def test_snapshot_pairs_ids_with_their_rows(path):
+    """
+    Un instantané associe chaque identifiant à sa ligne, même si une autre instance supprime
+    des utilisateurs (déplacement de la dernière ligne) pendant la lecture.
+    """
+    n = 64
+    writer, reader = SharedGallery(path), SharedGallery(path)
+    writer.load([f'u{i}' for i in range(n)], np.eye(n, dtype=np.float32))
+    errors, done = [], threading.Event()
+
+    def read():
+        while not done.is_set():
+            _, ids, matrix = reader.snapshot()
+            if [f'u{j}' for j in np.argmax(matrix, axis=1)] != list(ids):
+                errors.append(ids)
+                return
+
+    thread = threading.Thread(target=read)
+    thread.start()
+    for i in range(0, n, 2):
+        writer.remove(f'u{i}')
+    done.set()
+    thread.join()
+    assert not errors
+    assert len(reader.snapshot()[1]) == n // 2
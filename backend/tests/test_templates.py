@@ -0,0 +1,94 @@
+"""
+Tests des modèles (templates) multiples par utilisateur et de leur réduction.
+"""
+
+import numpy as np
+from services.gallery import (template_key, template_owner, template_index, reduce_templates,
+                              template_centroids)
+from services.face_recognizer import FaceRecognizer
+
+def _unit(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+def test_template_keys():
+    """
+    Le premier modèle est rangé sous l'identifiant, les suivants sous "<user_id>#<n>".
+    """
+    assert template_key('alice', 0) == 'alice'
+    assert template_key('alice', 2) == 'alice#2'
+    assert template_owner('alice#2') == 'alice' and template_owner('alice') == 'alice'
+    assert template_index('alice#2') == 2 and template_index('alice') == 0
+
+def test_reduce_templates_keeps_closest_per_user():
+    """
+    Chaque utilisateur n'apparaît qu'une fois, avec la distance de son modèle le plus proche.
+    """
+    candidates = [('bob#1', 0.1), ('bob', 0.2), ('alice#3', 0.3), ('carol', 0.4), ('alice', 0.5)]
+    assert reduce_templates(candidates, 2) == [('bob', 0.1), ('alice', 0.3)]
+    assert reduce_templates(candidates, 5) == [('bob', 0.1), ('alice', 0.3), ('carol', 0.4)]
+
+def test_template_centroids():
+    """
+    Le centroïde d'un utilisateur est la moyenne normalisée de ses modèles normalisés.
+    """
+    user_ids, centroids = template_centroids(['a', 'a#1', 'b'], [[2, 0], [0, 3], [1, 1]])
+    assert user_ids == ['a', 'b']
+    np.testing.assert_allclose(centroids, _unit([[1, 1], [1, 1]]), atol=1e-6)
+
+def test_set_templates_truncates_and_removes_stale():
+    """
+    Au plus max_templates modèles sont conservés ; les modèles surnuméraires d'un
+    remplacement précédent sont supprimés.
+    """
+    recognizer = FaceRecognizer(max_templates=3)
+    templates = _unit(np.eye(4, dtype=np.float32))
+    recognizer.set_templates('alice', templates)
+    assert sorted(recognizer.gallery.ids) == ['alice', 'alice#1', 'alice#2']
+
+    recognizer.set_templates('alice', templates[:1])
+    assert list(recognizer.gallery.ids) == ['alice']
+
+    recognizer.set_templates('bob', templates[1:3])
+    recognizer.remove_face('bob')
+    assert list(recognizer.gallery.ids) == ['alice']
+
+def test_min_reduction_matches_any_template():
+    """
+    Réduction 'min' : une sonde proche d'un seul des modèles est reconnue, une fois par utilisateur.
+    """
+    recognizer = FaceRecognizer(max_templates=2)
+    recognizer.set_templates('alice', _unit([[1, 0, 0], [0, 1, 0]]))
+    recognizer.set_templates('bob', _unit([[0, 0, 1]]))
+
+    matches = recognizer.match(_unit([0.1, 1, 0]), top_k=2)
+    assert [user_id for user_id, _ in matches] == ['alice', 'bob']
+    assert matches[0][1] < 0.2 < matches[1][1]
+
+def test_centroid_reduction_stores_one_row_per_user():
+    """
+    Réduction 'centroid' : une ligne par utilisateur, comparée au centroïde de ses modèles.
+    """
+    recognizer = FaceRecognizer(max_templates=2, template_reduction='centroid')
+    recognizer.set_templates('alice', _unit([[1, 0, 0], [0, 1, 0]]))
+    recognizer.set_templates('bob', _unit([[0, 0, 1]]))
+    assert sorted(recognizer.gallery.ids) == ['alice', 'bob']
+
+    (user_id, distance), = recognizer.match(_unit([1, 1, 0]))
+    assert user_id == 'alice' and distance < 1e-5
+
+def test_load_embeddings_applies_template_settings():
+    """
+    Au chargement depuis la base, les modèles au-delà de max_templates sont ignorés ('min')
+    ou réduits au centroïde ('centroid').
+    """
+    keys = ['alice', 'alice#1', 'alice#2', 'bob']
+    embeddings = _unit(np.eye(4, dtype=np.float32))
+
+    recognizer = FaceRecognizer(max_templates=2)
+    recognizer.load_embeddings(keys, embeddings)
+    assert sorted(recognizer.gallery.ids) == ['alice', 'alice#1', 'bob']
+
+    recognizer = FaceRecognizer(max_templates=2, template_reduction='centroid')
+    recognizer.load_embeddings(keys, embeddings)
+    assert sorted(recognizer.gallery.ids) == ['alice', 'bob']
@@ -5,62 +5,65 @@ Utilitaires de traitement d'images pour le système d'authentification faciale.
 import cv2
 import numpy as np
 import base64
-import io
-from PIL import Image
 
-def base64_to_image(base64_string):
+def bytes_to_image(image_bytes, grayscale=False):
+    """
+    Décode directement des octets JPEG/PNG en image OpenCV.
+    
+    Args:
+        image_bytes (bytes): Contenu du fichier image.
+        grayscale (bool, optional): Décoder directement en niveaux de gris.
+        
+    Returns:
+        numpy.ndarray: Image au format OpenCV (BGR, ou niveaux de gris).
+    """
+    buffer = np.frombuffer(image_bytes, dtype=np.uint8)
+    flags = cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR
+    image = cv2.imdecode(buffer, flags)
+    if image is None:
+        raise ValueError("Image invalide ou format non supporté")
+    return image
+
+def base64_to_image(base64_string, grayscale=False):
     """
     Convertit une chaîne base64 en image OpenCV.
     
     Args:
         base64_string (str): Chaîne base64 de l'image.
+        grayscale (bool, optional): Décoder directement en niveaux de gris.
         
     Returns:
-        numpy.ndarray: Image au format OpenCV (BGR).
+        numpy.ndarray: Image au format OpenCV (BGR, ou niveaux de gris).
     """
     # Supprimer le préfixe data:image/jpeg;base64, si présent
     if ',' in base64_string:
         base64_string = base64_string.split(',')[1]
     
-    # Décoder la chaîne base64
-    image_bytes = base64.b64decode(base64_string)
-    
-    # Convertir en tableau numpy
-    image = np.array(Image.open(io.BytesIO(image_bytes)))
-    
-    # Convertir de RGB à BGR (format OpenCV)
-    if len(image.shape) == 3 and image.shape[2] == 3:
-        image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
-    
-    return image
+    # Décoder la chaîne base64 puis l'image (cv2.imdecode produit directement du BGR)
+    return bytes_to_image(base64.b64decode(base64_string), grayscale)
 
-def image_to_base64(image):
+def image_to_base64(image, quality=75):
     """
-    Convertit une image OpenCV en chaîne base64.
+    Convertit une image OpenCV en chaîne base64 (JPEG encodé par cv2.imencode).
     
     Args:
         image (numpy.ndarray): Image au format OpenCV (BGR).
+        quality (int, optional): Qualité JPEG (0-100).
         
     Returns:
         str: Chaîne base64 de l'image.
     """
-    # Convertir de BGR à RGB
-    if len(image.shape) == 3 and image.shape[2] == 3:
-        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    
-    # Convertir en image PIL
-    pil_image = Image.fromarray(image)
-    
-    # Sauvegarder en mémoire au format JPEG
-    buffer = io.BytesIO()
-    pil_image.save(buffer, format='JPEG')
+    # Encoder en JPEG directement depuis le BGR (pas de conversion RGB ni d'image PIL)
+    success, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+    if not success:
+        raise ValueError("Échec de l'encodage JPEG")
     
     # Convertir en base64
-    base64_string = base64.b64encode(buffer.getvalue()).decode('utf-8')
+    base64_string = base64.b64encode(buffer).decode('utf-8')
     
     return f"data:image/jpeg;base64,{base64_string}"
 
-def draw_face_rectangle(image, face_coords, label=None, color=(0, 255, 0), thickness=2):
+def draw_face_rectangle(image, face_coords, label=None, color=(0, 255, 0), thickness=2, inplace=False):
     """
     Dessine un rectangle autour du visage détecté et ajoute éventuellement une étiquette.
     
@@ -70,12 +73,13 @@ def draw_face_rectangle(image, face_coords, label=None, color=(0, 255, 0), thick
         label (str, optional): Étiquette à afficher.
         color (tuple, optional): Couleur du rectangle (BGR).
         thickness (int, optional): Épaisseur du rectangle.
+        inplace (bool, optional): Dessiner directement sur l'image au lieu d'une copie.
         
     Returns:
         numpy.ndarray: Image avec rectangle et étiquette.
     """
-    # Créer une copie de l'image
-    result = image.copy()
+    # Créer une copie de l'image (sauf dessin en place)
+    result = image if inplace else image.copy()
     
     # Extraire les coordonnées
     x, y, w, h = face_coords
@@ -100,3 +104,33 @@ def draw_face_rectangle(image, face_coords, label=None, color=(0, 255, 0), thick
         cv2.putText(result, label, (x, y - 5), font, font_scale, (255, 255, 255), font_thickness)
     
     return result
+
+def annotate_faces(image, faces, max_width=None):
+    """
+    Produit l'aperçu annoté d'une image : une seule copie (ou réduction) de l'image,
+    puis tous les rectangles dessinés dessus.
+    
+    Args:
+        image (numpy.ndarray): Image source (non modifiée).
+        faces (list): Liste [(face_coords, label, color), ...].
+        max_width (int, optional): Largeur maximale de l'aperçu (réduit avant le dessin).
+        
+    Returns:
+        numpy.ndarray: Image annotée.
+    """
+    scale = 1.0
+    if max_width and image.shape[1] > max_width:
+        scale = max_width / image.shape[1]
+        result = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    else:
+        result = image.copy()
+    
+    # Aperçu en couleur pour une image décodée en niveaux de gris
+    if len(result.shape) == 2:
+        result = cv2.cvtColor(result, cv2.COLOR_GRAY2BGR)
+    
+    for face_coords, label, color in faces:
+        coords = tuple(int(round(value * scale)) for value in face_coords)
+        draw_face_rectangle(result, coords, label, color, inplace=True)
+    
+    return result
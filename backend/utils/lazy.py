@@ -0,0 +1,66 @@
+"""
+Initialisation paresseuse des services pour le système d'authentification faciale.
+Les services coûteux (cascade de Haar, galerie, base de données) ne sont construits
+qu'à la première utilisation, ou explicitement par un préchauffage avant le fork des workers.
+"""
+
+import time
+import threading
+
+# Durées d'initialisation mesurées, en millisecondes {nom du service: durée}
+startup_timings = {}
+
+class LazyService:
+    """
+    Classe mandataire construisant un service à son premier accès (de manière thread-safe)
+    et redirigeant ensuite tous les attributs vers l'instance construite.
+    """
+
+    def __init__(self, name, factory):
+        """
+        Initialise le mandataire sans construire le service.
+
+        Args:
+            name (str): Nom du service (utilisé pour les mesures de démarrage).
+            factory (callable): Fonction sans argument construisant le service.
+        """
+        self._name = name
+        self._factory = factory
+        self._instance = None
+        self._lock = threading.RLock()
+
+    @property
+    def is_loaded(self):
+        return self._instance is not None
+
+    def get(self):
+        """
+        Retourne l'instance du service, construite au premier appel.
+
+        Returns:
+            object: Instance du service.
+        """
+        instance = self._instance
+        if instance is not None:
+            return instance
+
+        with self._lock:
+            if self._instance is None:
+                start = time.perf_counter()
+                self._instance = self._factory()
+                startup_timings[self._name] = (time.perf_counter() - start) * 1000
+                print(f"Service '{self._name}' initialisé en {startup_timings[self._name]:.1f} ms")
+            return self._instance
+
+    def set(self, instance):
+        """
+        Remplace l'instance du service (ex. banc d'essai) ; None la fait reconstruire au prochain accès.
+
+        Args:
+            instance (object): Nouvelle instance du service, ou None.
+        """
+        with self._lock:
+            self._instance = instance
+
+    def __getattr__(self, attribute):
+        return getattr(self.get(), attribute)
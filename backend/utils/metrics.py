@@ -0,0 +1,226 @@
+"""
+Métriques de latence et d'activité (format texte Prometheus) pour le système d'authentification faciale.
+Les durées sont comptées dans des histogrammes à seaux fixes : une observation incrémente un entier
+et l'export ne parcourt que quelques dizaines de compteurs, quel que soit le trafic.
+Les métriques sont propres à chaque processus (un worker gunicorn par point de collecte).
+"""
+
+import time
+import bisect
+import threading
+from functools import wraps
+from contextlib import contextmanager
+
+# Bornes des seaux, en secondes (de 1 ms à 10 s)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Histogram:
+    """
+    Classe représentant un histogramme de durées, une série par combinaison d'étiquettes.
+    """
+
+    def __init__(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        """
+        Initialise l'histogramme.
+
+        Args:
+            name (str): Nom de la métrique (ex. 'facial_auth_stage_duration_seconds').
+            documentation (str): Description (ligne # HELP).
+            label_names (tuple, optional): Noms des étiquettes.
+            buckets (tuple, optional): Bornes supérieures des seaux, croissantes.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}  # {valeurs d'étiquettes: [comptes par seau (+Inf en dernier), somme]}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        """
+        Ajoute une observation.
+
+        Args:
+            value (float): Valeur observée (secondes).
+            *label_values: Valeurs des étiquettes, dans l'ordre de label_names.
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, *label_values):
+        """
+        Mesure la durée d'un bloc.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def label_values(self):
+        """
+        Returns:
+            list: Combinaisons d'étiquettes observées.
+        """
+        with self._lock:
+            return list(self._series)
+
+    def quantile(self, q, *label_values):
+        """
+        Estime un quantile par interpolation linéaire dans les seaux (comme histogram_quantile de PromQL).
+
+        Args:
+            q (float): Quantile (ex. 0.95).
+            *label_values: Valeurs des étiquettes de la série.
+
+        Returns:
+            float: Estimation en secondes, ou None si la série est vide.
+        """
+        with self._lock:
+            series = self._series.get(label_values)
+            counts = list(series[0]) if series else None
+        if not counts or not sum(counts):
+            return None
+
+        rank = q * sum(counts)
+        cumulative = 0
+        for index, count in enumerate(counts):
+            if count and cumulative + count >= rank:
+                if index == len(self.buckets):
+                    # Au-delà du dernier seau : borne connue la plus haute
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                return lower + (self.buckets[index] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    def collect(self):
+        """
+        Returns:
+            list: Lignes au format texte Prometheus.
+        """
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, counts, total in sorted(series):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                le = bound if bound == '+Inf' else repr(float(bound))
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, ('le', le))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+class CallbackMetric:
+    """
+    Classe représentant une métrique lue au moment de l'export (jauge ou compteur tenu ailleurs).
+    """
+
+    def __init__(self, name, documentation, fn, metric_type='gauge'):
+        """
+        Initialise la métrique.
+
+        Args:
+            name (str): Nom de la métrique.
+            documentation (str): Description (ligne # HELP).
+            fn (callable): Fonction sans argument retournant la valeur (None : métrique omise).
+            metric_type (str, optional): 'gauge' ou 'counter'.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.fn = fn
+        self.metric_type = metric_type
+
+    def collect(self):
+        value = self.fn()
+        if value is None:
+            return []
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}",
+                f"{self.name} {_format_value(value)}"]
+
+class MetricsRegistry:
+    """
+    Classe regroupant les métriques exportées par /api/metrics.
+    """
+
+    def __init__(self):
+        self._metrics = []
+
+    def histogram(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, documentation, label_names, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def callback(self, name, documentation, fn, metric_type='gauge'):
+        metric = CallbackMetric(name, documentation, fn, metric_type)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """
+        Returns:
+            str: Toutes les métriques au format texte Prometheus.
+        """
+        lines = []
+        for metric in self._metrics:
+            try:
+                lines.extend(metric.collect())
+            except Exception as e:
+                print(f"Erreur lors de l'export de la métrique {metric.name}: {e}")
+        return '\n'.join(lines) + '\n'
+
+class TimedProxy:
+    """
+    Classe mandataire chronométrant chaque appel aux méthodes publiques d'un service
+    (étiquette = nom de la méthode) ; les autres attributs sont transmis tels quels.
+    """
+
+    def __init__(self, target, histogram):
+        """
+        Args:
+            target (object): Service à instrumenter (ex. Database).
+            histogram (Histogram): Histogramme à une étiquette recevant les durées.
+        """
+        self._target = target
+        self._histogram = histogram
+        self._wrappers = {}
+
+    def __getattr__(self, attribute):
+        value = getattr(self._target, attribute)
+        if attribute.startswith('_') or not callable(value):
+            return value
+
+        wrapper = self._wrappers.get(attribute)
+        if wrapper is None:
+            target, histogram = self._target, self._histogram
+
+            @wraps(value)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return getattr(target, attribute)(*args, **kwargs)
+                finally:
+                    histogram.observe(time.perf_counter() - start, attribute)
+
+            self._wrappers[attribute] = wrapper
+        return wrapper
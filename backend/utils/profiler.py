@@ -0,0 +1,200 @@
+"""
+Profilage à la demande des requêtes (cProfile) pour le système d'authentification faciale.
+Une requête est profilée sur demande explicite (authentifiée) ou par échantillonnage ; les derniers
+profils sont conservés en mémoire dans un tampon circulaire et téléchargeables au format pstats.
+"""
+
+import io
+import time
+import uuid
+import pstats
+import random
+import marshal
+import cProfile
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+class ProfileSession:
+    """
+    Classe représentant le profil d'une requête : le thread de la requête et les traitements
+    qu'elle délègue (ex. à l'exécuteur d'inférence), chacun sous son propre profileur.
+    Les profileurs ne sont jamais actifs simultanément pour une même requête.
+    """
+
+    def __init__(self):
+        self.profiles = []
+        self._handler = None
+
+    @staticmethod
+    def _enable(profile):
+        try:
+            profile.enable()
+            return True
+        except ValueError:
+            # Un autre profileur est déjà actif (Python 3.12+ n'en autorise qu'un à la fois)
+            return False
+
+    def start(self):
+        """
+        Démarre le profilage du thread courant (thread de la requête).
+        """
+        profile = cProfile.Profile()
+        if self._enable(profile):
+            self._handler = profile
+
+    def stop(self):
+        """
+        Arrête le profilage du thread de la requête.
+        """
+        if self._handler is not None:
+            self._handler.disable()
+            self.profiles.append(self._handler)
+            self._handler = None
+
+    @contextmanager
+    def paused(self):
+        """
+        Suspend le profileur du thread de la requête (ex. pendant l'attente d'un autre thread).
+        """
+        handler = self._handler
+        if handler is not None:
+            handler.disable()
+        try:
+            yield
+        finally:
+            if handler is not None and not self._enable(handler):
+                self._handler = None
+                self.profiles.append(handler)
+
+    def wrap(self, fn):
+        """
+        Retourne une fonction exécutant fn sous un profileur propre, dans le thread qui l'appelle.
+
+        Args:
+            fn (callable): Traitement à profiler.
+
+        Returns:
+            callable: Traitement profilé.
+        """
+        def profiled(*args, **kwargs):
+            profile = cProfile.Profile()
+            if not self._enable(profile):
+                return fn(*args, **kwargs)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profile.disable()
+                self.profiles.append(profile)
+
+        return profiled
+
+    def stats(self):
+        """
+        Returns:
+            pstats.Stats: Statistiques fusionnées, ou None si rien n'a été profilé.
+        """
+        profiles = [profile for profile in self.profiles if profile.getstats()]
+        if not profiles:
+            return None
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        return stats
+
+class RequestProfiler:
+    """
+    Classe conservant les derniers profils de requêtes (tampon circulaire borné).
+    """
+
+    def __init__(self, capacity=20, sample_rate=0.0):
+        """
+        Initialise le tampon.
+
+        Args:
+            capacity (int, optional): Nombre de profils conservés (les plus anciens sont écartés).
+            sample_rate (float, optional): Proportion des requêtes profilées sans demande explicite (0 à 1).
+        """
+        self.sample_rate = sample_rate
+        self._profiles = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+
+    def should_sample(self):
+        """
+        Tire au sort le profilage d'une requête selon sample_rate.
+        """
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def store(self, session, endpoint, duration_ms, trigger):
+        """
+        Enregistre le profil d'une requête terminée.
+
+        Args:
+            session (ProfileSession): Profil de la requête.
+            endpoint (str): Chemin de l'endpoint.
+            duration_ms (float): Durée de la requête.
+            trigger (str): 'request' (demande explicite) ou 'sampled' (échantillonnage).
+
+        Returns:
+            str: Identifiant du profil, ou None si rien n'a été profilé.
+        """
+        stats = session.stats()
+        if stats is None:
+            return None
+
+        profile_id = uuid.uuid4().hex[:12]
+        entry = {
+            'profile_id': profile_id,
+            'endpoint': endpoint,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'duration_ms': round(duration_ms, 2),
+            'trigger': trigger,
+            'total_calls': stats.total_calls,
+            # Format de pstats.Stats.dump_stats, lisible par pstats.Stats(fichier) ou snakeviz
+            'data': marshal.dumps(stats.stats)
+        }
+        with self._lock:
+            self._profiles.append(entry)
+        return profile_id
+
+    def list(self):
+        """
+        Returns:
+            list: Métadonnées des profils conservés, du plus récent au plus ancien.
+        """
+        with self._lock:
+            entries = list(self._profiles)
+        return [{key: value for key, value in entry.items() if key != 'data'} for entry in reversed(entries)]
+
+    def get(self, profile_id):
+        """
+        Returns:
+            dict: Profil (données pstats sérialisées dans 'data'), ou None s'il n'est plus conservé.
+        """
+        with self._lock:
+            for entry in self._profiles:
+                if entry['profile_id'] == profile_id:
+                    return entry
+        return None
+
+    @staticmethod
+    def to_text(entry, sort='cumulative', limit=40):
+        """
+        Formate un profil en texte (fonctions les plus coûteuses).
+
+        Args:
+            entry (dict): Profil retourné par get.
+            sort (str, optional): Critère de tri de pstats ('cumulative', 'tottime'...) ; 'cumulative' si inconnu.
+            limit (int, optional): Nombre de fonctions affichées.
+
+        Returns:
+            str: Rapport pstats.
+        """
+        if sort not in pstats.Stats.sort_arg_dict_default:
+            sort = 'cumulative'
+        stream = io.StringIO()
+        stats = pstats.Stats(stream=stream)
+        stats.stats = marshal.loads(entry['data'])
+        stats.get_top_level_stats()
+        stats.sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
@@ -0,0 +1,48 @@
+"""
+Utilitaires de quantification des embeddings pour le système d'authentification faciale.
+Précisions supportées : float32, float16 et int8 (avec un facteur d'échelle par vecteur).
+"""
+
+import numpy as np
+
+PRECISIONS = ('float32', 'float16', 'int8')
+
+def quantize(vectors, precision='float32'):
+    """
+    Convertit des vecteurs dans la précision demandée.
+
+    Args:
+        vectors (numpy.ndarray): Vecteur (dim,) ou matrice (N, dim).
+        precision (str): 'float32', 'float16' ou 'int8'.
+
+    Returns:
+        tuple: (données, échelles) ; les échelles (float32, une par vecteur) valent None hors int8.
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Précision inconnue: {precision}")
+
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if precision != 'int8':
+        return vectors.astype(precision), None
+
+    # Échelle par vecteur : la plus grande composante est codée par ±127
+    scales = np.abs(vectors).max(axis=-1) / 127.0
+    scales = np.where(scales == 0, 1.0, scales).astype(np.float32)
+    data = np.clip(np.rint(vectors / scales[..., np.newaxis]), -127, 127).astype(np.int8)
+    return data, scales
+
+def dequantize(data, scales=None):
+    """
+    Reconvertit des vecteurs quantifiés en float32.
+
+    Args:
+        data (numpy.ndarray): Vecteur ou matrice quantifiés.
+        scales (numpy.ndarray, optional): Échelles par vecteur (int8 uniquement).
+
+    Returns:
+        numpy.ndarray: Vecteurs float32.
+    """
+    vectors = np.asarray(data, dtype=np.float32)
+    if scales is not None:
+        vectors = vectors * np.asarray(scales, dtype=np.float32)[..., np.newaxis]
+    return vectors
@@ -56,6 +56,21 @@ def verify_token(token):
         # Token invalide
         return None
 
+def get_bearer_token(headers):
+    """
+    Extrait le token JWT de l'en-tête Authorization (schéma Bearer).
+    
+    Args:
+        headers (Mapping): En-têtes de la requête.
+        
+    Returns:
+        str: Token, ou None s'il est absent.
+    """
+    auth_header = headers.get('Authorization', '')
+    if auth_header.startswith('Bearer '):
+        return auth_header.split(' ')[1] or None
+    return None
+
 def token_required(f):
     """
     Décorateur pour protéger les routes avec authentification JWT.
@@ -70,13 +85,8 @@ def token_required(f):
     def decorated(*args, **kwargs):
         from flask import request, jsonify
         
-        token = None
-        
         # Vérifier si le token est présent dans l'en-tête Authorization
-        if 'Authorization' in request.headers:
-            auth_header = request.headers['Authorization']
-            if auth_header.startswith('Bearer '):
-                token = auth_header.split(' ')[1]
+        token = get_bearer_token(request.headers)
         
         if not token:
             return jsonify({'message': 'Token manquant!'}), 401
@@ -84,6 +84,14 @@ class ApiService {
         return this.request('/recognize', 'POST', { image: imageData });
     }
     
+    /**
+     * URL of the streaming recognition WebSocket
+     * @returns {string} - ws:// (or wss://) URL of /api/stream
+     */
+    streamUrl() {
+        return `${this.baseUrl.replace(/^http/, 'ws')}/stream`;
+    }
+    
     /**
      * Add a new user 
      * @param {string} name - user name 
@@ -111,6 +111,25 @@ function resetUserInfo() {
     userPhoto.src = '';
 }
 
+/**
+ * Display a result pushed by the streaming recognition session
+ * @param {object} result - Identity change sent by /api/stream
+ */
+function handleStreamResult(result) {
+    if (result.type !== 'identity' || isRecognizing) return;
+    
+    if (result.recognized && result.user) {
+        // The current canvas frame is used as the photo
+        displayUserInfo(result.user, result.confidence, webcamManager.canvasElement.toDataURL('image/jpeg'));
+    } else if (result.face) {
+        resetUserInfo();
+        updateStatus('Visage non reconnu.', 'warning');
+    } else {
+        resetUserInfo();
+        updateStatus('No face detected. Please position yourself facing the camera.', 'warning');
+    }
+}
+
 /**
  * Initialise the webcam manager for the administration
  */
@@ -228,6 +247,11 @@ function initAdminWebcam() {
  * Initialize the event listeners for the user interface.
  */
 function initEventListeners() {
+    // Continuous recognition as soon as the webcam is running
+    webcamManager.onStart = () => {
+        webcamManager.startStream(apiService.streamUrl(), handleStreamResult);
+    };
+    
     // Capture the image
     captureButton.addEventListener('click', async () => {
         if (isRecognizing) return;
@@ -20,6 +20,10 @@ class WebcamManager {
         this.captureInterval = null;
         this.autoCapture = false;
         this.autoCaptureInterval = 3000; // 3 seconds
+        this.socket = null;
+        this.streamInterval = null;
+        this.streamFrameInterval = 200; // 5 frames per second at most
+        this.onStart = null; // Called once the webcam is running
         
         // Link the methods to the context of the class
         this.start = this.start.bind(this);
@@ -27,6 +31,8 @@ class WebcamManager {
         this.captureImage = this.captureImage.bind(this);
         this.startAutoCapture = this.startAutoCapture.bind(this);
         this.stopAutoCapture = this.stopAutoCapture.bind(this);
+        this.sendFrame = this.sendFrame.bind(this);
+        this.stopStream = this.stopStream.bind(this);
         
         // Initialize the event listeners
         this.initEventListeners();
@@ -83,6 +89,10 @@ class WebcamManager {
             // Modify the event listener to stop the webcam
             this.startButton.removeEventListener('click', this.start);
             this.startButton.addEventListener('click', this.stop);
+            
+            if (this.onStart) {
+                this.onStart();
+            }
         } catch (error) {
             console.error('Error accessing the webcam:', error);
             updateStatus('Error: Unable to access the webcam. Check the permissions.', 'error');
@@ -108,8 +118,9 @@ class WebcamManager {
             // Update the status
             this.isRunning = false;
             
-            // Stop automatic capture if active
+            // Stop automatic capture and streaming if active
             this.stopAutoCapture();
+            this.stopStream();
             
             // Update the interface
             this.startButton.textContent = 'Start the Webcam';
@@ -126,9 +137,7 @@ class WebcamManager {
         }
     }
     
-    captureImage() {
-        if (!this.isRunning) return null;
-        
+    drawFrame() {
         // Draw the webcam image on the canvas (mirrored)
         this.canvasContext.save();
         this.canvasContext.scale(-1, 1); // Flip horizontally
@@ -138,6 +147,12 @@ class WebcamManager {
             this.canvasElement.width, this.canvasElement.height
         );
         this.canvasContext.restore();
+    }
+    
+    captureImage() {
+        if (!this.isRunning) return null;
+        
+        this.drawFrame();
         
         // Obtain the image in base64
         const imageData = this.canvasElement.toDataURL('image/jpeg');
@@ -169,6 +184,50 @@ class WebcamManager {
             this.autoCapture = false;
         }
     }
+    
+    startStream(url, callback) {
+        if (!this.isRunning || this.socket) return;
+        
+        // Persistent connection: binary JPEG frames up, identity changes down
+        this.socket = new WebSocket(url);
+        this.socket.onopen = () => {
+            this.streamInterval = setInterval(this.sendFrame, this.streamFrameInterval);
+        };
+        this.socket.onmessage = (event) => {
+            if (callback) {
+                callback(JSON.parse(event.data));
+            }
+        };
+        // Streaming unavailable or closed: the capture button keeps working
+        this.socket.onclose = this.stopStream;
+    }
+    
+    sendFrame() {
+        if (!this.socket || this.socket.readyState !== WebSocket.OPEN) return;
+        
+        // Backpressure: skip this frame while the previous one is still being sent
+        if (this.socket.bufferedAmount > 0) return;
+        
+        this.drawFrame();
+        this.canvasElement.toBlob((blob) => {
+            if (blob && this.socket && this.socket.readyState === WebSocket.OPEN) {
+                this.socket.send(blob);
+            }
+        }, 'image/jpeg', 0.8);
+    }
+    
+    stopStream() {
+        if (this.streamInterval) {
+            clearInterval(this.streamInterval);
+            this.streamInterval = null;
+        }
+        if (this.socket) {
+            const socket = this.socket;
+            this.socket = null;
+            socket.onclose = null;
+            socket.close();
+        }
+    }
 }
 
 // Create an instance of the webcam manager